@@ -1,4 +1,28 @@
-from routes.main import main
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run RUSwapping.')
+    parser.add_argument('--dev', action='store_true', help='Run the single-process Flask debug server (development only).')
+    parser.add_argument('--port', type=int, help='Port to listen on (default: $PORT or 2000).')
+    args = parser.parse_args()
+
+    if args.dev:
+        from routes.main import create_app
+        # DEBUG is set up front so edited static files are served as they are
+        app = create_app({'DEBUG': True})
+        app.run(debug=True, host='127.0.0.1', port=args.port or int(os.environ.get('PORT', 2000)))
+        return
+
+    # Production: pre-forking gunicorn workers configured by gunicorn.conf.py
+    if args.port:
+        os.environ['PORT'] = str(args.port)
+    from gunicorn.app.wsgiapp import run
+    sys.argv = [sys.argv[0], '--config', 'gunicorn.conf.py', 'wsgi:app']
+    run()
+
 
 if __name__ == '__main__':
-    main.run(debug=True, host='0.0.0.0', port=2000) 
\ No newline at end of file
+    main()
@@ -0,0 +1,98 @@
+"""Deterministic synthetic users, swap requests and cycle requests."""
+import itertools
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from utils.apartments import normalize_label
+
+EPOCH = datetime(2025, 1, 1)
+
+
+def apartment_names(count):
+	return [f'Apartment {i:05d}' for i in range(count)]
+
+
+def popularity_weights(count, skew):
+	"""Cumulative Zipf-like weights: apartment i is wanted ~ 1 / (i + 1) ** skew."""
+	return list(itertools.accumulate(1.0 / (rank + 1) ** skew for rank in range(count)))
+
+
+def generate(requests=1000, apartments=200, skew=1.0, cycle_fraction=0.3, seed=42):
+	"""Build users plus swap and cycle request documents shaped like the app's.
+
+	`requests` is the total number of request documents; cycle_fraction of
+	them are cycle requests and the rest preference swap requests. Where
+	students live is uniform; what they ask for follows a popularity skew
+	(0 = uniform, larger = a few apartments are wanted by almost everyone).
+	Returns a dict with 'apartments', 'users', 'swap_requests' and
+	'cycle_requests' lists; requests carry catalog IDs like stored ones.
+	"""
+	if apartments < 4:
+		raise ValueError('need at least 4 apartments to pick three distinct choices')
+	rng = random.Random(seed)
+	names = apartment_names(apartments)
+	ids = {name: i for i, name in enumerate(names, start=1)}
+	weights = popularity_weights(apartments, skew)
+
+	def wanted(k, exclude):
+		picks = []
+		while len(picks) < k:
+			choice = rng.choices(names, cum_weights=weights)[0]
+			if choice != exclude and choice not in picks:
+				picks.append(choice)
+		return picks
+
+	users, swap_requests, cycle_requests = [], [], []
+	n_cycle = int(requests * cycle_fraction)
+	for i in range(requests):
+		user_id = ObjectId(f'{i:024x}')
+		email = f'student{i}@scarletmail.rutgers.edu'
+		name = f'Student {i}'
+		users.append({
+			'_id': user_id,
+			'email': email,
+			'name': name,
+			'password_hash': 'pbkdf2:sha256:1$bench$0',
+			'created_at': EPOCH
+		})
+		current = rng.choice(names)
+		doc = {
+			'user_id': str(user_id),
+			'user_name': name,
+			'email': email,
+			'current_apartment': current,
+			'current_apartment_id': ids[current],
+			'current_room': f'{rng.randint(1, 40)}{rng.choice("ABCD")}',
+			'created_at': EPOCH + timedelta(seconds=i)
+		}
+		if i < n_cycle:
+			desired = wanted(1, current)[0]
+			doc.update({'type': 'cycle_request', 'desired_choice': desired, 'desired_choice_id': ids[desired]})
+			cycle_requests.append(doc)
+		else:
+			first, second, third = wanted(3, current)
+			doc.update({
+				'type': 'swap_request',
+				'preferences': {
+					'first_choice': first,
+					'second_choice': second,
+					'third_choice': third,
+					'first_choice_id': ids[first],
+					'second_choice_id': ids[second],
+					'third_choice_id': ids[third]
+				}
+			})
+			swap_requests.append(doc)
+	catalog = [{'_id': i, 'label': name, 'key': normalize_label(name)} for name, i in ids.items()]
+	return {'apartments': catalog, 'users': users, 'swap_requests': swap_requests, 'cycle_requests': cycle_requests}
+
+
+def load_into(db, data):
+	"""Insert generated data into a (memory or real) database."""
+	db['apartments'].insert_many(data['apartments'], ordered=False)
+	db['users'].insert_many(data['users'], ordered=False)
+	requests = data['swap_requests'] + data['cycle_requests']
+	for start in range(0, len(requests), 10000):
+		db['swap_requests'].insert_many(requests[start:start + 10000], ordered=False)
@@ -0,0 +1,318 @@
+"""End-to-end load test: concurrent virtual students driving the whole app.
+
+    python -m benchmarks.loadtest --users 2000 --concurrency 200
+    python -m benchmarks.loadtest --url http://localhost:5000 --users 500 --mix preference=0.7,cycle=0.3
+
+Each virtual user registers, logs in, creates a swap request and/or a cycle
+request, then polls /get-matches and /get-cycle-matches the way an open
+dashboard does (revalidating with the ETag it was last given). Without --url
+the real Flask app runs in-process through its test client on top of the
+in-memory MongoDB stand-in, optionally pre-seeded with --seed-requests
+generated requests; with --url requests go over HTTP to a running server
+(start it with higher AUTH_* rate limits, or registrations from one address
+are throttled). Per-endpoint throughput, p50/p95/p99 latency and error rate
+are printed, and written as JSON with --output.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.generator import apartment_names, popularity_weights
+from benchmarks.run import git_revision, percentile
+
+# Applied (unless already set) before the app is imported in-process: every
+# virtual user logs in from the same address, and a production-cost hash
+# would make the test measure PBKDF2 instead of the app.
+LOADTEST_ENV = {
+	'AUTH_IP_RATE_PER_MINUTE': '1000000',
+	'AUTH_IP_BURST': '1000000',
+	'AUTH_EMAIL_RATE_PER_MINUTE': '1000',
+	'AUTH_EMAIL_BURST': '100',
+	'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+}
+
+SCENARIOS = ('preference', 'cycle', 'both')
+PASSWORD = 'loadtest-password'
+
+
+class Recorder:
+	"""Latency samples and outcomes per endpoint, shared by every virtual user."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.latencies = defaultdict(list)
+		self.statuses = defaultdict(lambda: defaultdict(int))
+
+	def record(self, endpoint, status, seconds):
+		with self._lock:
+			self.latencies[endpoint].append(seconds * 1000)
+			self.statuses[endpoint][status] += 1
+
+	def summary(self, elapsed):
+		rows = []
+		with self._lock:
+			endpoints = sorted(self.latencies)
+			for endpoint in endpoints + ['TOTAL']:
+				if endpoint == 'TOTAL':
+					timings = [t for e in endpoints for t in self.latencies[e]]
+					statuses = defaultdict(int)
+					for e in endpoints:
+						for status, count in self.statuses[e].items():
+							statuses[status] += count
+				else:
+					timings = self.latencies[endpoint]
+					statuses = self.statuses[endpoint]
+				if not timings:
+					continue
+				errors = sum(count for status, count in statuses.items() if is_error(status))
+				rows.append({
+					'endpoint': endpoint,
+					'requests': len(timings),
+					'rps': round(len(timings) / elapsed, 1) if elapsed else None,
+					'p50_ms': round(percentile(timings, 50), 2),
+					'p95_ms': round(percentile(timings, 95), 2),
+					'p99_ms': round(percentile(timings, 99), 2),
+					'error_rate': round(errors / len(timings), 4),
+					'statuses': {str(status): count for status, count in sorted(statuses.items())}
+				})
+		return rows
+
+
+def is_error(status):
+	# 0 means the request never got a response (connection error, timeout)
+	return status == 0 or status >= 400
+
+
+class TestClientSession:
+	"""One user's cookie-holding session against an in-process app."""
+
+	def __init__(self, app):
+		self.client = app.test_client()
+
+	def request(self, method, path, body=None, headers=None):
+		response = self.client.open(path, method=method, json=body, headers=headers or {})
+		return response.status_code, response.headers.get('ETag'), response.get_data()
+
+
+class HttpSession:
+	"""One user's cookie-holding session against a server at base_url."""
+
+	def __init__(self, base_url, timeout=30):
+		self.base_url = base_url.rstrip('/')
+		self.timeout = timeout
+		self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+	def request(self, method, path, body=None, headers=None):
+		headers = dict(headers or {})
+		data = None
+		if body is not None:
+			data = json.dumps(body).encode()
+			headers['Content-Type'] = 'application/json'
+		req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+		try:
+			with self.opener.open(req, timeout=self.timeout) as response:
+				return response.status, response.headers.get('ETag'), response.read()
+		except urllib.error.HTTPError as e:
+			# 304 and every 4xx/5xx arrive here
+			return e.code, e.headers.get('ETag'), e.read()
+		except (urllib.error.URLError, OSError):
+			return 0, None, b''
+
+
+class VirtualUser:
+	"""Runs one student's session: sign up, post requests, watch for matches."""
+
+	def __init__(self, session, recorder, number, run_id, scenario, apartments, weights, polls, think, rng):
+		self.session = session
+		self.recorder = recorder
+		self.email = f'lt-{run_id}-{number}@scarletmail.rutgers.edu'
+		self.scenario = scenario
+		self.apartments = apartments
+		self.weights = weights
+		self.polls = polls
+		self.think = think
+		self.rng = rng
+		self.etags = {}
+
+	def call(self, method, path, body=None):
+		headers = {}
+		endpoint = path.split('?')[0]
+		if method == 'GET' and endpoint in self.etags:
+			headers['If-None-Match'] = self.etags[endpoint]
+		started = time.perf_counter()
+		status, etag, _ = self.session.request(method, path, body, headers)
+		self.recorder.record(endpoint, status, time.perf_counter() - started)
+		if etag and status in (200, 304):
+			self.etags[endpoint] = etag
+		return status
+
+	def pause(self):
+		if self.think:
+			time.sleep(self.rng.uniform(0, 2 * self.think))
+
+	def wanted(self, k, exclude):
+		picks = []
+		while len(picks) < k:
+			pick = self.rng.choices(self.apartments, cum_weights=self.weights)[0]
+			if pick != exclude and pick not in picks:
+				picks.append(pick)
+		return picks
+
+	def run(self):
+		if self.call('POST', '/register', {'email': self.email, 'password': PASSWORD, 'name': self.email.split('@')[0]}) != 201:
+			return
+		if self.call('POST', '/login', {'email': self.email, 'password': PASSWORD}) != 200:
+			return
+		self.pause()
+
+		current = self.rng.choice(self.apartments)
+		polled = []
+		if self.scenario in ('preference', 'both'):
+			first, second, third = self.wanted(3, current)
+			self.call('POST', '/create-request', {
+				'current_apartment': current,
+				'first_choice': first,
+				'second_choice': second,
+				'third_choice': third
+			})
+			polled.append('/get-matches')
+		if self.scenario in ('cycle', 'both'):
+			self.call('POST', '/create-cycle-request', {
+				'current_apartment': current,
+				'desired_choice': self.wanted(1, current)[0]
+			})
+			polled.append('/get-cycle-matches')
+
+		for _ in range(self.polls):
+			self.pause()
+			for path in polled:
+				self.call('GET', path)
+
+
+def parse_mix(text):
+	"""'preference=0.5,cycle=0.3,both=0.2' -> (scenarios, weights)."""
+	mix = {}
+	for part in text.split(','):
+		if not part.strip():
+			continue
+		name, _, weight = part.partition('=')
+		name = name.strip()
+		if name not in SCENARIOS:
+			raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+		mix[name] = float(weight or 1)
+	if not mix or sum(mix.values()) <= 0:
+		raise argparse.ArgumentTypeError('the scenario mix needs at least one positive weight')
+	return list(mix), list(mix.values())
+
+
+def local_app(seed_requests, apartments, skew, seed, concurrency):
+	"""The real app on the in-memory database, optionally pre-seeded."""
+	for name, value in LOADTEST_ENV.items():
+		os.environ.setdefault(name, value)
+	# room for every active user's hash, so 429s mean a real limit was hit
+	os.environ.setdefault('PASSWORD_HASH_QUEUE', str(concurrency))
+
+	from benchmarks.generator import generate, load_into
+	from routes.main import create_app, memory_database
+	from utils.db import set_database
+
+	db = memory_database()
+	if seed_requests:
+		load_into(db, generate(requests=seed_requests, apartments=apartments, skew=skew, seed=seed))
+	set_database(db)
+	app = create_app()
+	app.config['TESTING'] = True
+	return app
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+	parser.add_argument('--url', help='base URL of a running server (default: the app in-process on the in-memory database)')
+	parser.add_argument('--users', type=int, default=200, help='virtual users in total')
+	parser.add_argument('--concurrency', type=int, default=50, help='virtual users active at once')
+	parser.add_argument('--ramp', type=float, default=0, help='seconds over which to start the first wave of users')
+	parser.add_argument('--mix', type=parse_mix, default='preference=0.5,cycle=0.3,both=0.2',
+		help='scenario weights: preference, cycle and/or both')
+	parser.add_argument('--polls', type=int, default=10, help='match polls per user after creating requests')
+	parser.add_argument('--think', type=float, default=0.5, help='mean pause between a user\'s actions, in seconds')
+	parser.add_argument('--apartments', type=int, default=200)
+	parser.add_argument('--skew', type=float, default=1.0, help='apartment popularity skew (0 = uniform)')
+	parser.add_argument('--seed-requests', type=int, default=0, help='generated requests loaded before the run (in-process only)')
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--output', help='JSON file to write the results to')
+	args = parser.parse_args(argv)
+
+	if args.url:
+		def new_session():
+			return HttpSession(args.url)
+	else:
+		app = local_app(args.seed_requests, args.apartments, args.skew, args.seed, args.concurrency)
+
+		def new_session():
+			return TestClientSession(app)
+
+	scenarios, scenario_weights = args.mix
+	apartments = apartment_names(args.apartments)
+	weights = popularity_weights(args.apartments, args.skew)
+	rng = random.Random(args.seed)
+	run_id = uuid.uuid4().hex[:8]
+	recorder = Recorder()
+
+	users = [
+		VirtualUser(
+			new_session(), recorder, number, run_id, rng.choices(scenarios, scenario_weights)[0],
+			apartments, weights, args.polls, args.think, random.Random(rng.random())
+		)
+		for number in range(args.users)
+	]
+	print(f'Running {args.users} users, {args.concurrency} at a time, against {args.url or "the in-process app"} ...', file=sys.stderr)
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+		futures = []
+		for number, user in enumerate(users):
+			if args.ramp and number < args.concurrency:
+				time.sleep(args.ramp / args.concurrency)
+			futures.append(pool.submit(user.run))
+		for future in futures:
+			future.result()
+	elapsed = time.perf_counter() - started
+
+	rows = recorder.summary(elapsed)
+	print(f"{'endpoint':<22} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+	for row in rows:
+		print(
+			f"{row['endpoint']:<22} {row['requests']:>8} {row['rps']:>8.1f} {row['p50_ms']:>9.2f} "
+			f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['error_rate']:>6.1%}"
+		)
+	print(f'{elapsed:.1f}s elapsed', file=sys.stderr)
+
+	if args.output:
+		report = {
+			'meta': {
+				'revision': git_revision(),
+				'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+				'elapsed_s': round(elapsed, 3),
+				'args': {**vars(args), 'mix': dict(zip(scenarios, scenario_weights))}
+			},
+			'results': rows
+		}
+		os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=2)
+		print(f'Wrote {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,182 @@
+"""Micro-benchmarks for the matching code against the in-memory database.
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --output bench.json
+    python -m benchmarks.run --sizes 10000 --compare bench.json
+
+Each benchmark reports p50/p95/mean latency per operation and the median peak
+memory allocated by one operation (measured in a separate tracemalloc pass so
+it does not distort the timings).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.generator import generate, load_into
+from utils.memory_db import MemoryDatabase
+from utils.cycle_graph import CycleGraph
+from utils.indexes import INDEXES
+from utils.json_provider import dumps_bytes
+from utils.matching import iter_matches, iter_mutual_pairs, match_sort_key
+from utils.numpy_matcher import NUMPY_AVAILABLE, NumpyMatcher
+from utils.pagination import DEFAULT_PAGE_SIZE, top_k
+from utils.utils import to_jsonable
+
+
+def percentile(values, pct):
+	ordered = sorted(values)
+	index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+	return ordered[index]
+
+
+def measure(name, size, op, args, memory_samples=20):
+	"""Time op(arg) for every arg, then sample its peak allocation."""
+	timings = []
+	for arg in args:
+		started = time.perf_counter()
+		op(arg)
+		timings.append((time.perf_counter() - started) * 1000)
+
+	peaks = []
+	for arg in args[:memory_samples]:
+		tracemalloc.start()
+		op(arg)
+		peaks.append(tracemalloc.get_traced_memory()[1])
+		tracemalloc.stop()
+
+	return {
+		'benchmark': name,
+		'size': size,
+		'samples': len(timings),
+		'p50_ms': round(percentile(timings, 50), 4),
+		'p95_ms': round(percentile(timings, 95), 4),
+		'mean_ms': round(statistics.fmean(timings), 4),
+		'peak_kb': round(statistics.median(peaks) / 1024, 1)
+	}
+
+
+def build_database(data):
+	db = MemoryDatabase()
+	for name, models in INDEXES.items():
+		db[name].create_indexes(models)
+	load_into(db, data)
+	return db
+
+
+def run_size(size, apartments, skew, samples, seed):
+	data = generate(requests=size, apartments=apartments, skew=skew, seed=seed)
+	db = build_database(data)
+	collection = db['swap_requests']
+	rng = random.Random(seed)
+	results = []
+
+	swap_requests = data['swap_requests']
+	if swap_requests:
+		sampled = [rng.choice(swap_requests) for _ in range(samples)]
+		results.append(measure(
+			'get_matches', size,
+			lambda r: top_k(iter_matches(collection, r), match_sort_key, DEFAULT_PAGE_SIZE),
+			sampled
+		))
+		results.append(measure(
+			'batch_all_pairs', size,
+			lambda requests: sum(1 for _ in iter_mutual_pairs(requests)),
+			[swap_requests] * 3,
+			memory_samples=1
+		))
+		if NUMPY_AVAILABLE:
+			results.append(measure(
+				'batch_all_pairs_numpy', size,
+				lambda requests: len(NumpyMatcher(requests).pair_arrays()[0]),
+				[swap_requests] * 3,
+				memory_samples=1
+			))
+
+	cycle_requests = data['cycle_requests']
+	if cycle_requests:
+		graph = CycleGraph()
+		results.append(measure('cycle_graph_load', size, graph.load, [cycle_requests] * 3, memory_samples=1))
+		sampled = [rng.choice(cycle_requests)['user_id'] for _ in range(samples)]
+		results.append(measure('get_cycle_matches', size, graph.find_cycles, sampled))
+
+	page = list(collection.find({'type': 'swap_request'}).limit(DEFAULT_PAGE_SIZE * 5))
+	results.append(measure('to_jsonable', size, to_jsonable, [page] * samples))
+	results.append(measure('json_encode', size, dumps_bytes, [page] * samples))
+	return results
+
+
+def git_revision():
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'],
+			capture_output=True, text=True, check=True
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results, baseline_path):
+	with open(baseline_path) as f:
+		baseline = {(r['benchmark'], r['size']): r for r in json.load(f)['results']}
+	for result in results:
+		old = baseline.get((result['benchmark'], result['size']))
+		if old and old['p50_ms']:
+			change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+			print(f"  {result['benchmark']:<20} {result['size']:>8}  p50 {old['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+	parser.add_argument('--sizes', default='1000,10000', help='comma-separated request counts (1k to 1M)')
+	parser.add_argument('--apartments', type=int, default=200)
+	parser.add_argument('--skew', type=float, default=1.0, help='apartment popularity skew (0 = uniform)')
+	parser.add_argument('--samples', type=int, default=200, help='operations timed per benchmark')
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<rev>-<time>.json)')
+	parser.add_argument('--compare', help='previous results JSON to compare p50 latency against')
+	args = parser.parse_args(argv)
+
+	results = []
+	for size in (int(s) for s in args.sizes.split(',') if s):
+		print(f'Running size {size} ...', file=sys.stderr)
+		for result in run_size(size, args.apartments, args.skew, args.samples, args.seed):
+			print(
+				f"  {result['benchmark']:<20} p50 {result['p50_ms']:>9.3f} ms  "
+				f"p95 {result['p95_ms']:>9.3f} ms  peak {result['peak_kb']:>9.1f} KB",
+				file=sys.stderr
+			)
+			results.append(result)
+
+	revision = git_revision()
+	report = {
+		'meta': {
+			'revision': revision,
+			'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'args': vars(args)
+		},
+		'results': results
+	}
+	output = args.output or os.path.join(
+		'benchmarks', 'results',
+		f"{revision or 'unknown'}-{datetime.utcnow():%Y%m%d%H%M%S}.json"
+	)
+	os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+	with open(output, 'w') as f:
+		json.dump(report, f, indent=2)
+	print(f'Wrote {output}', file=sys.stderr)
+
+	if args.compare:
+		compare(results, args.compare)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,101 @@
+"""Gunicorn settings for production; every value can be overridden from the environment."""
+import multiprocessing
+import os
+import tempfile
+
+import utils  # noqa: F401 - loads .env so the settings below see it too
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 2000)}")
+
+# Threaded workers: pymongo releases the GIL while waiting on the database.
+# Up to MATCH_EVENTS_MAX_WAITERS (default 24) threads per worker may be parked
+# in /match-events long-polls, which cost no CPU; the rest serve everything
+# else.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+# Match events published by a write route only reach users polling the worker
+# that handled it, so with several workers every worker follows the MongoDB
+# change stream instead. That needs a replica set (or Atlas): without one the
+# default is a single worker, and an explicit WEB_CONCURRENCY above 1 is an
+# error.
+if workers > 1 and 'MATCH_EVENTS_CHANGE_STREAM' not in os.environ:
+	from pymongo.errors import PyMongoError
+	from utils.db import supports_change_streams
+	try:
+		change_streams = supports_change_streams()
+	except PyMongoError as e:
+		print(f'Could not reach MongoDB to check for change streams: {e}')
+		change_streams = False
+	if change_streams:
+		os.environ['MATCH_EVENTS_CHANGE_STREAM'] = '1'
+	elif 'WEB_CONCURRENCY' in os.environ:
+		raise RuntimeError(
+			f'WEB_CONCURRENCY={workers} needs MongoDB change streams for match notifications, '
+			'but no replica set was found at MONGO_URI: use a replica set or Atlas, or set WEB_CONCURRENCY=1'
+		)
+	else:
+		print('No MongoDB replica set found, and match notifications then need a single worker: starting 1 worker')
+		workers = 1
+if workers > 1 and os.environ['MATCH_EVENTS_CHANGE_STREAM'].lower() not in ('1', 'true', 'yes'):
+	raise RuntimeError(
+		f'MATCH_EVENTS_CHANGE_STREAM is off with {workers} workers, so most match '
+		'notifications would be lost: enable it, or set WEB_CONCURRENCY=1'
+	)
+
+# Workers share their /metrics counts through snapshot files in this
+# directory (see utils/metrics.py). It must be set before the app is imported.
+if 'METRICS_DIR' not in os.environ:
+	os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='ruswapping-metrics-')
+
+# Import the app once in the master so workers fork with it already loaded.
+# Code changes then need a full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so slow leaks cannot accumulate.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+	# Counts from a previous server would otherwise be added to this one's.
+	from utils.metrics import clear_snapshots
+	clear_snapshots()
+
+
+def post_fork(server, worker):
+	# Never share the master's MongoDB sockets or monitor threads with a worker.
+	from utils.db import reset_client
+	reset_client()
+
+
+def post_worker_init(worker):
+	# Follow the change stream from boot, not from the worker's first poll, so
+	# events for users who later poll this worker are not missed.
+	from routes.match_events import start_change_stream_listener
+	from utils.metrics import start_snapshots
+	start_change_stream_listener()
+	start_snapshots()
+
+
+def worker_exit(server, worker):
+	# Run the stored-match refreshes still waiting out their debounce, so an
+	# edit made just before a restart or max_requests recycle is not lost.
+	from routes.preference_swapping_requests import match_worker
+	from utils.metrics import write_snapshot
+	match_worker.shutdown()
+	write_snapshot()
+
+
+def child_exit(server, worker):
+	# Keep an exited worker's counts, so the totals never go down.
+	from utils.metrics import archive_snapshot
+	archive_snapshot(worker.pid)
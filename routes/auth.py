@@ -1,32 +1,33 @@
-from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template
-from werkzeug.security import generate_password_hash, check_password_hash
-from pymongo import MongoClient
+from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template, g, has_request_context
 from bson import ObjectId
-import os
 from datetime import datetime
+import os
 import re
-from dotenv import load_dotenv
-
-
-load_dotenv()
+from utils.cache import TTLCache
+from utils.db import collection
+from utils.passwords import (
+    HashingBusy, RateLimited, check_login_limits, check_rate_limits, hash_password, login_failed,
+    needs_rehash, rehash_in_background, verify_password
+)
 
-# MongoDB connection
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+users_collection = collection('users')
 
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=20000)
-    client.admin.command('ping')
-    print("MongoDB connected successfully!")
-except Exception as e:
-    print(f" MongoDB connection failed: {e}")
-    print("Please set MONGO_URI to your Atlas URI or start local MongoDB on 27017")
-    raise
-
-db = client["RUSwapping"]
-users_collection = db['users']
+# How long (seconds) a user's profile may be served from the in-process cache
+# before it is re-read from MongoDB. 0 trusts the signed session data alone.
+USER_PROFILE_TTL = float(os.environ.get('USER_PROFILE_TTL', 0))
+user_profile_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_PROFILE_CACHE_SIZE', 10000)),
+    ttl=USER_PROFILE_TTL
+)
 
 auth = Blueprint('auth', __name__)
 
+def too_many_requests(retry_after=1):
+    """429 response for rate-limited or saturated password endpoints"""
+    response = jsonify({'error': 'Too many attempts. Please wait a moment and try again.'})
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.5)))
+    return response, 429
+
 def is_rutgers_email(email):
     """Check if email is a valid Rutgers email address"""
     # Only allow @scarletmail.rutgers.edu addresses
@@ -47,12 +48,13 @@ def register():
             return jsonify({'error': 'Please use a valid Rutgers email address'}), 400
         
         try:
+            check_rate_limits(request.remote_addr, email)
             if users_collection.find_one({'email': email}):
                 return jsonify({'error': 'Email already registered'}), 400
             
             user_data = {
                 'email': email,
-                'password_hash': generate_password_hash(password),
+                'password_hash': hash_password(password),
                 'name': name,
                 'created_at': datetime.utcnow()
             }
@@ -61,6 +63,10 @@ def register():
             
             return jsonify({'message': 'Registration successful! Please log in.'}), 201
             
+        except RateLimited as e:
+            return too_many_requests(e.retry_after)
+        except HashingBusy:
+            return too_many_requests()
         except Exception as e:
             print(f"Database error during registration: {e}")
             return jsonify({'error': 'Registration failed. Please try again.'}), 500
@@ -75,22 +81,40 @@ def login():
         password = data.get('password')
         
         try:
+            check_login_limits(request.remote_addr, email)
             # Check if email and password are valid
             user_data = users_collection.find_one({'email': email})
-            if user_data and check_password_hash(user_data['password_hash'], password):
+            if user_data and password and verify_password(user_data['password_hash'], password):
+                if needs_rehash(user_data['password_hash']):
+                    upgrade_password_hash(user_data['_id'], user_data['password_hash'], password)
                 # Store user info in session
                 session['user_id'] = str(user_data['_id'])
                 session['user_email'] = user_data['email']
                 session['user_name'] = user_data['name']
                 return jsonify({'message': 'Login successful!', 'redirect': url_for('dashboard')}), 200
             else:
+                login_failed(request.remote_addr)
                 return jsonify({'error': 'Invalid email or password'}), 401
+        except RateLimited as e:
+            return too_many_requests(e.retry_after)
+        except HashingBusy:
+            return too_many_requests()
         except Exception as e:
             print(f"Database error during login: {e}")
             return jsonify({'error': 'Login failed. Please try again.'}), 500
     else:
         return render_template('login.html')
 
+def upgrade_password_hash(user_id, old_hash, password):
+    """Re-hash a password made with an older method or cost, without delaying the login response"""
+    def store(new_hash):
+        # Guard on the old hash so a concurrent password change is never overwritten
+        users_collection.update_one(
+            {'_id': user_id, 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash}}
+        )
+    rehash_in_background(password, store)
+
 @auth.route('/logout')
 def logout():
     # Clear session
@@ -122,12 +146,41 @@ def login_required(f):
     return decorated_function
 
 def get_current_user():
-    """Get current user data from session"""
+    """Get current user data from session, memoized on flask.g for the request"""
     if 'user_id' not in session:
         return None
-    
+
+    if 'current_user' not in g:
+        g.current_user = load_current_user()
+    return g.current_user
+
+def load_current_user():
+    """Build the current user from the signed session, refreshing it from the database when needed"""
+    user_id = session['user_id']
+    if not USER_PROFILE_TTL and 'user_email' in session and 'user_name' in session:
+        return {
+            'id': user_id,
+            'email': session['user_email'],
+            'name': session['user_name']
+        }
+
+    user = user_profile_cache.get(user_id)
+    if user is None:
+        user = fetch_user(user_id)
+        if user is None:
+            return None
+        user_profile_cache.set(user_id, user)
+    session['user_email'] = user['email']
+    session['user_name'] = user['name']
+    return user
+
+def fetch_user(user_id):
+    """Read a user's profile from the database"""
     try:
-        user_data = users_collection.find_one({'_id': ObjectId(session['user_id'])})
+        user_data = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            {'email': 1, 'name': 1}
+        )
         if user_data:
             return {
                 'id': str(user_data['_id']),
@@ -136,5 +189,13 @@ def get_current_user():
             }
     except Exception:
         pass
-    
-    return None 
\ No newline at end of file
+
+    return None
+
+def invalidate_user(user_id):
+    """Forget cached profile data for a user whose profile has changed"""
+    user_profile_cache.pop(user_id)
+    if has_request_context() and session.get('user_id') == user_id:
+        session.pop('user_email', None)
+        session.pop('user_name', None)
+        g.pop('current_user', None)
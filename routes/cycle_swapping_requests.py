@@ -1,22 +1,47 @@
 from flask import Blueprint, request, jsonify
-from dotenv import load_dotenv
 from datetime import datetime
-from pymongo import MongoClient
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from routes.auth import login_required, get_current_user
+from utils.apartments import REQUEST_APARTMENT_FIELDS, UnknownApartment, resolve_fields
+from utils.db import collection
+from utils.expiry import is_expired, with_expiry
+from utils.http_cache import CYCLE, VersionSync, conditional, record_write
+from utils.cycle_graph import CYCLE_PROJECTION, CycleGraph
+from utils.pagination import InvalidPageArgs, encode_cursor, page_args
+from utils.pubsub import MATCH_EVENTS_CHANGE_STREAM, broker, publish_match_event
+from utils.utils import with_id
 import os
 
-load_dotenv()
+swap_requests_collection = collection('swap_requests')
+users_collection = collection('users')
 
-# MongoDB connection (kept local to avoid circular imports)
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=20000)
-db = client["RUSwapping"]
+cycle_swapping_requests_bp = Blueprint('cycle_swapping_requests', __name__)
 
-swap_requests_collection = db['swap_requests']
-users_collection = db['users']
+# Longest cycle (number of participants) searched for. A worker reloads its
+# graph when another process bumps the cycle version, and at least every
+# CYCLE_GRAPH_MAX_AGE seconds so requests removed by the expiry TTL index drop out.
+CYCLE_MAX_LENGTH = int(os.environ.get('CYCLE_MAX_LENGTH', 4))
+CYCLE_GRAPH_MAX_AGE = float(os.environ.get('CYCLE_GRAPH_MAX_AGE', 300))
 
-cycle_swapping_requests_bp = Blueprint('cycle_swapping_requests', __name__)
+cycle_graph = CycleGraph(max_length=CYCLE_MAX_LENGTH)
+cycle_graph_sync = VersionSync(CYCLE, max_age=CYCLE_GRAPH_MAX_AGE)
+
+def load_cycle_graph():
+	cycle_graph.load(r for r in swap_requests_collection.find({'type': 'cycle_request'}, {**CYCLE_PROJECTION, 'expires_at': 1}) if not is_expired(r))
+
+def get_cycle_graph():
+	"""Return the process-wide cycle graph, loading it from MongoDB when stale."""
+	cycle_graph_sync.refresh(load_cycle_graph)
+	return cycle_graph
+
+def notify_matches(request_doc, position=None):
+	"""Push a match event to everyone in a cycle with the given cycle request."""
+	if not broker.listening():
+		return
+	cycles = get_cycle_graph().find_cycles(request_doc.get('user_id'))
+	publish_match_event('cycle', [member['user_id'] for cycle in cycles for member in cycle[1:]], position)
 
 @cycle_swapping_requests_bp.route('/create-cycle-request', methods=['POST'])
 @login_required
@@ -36,13 +61,6 @@ def create_cycle_request():
 	if not current_apartment or not desired_choice:
 		return jsonify({'error': 'current_apartment and desired_choice are required'}), 400
 
-	existing_request = swap_requests_collection.find_one({
-		'user_id': current_user['id'],
-		'type': 'cycle_request'
-	})
-	if existing_request:
-		return jsonify({'error': 'You already have a cycle request. Please delete your existing cycle request first or update it.'}), 400
-
 	doc = {
 		'user_id': current_user['id'],
 		'user_name': current_user['name'],
@@ -53,9 +71,22 @@ def create_cycle_request():
 		'created_at': datetime.utcnow(),
 		'type': 'cycle_request'
 	}
+	doc = with_expiry(doc)
+	try:
+		resolve_fields(doc, REQUEST_APARTMENT_FIELDS['cycle_request'])
+	except UnknownApartment as e:
+		return jsonify({'error': str(e)}), 400
+
+	# The user_id_type_unique index rejects a second cycle request atomically.
+	try:
+		res = swap_requests_collection.insert_one(doc)
+	except DuplicateKeyError:
+		return jsonify({'error': 'You already have a cycle request. Please delete your existing cycle request first or update it.'}), 400
+	record_write(CYCLE)
+	cycle_graph.add(doc)
+	if not MATCH_EVENTS_CHANGE_STREAM:
+		notify_matches(doc)
 
-	res = swap_requests_collection.insert_one(doc)
-    
 	return jsonify({'message': 'Cycle swap request created successfully!', 'request_id': str(res.inserted_id)}), 201
 
 @cycle_swapping_requests_bp.route('/update-cycle-request', methods=['POST'])
@@ -71,10 +102,6 @@ def update_cycle_request():
 		return jsonify({'error': 'request_id is required'}), 400
 
 	current_user = get_current_user()
-	existing_request = swap_requests_collection.find_one({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'cycle_request'})
-	if not existing_request:
-		return jsonify({'error': 'Request not found or not authorized'}), 404
-
 	update_data = {}
 	if 'current_apartment' in request_data:
 		update_data['current_apartment'] = request_data.get('current_apartment')
@@ -87,16 +114,36 @@ def update_cycle_request():
 
 	if not update_data:
 		return jsonify({'error': 'No updatable fields provided'}), 400
+	try:
+		resolve_fields(update_data, REQUEST_APARTMENT_FIELDS['cycle_request'])
+	except UnknownApartment as e:
+		return jsonify({'error': str(e)}), 400
+
+	# The previous version comes back with the update, so no separate read is
+	# needed to tell what changed.
+	existing_request = swap_requests_collection.find_one_and_update(
+		{'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'cycle_request'},
+		{'$set': with_expiry({**update_data, 'updated_at': datetime.utcnow()})},
+		return_document=ReturnDocument.BEFORE
+	)
+	if not existing_request:
+		return jsonify({'error': 'Request not found or not authorized'}), 404
 
-	update_data['updated_at'] = datetime.utcnow()
-	result = swap_requests_collection.update_one({'_id': ObjectId(request_id), 'user_id': current_user['id']}, {'$set': update_data})
-	if result.modified_count > 0:
+	updated_request = {**existing_request, **update_data}
+	changed = updated_request != existing_request
+	if changed:
+		record_write(CYCLE)
+	cycle_graph.add(updated_request)
+	if changed and not MATCH_EVENTS_CHANGE_STREAM:
+		notify_matches(updated_request)
+	if changed:
 		return jsonify({'message': 'Cycle swap request updated successfully!'}), 200
 	else:
 		return jsonify({'message': 'No changes applied'}), 200
 
 @cycle_swapping_requests_bp.route('/get-cycle-requests', methods=['GET'])
 @login_required
+@conditional
 def get_cycle_request():
 	"""Return the current user's active cycle request."""
 	current_user = get_current_user()
@@ -106,8 +153,7 @@ def get_cycle_request():
 	})
 	if user_request:
 		user_request['is_own'] = True
-		from utils.utils import to_jsonable
-		return jsonify([to_jsonable(user_request)])
+		return jsonify([with_id(user_request)])
 	else:
 		return jsonify([])
 
@@ -120,51 +166,79 @@ def delete_cycle_request(request_id):
 	result = swap_requests_collection.delete_one({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'cycle_request'})
 	if result.deleted_count == 0:
 		return jsonify({'error': 'Request not found or not authorized'}), 404
+	record_write(CYCLE)
+	cycle_graph.remove(current_user['id'])
 	return jsonify({'message': 'Cycle swap request deleted successfully'}), 200
 
 @cycle_swapping_requests_bp.route('/get-cycle-matches', methods=['GET'])
 @login_required
+@conditional
 def get_cycle_matches():
-	"""Get cycle matches for the current user (direct swaps first)."""
+	"""Get swap cycles (direct swaps first, then longer chains) for the current user.
+
+	Accepts `limit` and `cursor` like /get-matches.
+	"""
 	current_user = get_current_user()
 	if not current_user:
 		return jsonify([])
 
-	# Fetch current user's active cycle request
-	my_request = swap_requests_collection.find_one({
-		'user_id': current_user['id'],
-		'type': 'cycle_request'
-	})
-	if not my_request:
-		return jsonify([])
-
-	my_current_apartment = my_request.get('current_apartment')
-	my_desired_choice = my_request.get('desired_choice')
-
-	matches = []
-
-	# First, look for direct 2-way swaps
-	for other_request in swap_requests_collection.find({'type': 'cycle_request'}):
-		
-		# Skip own document
-		if other_request.get('user_id') == current_user['id']:
-			continue
-
-		other_current_apartment = other_request.get('current_apartment')
-		other_desired_choice = other_request.get('desired_choice')
-		other_user_email_display = other_request.get('email', '')
-
-		# Direct swap: I want their place, they want my place
-		if (my_desired_choice == other_current_apartment and 
-			other_desired_choice == my_current_apartment):
-
-			matches.append({
-				'other_user_id': other_request.get('user_id'),
-				'other_user_name': other_request.get('user_name', ''),
-				'other_current_apartment': other_current_apartment,
-				'other_current_room': other_request.get('current_room', ''),
-				'my_preference_level': 1,
-				'other_user_email_display': other_user_email_display
-			})
-	
-	return jsonify(matches)
\ No newline at end of file
+	try:
+		limit, after = page_args(request.args)
+		matches, next_cursor = cycle_matches_for_user(current_user['id'], limit, after)
+	except InvalidPageArgs as e:
+		return jsonify({'error': str(e)}), 400
+
+	response = jsonify(matches)
+	if next_cursor:
+		response.headers['X-Next-Cursor'] = next_cursor
+	return response
+
+def cycle_matches_for_user(user_id, limit, after=None):
+	"""One page of swap cycles through user_id's request, shortest first.
+
+	Returns (matches, next_cursor). Cycles are recomputed per call, so the
+	cursor is simply the number of cycles already returned.
+	"""
+	try:
+		offset = int(after[0]) if after else 0
+	except (TypeError, ValueError):
+		raise InvalidPageArgs('Invalid cursor')
+	cycles = get_cycle_graph().find_cycles(user_id, limit=offset + limit + 1)
+	page = [cycle_to_match(cycle) for cycle in cycles[offset:offset + limit]]
+	next_cursor = encode_cursor([offset + limit]) if len(cycles) > offset + limit else None
+	return page, next_cursor
+
+def cycle_to_match(cycle):
+	"""Describe a cycle from the point of view of its first member."""
+	others = cycle[1:]
+	participants = [{
+		'user_id': member['user_id'],
+		'user_name': member['user_name'],
+		'current_apartment': member['current_apartment'],
+		'current_room': member['current_room'],
+		'email_display': member['email']
+	} for member in others]
+
+	match_types = {2: 'direct_swap', 3: 'three_way_chain'}
+	nxt = others[0]
+	match = {
+		'match_type': match_types.get(len(cycle), 'multi_way_cycle'),
+		'cycle_length': len(cycle),
+		'other_user_id': nxt['user_id'],
+		'other_user_name': nxt['user_name'],
+		'other_current_apartment': nxt['current_apartment'],
+		'other_current_room': nxt['current_room'],
+		'my_preference_level': 1,
+		'other_user_email_display': nxt['email'],
+		'participants': participants
+	}
+	if len(others) > 1:
+		third = others[1]
+		match.update({
+			'third_user_id': third['user_id'],
+			'third_user_name': third['user_name'],
+			'third_current_apartment': third['current_apartment'],
+			'third_current_room': third['current_room'],
+			'third_user_email_display': third['email']
+		})
+	return match
@@ -1,66 +1,187 @@
 import datetime
-from dotenv import load_dotenv
-from flask import Flask, render_template, session, redirect, url_for, request, jsonify
+from flask import Flask, render_template, session, redirect, url_for, request, jsonify, current_app
+from flask.cli import with_appcontext
+from werkzeug.middleware.proxy_fix import ProxyFix
 from routes.auth import auth, login_required
-from routes.preference_swapping_requests import pref_swap_requests_bp
-from routes.cycle_swapping_requests import cycle_swapping_requests_bp
+from routes.preference_swapping_requests import pref_swap_requests_bp, matches_for_user
+from routes.cycle_swapping_requests import CYCLE_MAX_LENGTH, cycle_swapping_requests_bp, cycle_matches_for_user
+from routes.match_events import match_events_bp
+from routes.metrics import metrics_bp
 import os
 from routes.auth import get_current_user
 from bson import ObjectId
 from datetime import datetime
-from pymongo import MongoClient
-from utils.utils import to_jsonable
+from utils.utils import with_id
+from utils.apartments import backfill_request_ids, catalog, read_labels_csv
+from utils.db import collection, get_db
+from utils.expiry import backfill_expiry, move_interests, touch_requests
+from utils.batch_matching import run_batch_matching
+from utils.bulk_io import BulkImporter, detect_format, iter_cycle_rows, iter_preference_rows, read_rows, write_rows
+from utils.http_cache import CYCLE, PREFERENCE, bump_version, conditional
+from utils.indexes import INDEXES, check_indexes, ensure_indexes
+from utils.json_provider import MongoJSONProvider
+from utils.memory_db import MemoryDatabase
+from utils.pagination import DEFAULT_PAGE_SIZE
+from utils import assets, metrics
+import click
+import pymongo
+from pymongo.errors import PyMongoError
 import json
+import time
 
 
-load_dotenv()
+users_collection = collection('users')
+swap_requests_collection = collection('swap_requests')
 
-# MongoDB connection
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=20000)
-db = client["RUSwapping"]
+# How long /readyz waits for MongoDB, and how long a successful check is reused.
+READYZ_TIMEOUT = float(os.environ.get('READYZ_TIMEOUT', 2))
+READYZ_CACHE_SECONDS = float(os.environ.get('READYZ_CACHE_SECONDS', 5))
+# Reverse proxies (load balancer, nginx) in front of the app. Their
+# X-Forwarded-For/-Proto/-Host headers are trusted for that many hops, so
+# request.remote_addr, which the login rate limits key on, is the client's.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+_ready_until = 0.0
 
-users_collection = db['users']
-swap_requests_collection = db['swap_requests'] 
+def create_app(config=None):
+	"""Build the Flask application.
 
-# Flask application setup
-main = Flask(__name__, static_folder='../static', template_folder='../templates')
+	Nothing here touches MongoDB: connections are opened on first use, so a
+	worker is up in milliseconds and reports through /readyz when it can
+	actually serve requests.
+	"""
+	app = Flask(__name__, static_folder='../static', template_folder='../templates')
 
-# Secret key used for session cookies (loaded from env with a dev fallback)
-main.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret')
+	# Secret key used for session cookies (loaded from env with a dev fallback)
+	app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret')
+	app.config.update(config or {})
 
-# Register authentication routes (login, register, logout)
-main.register_blueprint(auth)
+	if TRUSTED_PROXIES:
+		app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES, x_host=TRUSTED_PROXIES)
 
-# Register swap requests blueprint
-main.register_blueprint(pref_swap_requests_bp)
+	# Encode ObjectId and other BSON types directly (orjson when installed)
+	app.json = MongoJSONProvider(app)
 
-# Register cycle requests blueprint
-main.register_blueprint(cycle_swapping_requests_bp)
+	# Register authentication routes (login, register, logout)
+	app.register_blueprint(auth)
+
+	# Register swap requests blueprint
+	app.register_blueprint(pref_swap_requests_bp)
+
+	# Register cycle requests blueprint
+	app.register_blueprint(cycle_swapping_requests_bp)
+
+	# Register live match notifications (polled by the dashboard pages)
+	app.register_blueprint(match_events_bp)
+
+	# Fingerprinted, precompressed CSS/JS from `flask build-assets`, if built
+	assets.init_app(app)
+
+	# Per-endpoint latency and MongoDB command metrics, served on /metrics
+	metrics.init_app(app)
+	app.register_blueprint(metrics_bp)
+
+	app.before_request(refresh_request_expiry)
+
+	app.add_url_rule('/', 'home', home)
+	app.add_url_rule('/dashboard', 'dashboard', dashboard)
+	app.add_url_rule('/preference-swapping', 'preference_swapping', preference_swapping)
+	app.add_url_rule('/cycle-swapping', 'cycle_swapping', cycle_swapping)
+	app.add_url_rule('/dashboard-state', 'dashboard_state', dashboard_state, methods=['GET'])
+	app.add_url_rule('/healthz', 'healthz', healthz, methods=['GET'])
+	app.add_url_rule('/readyz', 'readyz', readyz, methods=['GET'])
+
+	for command in CLI_COMMANDS:
+		app.cli.add_command(command)
+	return app
+
+def refresh_request_expiry():
+	"""Keep an active user's requests from expiring (throttled per user)."""
+	# static files are the same for everyone: reading the session would add Vary: Cookie
+	if request.endpoint == 'static':
+		return
+	touch_requests(session.get('user_id'))
+
+def healthz():
+	"""Liveness: the process is up and serving requests."""
+	return jsonify({'status': 'ok'})
+
+def readyz():
+	"""Readiness: MongoDB answers and every declared index exists."""
+	global _ready_until
+	if time.monotonic() < _ready_until:
+		return jsonify({'status': 'ready'})
+	try:
+		with pymongo.timeout(READYZ_TIMEOUT):
+			db = get_db()
+			db.command('ping')
+			report = check_indexes(db)
+	except PyMongoError as e:
+		return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+	missing = {name: result['missing'] for name, result in report.items() if result['missing']}
+	if missing:
+		return jsonify({'status': 'missing_indexes', 'missing': missing}), 503
+	_ready_until = time.monotonic() + READYZ_CACHE_SECONDS
+	return jsonify({'status': 'ready'})
+
+DASHBOARD_SECTIONS = {'user', 'requests', 'cycle_requests', 'matches', 'cycle_matches'}
 
-@main.route('/')
 def home():
 	"""Render the public home page."""
 	return render_template('home.html')
 
-@main.route('/dashboard')
 @login_required
 def dashboard():
 	"""Redirect to preference swapping page (legacy support)."""
 	return redirect(url_for('preference_swapping'))
 
-@main.route('/preference-swapping')
 @login_required
 def preference_swapping():
 	"""Render the preference-based swapping page."""
 	return render_template('preference_swapping.html')
 
-@main.route('/cycle-swapping')
 @login_required
 def cycle_swapping():
 	"""Render the cycle swapping page."""
 	return render_template('cycle_swapping.html')
 
+@login_required
+@conditional
+def dashboard_state():
+	"""Return user info, own requests and matches for the dashboard pages in one response.
+
+	`include` optionally limits the sections to a comma-separated subset of
+	user, requests, cycle_requests, matches and cycle_matches.
+	"""
+	current_user = get_current_user()
+	if not current_user:
+		return jsonify({'error': 'User not found'}), 404
+
+	sections = set(filter(None, request.args.get('include', '').split(','))) or DASHBOARD_SECTIONS
+
+	# One lookup fetches both of the user's own requests
+	own_requests = {}
+	if sections & {'requests', 'cycle_requests'}:
+		for doc in swap_requests_collection.find({
+			'user_id': current_user['id'],
+			'type': {'$in': ['swap_request', 'cycle_request']}
+		}):
+			own_requests[doc['type']] = doc
+
+	state = {}
+	if 'user' in sections:
+		state['user'] = current_user
+	for section, request_type in (('requests', 'swap_request'), ('cycle_requests', 'cycle_request')):
+		if section in sections:
+			doc = own_requests.get(request_type)
+			state[section] = [with_id({**doc, 'is_own': True})] if doc else []
+	if 'matches' in sections:
+		state['matches'], state['matches_next_cursor'] = matches_for_user(current_user['id'], DEFAULT_PAGE_SIZE)
+	if 'cycle_matches' in sections:
+		state['cycle_matches'], state['cycle_matches_next_cursor'] = cycle_matches_for_user(
+			current_user['id'], DEFAULT_PAGE_SIZE
+		)
+	return jsonify(state)
+
 def show_requests():
 	"""Show all requests."""
 
@@ -68,3 +189,134 @@ def show_requests():
 	for request in requests:
 		print(request)
 
+@click.command('match-all')
+@click.option('--assign', is_flag=True, help='Keep at most one partner per user, taking the highest-weight pairs first (greedy, at least half the optimal total weight).')
+@click.option('--interval', type=float, default=0, help='Re-run every INTERVAL seconds instead of once.')
+@click.option('--engine', type=click.Choice(['python', 'numpy']), default='python', help='Pair matching implementation (numpy must be installed).')
+def match_all(assign, interval, engine):
+	"""Precompute all preference matches into the matches collection."""
+	while True:
+		stats = run_batch_matching(get_db(), assign=assign, engine=engine)
+		click.echo(
+			f"[{stats['started_at']:%Y-%m-%d %H:%M:%S}] {stats['mode']} ({stats['engine']}): "
+			f"{stats['pairs']} pairs from {stats['requests']} requests in {stats['duration_seconds']}s"
+		)
+		if not interval:
+			break
+		time.sleep(interval)
+
+@click.command('ensure-indexes')
+@click.option('--check', is_flag=True, help='Only report missing and extra indexes, create nothing.')
+def ensure_indexes_command(check):
+	"""Create the declared MongoDB indexes (idempotent)."""
+	db = get_db()
+	report = check_indexes(db) if check else ensure_indexes(db)
+	for name, result in report.items():
+		click.echo(f'{name}:')
+		for key in ('missing', 'conflicting', 'extra', 'created', 'failed'):
+			for index_name in result.get(key, []):
+				click.echo(f'  {key}: {index_name}')
+	if any(result['missing'] for result in report.values()) and check:
+		raise SystemExit(1)
+
+@click.command('import-apartments')
+@click.argument('csv_file', type=click.File('r'))
+def import_apartments(csv_file):
+	"""Add the apartments listed in CSV_FILE to the apartment catalog."""
+	added, existing = catalog.import_labels(read_labels_csv(csv_file))
+	click.echo(f'{added} apartments added, {existing} already in the catalog')
+
+@click.command('backfill-apartment-ids')
+def backfill_apartment_ids():
+	"""Store apartment catalog IDs on requests created before the catalog existed."""
+	updated = backfill_request_ids(get_db(), lambda label: catalog.resolve(label, create=True))
+	if updated:
+		bump_version(PREFERENCE, CYCLE)
+	click.echo(f'{updated} requests updated')
+
+def memory_database():
+	"""An empty in-memory stand-in for MongoDB with the declared indexes."""
+	db = MemoryDatabase()
+	for name, models in INDEXES.items():
+		db[name].create_indexes(models)
+	return db
+
+def bulk_import(db, path, fmt, batch_size, password_method, hash_workers=None):
+	with open(path, newline='') as f:
+		importer = BulkImporter(db, batch_size=batch_size, password_method=password_method, hash_workers=hash_workers)
+		return importer.run(read_rows(f, detect_format(path, fmt)))
+
+@click.command('import-requests')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Input format (default: from the file extension).')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+@click.option('--password-method', help='Hash method for plain-text passwords (default: $PASSWORD_HASH_METHOD). A cheaper method loads faster but leaves weak hashes until each user logs in.')
+@click.option('--hash-workers', type=int, help='Processes hashing passwords in parallel (default: one per CPU).')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write every rejected row to this file.')
+@click.option('--in-memory', is_flag=True, help='Load into an in-memory database instead: validates the file without touching MongoDB.')
+def import_requests(path, fmt, batch_size, password_method, hash_workers, errors_path, in_memory):
+	"""Bulk-load users and swap/cycle requests from a CSV or JSONL file."""
+	started = time.perf_counter()
+	stats = bulk_import(memory_database() if in_memory else get_db(), path, fmt, batch_size, password_method, hash_workers)
+	if not in_memory and stats['requests_created']:
+		bump_version(PREFERENCE, CYCLE)
+	click.echo(
+		f"{stats['rows']} rows: {stats['users_created']} users and {stats['requests_created']} requests created, "
+		f"{len(stats['errors'])} rows rejected in {time.perf_counter() - started:.1f}s"
+	)
+	for number, message in stats['errors'][:20]:
+		click.echo(f'  row {number}: {message}')
+	if errors_path:
+		with open(errors_path, 'w', newline='') as f:
+			write_rows(({'row': n, 'error': m} for n, m in stats['errors']), f, 'jsonl')
+
+@click.command('export-matches')
+@click.argument('output', type=click.File('w'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Output format (default: from the file extension).')
+@click.option('--kind', type=click.Choice(['all', 'preference', 'cycle']), default='all', show_default=True)
+@click.option('--engine', type=click.Choice(['python', 'numpy']), default='python', help='Pair matching implementation.')
+@click.option('--from-store', is_flag=True, help='Stream the precomputed matches collection instead of recomputing preference matches.')
+@click.option('--limit', type=int, default=5, show_default=True, help='Most cycles searched per cycle request.')
+@click.option('--in-memory-from', type=click.Path(exists=True, dir_okay=False), help='Import this file into an in-memory database and export its matches, without MongoDB.')
+def export_matches(output, fmt, kind, engine, from_store, limit, in_memory_from):
+	"""Stream every current preference and cycle match to CSV or JSONL (OUTPUT may be -)."""
+	db = get_db()
+	if in_memory_from:
+		db = memory_database()
+		# the hashes are thrown away with the database, so none need to be strong
+		bulk_import(db, in_memory_from, None, 1000, 'pbkdf2:sha256:1')
+	rows = []
+	cycle_stats = {}
+	if kind in ('all', 'preference'):
+		rows.append(iter_preference_rows(db, engine=engine, store=from_store))
+	if kind in ('all', 'cycle'):
+		rows.append(iter_cycle_rows(db, max_length=CYCLE_MAX_LENGTH, limit=limit, stats=cycle_stats))
+	started = time.perf_counter()
+	count = write_rows((row for source in rows for row in source), output, detect_format(output.name, fmt))
+	click.echo(f'{count} matches exported in {time.perf_counter() - started:.1f}s', err=True)
+	if cycle_stats.get('truncated'):
+		click.echo(f"{cycle_stats['truncated']} cycle requests reached --limit {limit}; some of their cycles may be missing", err=True)
+
+@click.command('move-interests')
+def move_interests_command():
+	"""Move interest documents out of swap_requests into their own collection."""
+	click.echo(f'{move_interests(get_db())} interests moved')
+
+@click.command('backfill-expiry')
+def backfill_expiry_command():
+	"""Set expires_at on requests created before request expiry existed."""
+	click.echo(f'{backfill_expiry(get_db())} requests updated')
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+	"""Write fingerprinted, precompressed copies of the CSS and JS files to static/dist."""
+	manifest = assets.build_assets(current_app.static_folder)
+	encodings = 'gzip and brotli' if assets.brotli is not None else 'gzip (pip install brotli for .br)'
+	click.echo(f'{len(manifest)} assets built with {encodings}')
+
+CLI_COMMANDS = [
+	match_all, ensure_indexes_command, import_apartments, backfill_apartment_ids,
+	import_requests, export_matches, move_interests_command, backfill_expiry_command,
+	build_assets_command
+]
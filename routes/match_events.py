@@ -0,0 +1,154 @@
+from flask import Blueprint, jsonify, request
+from pymongo.errors import OperationFailure, PyMongoError
+from routes.auth import login_required, get_current_user
+from routes import cycle_swapping_requests, preference_swapping_requests
+from utils.db import collection
+from utils.pubsub import MATCH_EVENTS_CHANGE_STREAM, broker
+import os
+import threading
+import time
+
+swap_requests_collection = collection('swap_requests')
+
+match_events_bp = Blueprint('match_events', __name__)
+
+# How long one poll waits for an event before answering empty-handed. Pages
+# poll again at once, so a notification reaches them within moments of the
+# write. Each waiting poll holds a server thread; once MATCH_EVENTS_MAX_WAITERS
+# polls are waiting in this worker (keep it below GUNICORN_THREADS), further
+# polls answer at once and come back after MATCH_EVENTS_POLL_INTERVAL seconds.
+MATCH_EVENTS_WAIT = float(os.environ.get('MATCH_EVENTS_WAIT', 20))
+MATCH_EVENTS_MAX_WAITERS = int(os.environ.get('MATCH_EVENTS_MAX_WAITERS', 24))
+MATCH_EVENTS_POLL_INTERVAL = float(os.environ.get('MATCH_EVENTS_POLL_INTERVAL', 10))
+
+_waiters = threading.BoundedSemaphore(max(1, MATCH_EVENTS_MAX_WAITERS))
+# "$changeStream is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+_listener = None
+_listener_lock = threading.Lock()
+_listener_failed = False
+
+@match_events_bp.route('/match-events', methods=['GET'])
+@login_required
+def match_events():
+	"""Return the current user's match notifications after the cursor `since`.
+
+	The response carries the cursor to pass as `since` next time and how many
+	seconds to wait before doing so.
+	"""
+	user_id = get_current_user()['id']
+	start_change_stream_listener()
+	try:
+		since = int(request.args['since']) if request.args.get('since') else None
+	except ValueError:
+		return jsonify({'error': 'since must be an integer'}), 400
+
+	waiting = since is not None and MATCH_EVENTS_MAX_WAITERS > 0 and _waiters.acquire(blocking=False)
+	try:
+		events, cursor = broker.poll(user_id, since, timeout=MATCH_EVENTS_WAIT if waiting else 0)
+	finally:
+		if waiting:
+			_waiters.release()
+	if cursor is None:
+		# the change stream has not started yet
+		retry_after = 1
+	elif waiting or since is None:
+		retry_after = 0
+	else:
+		retry_after = MATCH_EVENTS_POLL_INTERVAL
+	# cursors can pass 2**53, so they are sent as strings
+	response = jsonify({
+		'events': events,
+		'cursor': None if cursor is None else str(cursor),
+		'retry_after': retry_after
+	})
+	response.headers['Cache-Control'] = 'no-store'
+	return response
+
+def start_change_stream_listener():
+	"""Start this worker's change-stream listener once, if enabled."""
+	global _listener
+	if not MATCH_EVENTS_CHANGE_STREAM or _listener_failed:
+		return
+	with _listener_lock:
+		if _listener is None or not _listener.is_alive():
+			_listener = threading.Thread(target=watch_requests, name='match-events', daemon=True)
+			_listener.start()
+
+def is_activity_refresh(change):
+	"""True for an update that only pushed back expires_at (see utils/expiry.py).
+
+	Every active user causes one of these now and then; they change nobody's
+	matches, so they are not worth a cache update and a round of notifications
+	in every worker.
+	"""
+	if change['operationType'] != 'update':
+		return False
+	description = change.get('updateDescription') or {}
+	return not description.get('removedFields') and set(description.get('updatedFields') or ()) <= {'expires_at'}
+
+def stream_position(timestamp):
+	"""A change's cluster time as one integer, the same in every worker."""
+	return timestamp.time << 32 | timestamp.inc
+
+def watch_requests():
+	"""Keep this worker's copies in step with every worker's request writes, and publish match events.
+
+	Write routes do not bump the version counters in this mode (see
+	utils.http_cache.record_write), so this is how the copies stay current.
+
+	Events are positioned by the cluster time of their change, which every
+	worker's listener sees alike. The app uses no multi-document
+	transactions, so no two changes share one.
+	"""
+	global _listener_failed
+	pipeline = [{'$match': {'$or': [
+		{
+			'operationType': {'$in': ['insert', 'update', 'replace']},
+			'fullDocument.type': {'$in': ['swap_request', 'cycle_request']}
+		},
+		# deletes carry only the _id; each cache ignores ids it does not hold
+		{'operationType': 'delete'}
+	]}}]
+	resume_token = None
+	while True:
+		try:
+			start_at = None
+			if resume_token is None:
+				start_at = swap_requests_collection.database.command('hello').get('operationTime')
+			with swap_requests_collection.watch(
+				pipeline, full_document='updateLookup', resume_after=resume_token, start_at_operation_time=start_at
+			) as changes:
+				if start_at is not None:
+					broker.advance(stream_position(start_at))
+				for change in changes:
+					resume_token = changes.resume_token
+					position = stream_position(change['clusterTime'])
+					doc = change.get('fullDocument')
+					if change['operationType'] == 'delete':
+						preference_swapping_requests.request_cache.remove_request(change['documentKey']['_id'])
+						cycle_swapping_requests.cycle_graph.remove_request(change['documentKey']['_id'])
+					elif doc and not is_activity_refresh(change):
+						if doc['type'] == 'swap_request':
+							preference_swapping_requests.request_cache.add(doc)
+							preference_swapping_requests.notify_matches(doc, position)
+						else:
+							cycle_swapping_requests.cycle_graph.add(doc)
+							cycle_swapping_requests.notify_matches(doc, position)
+					broker.advance(position)
+		except OperationFailure as e:
+			if e.code != CHANGE_STREAM_UNSUPPORTED:
+				print(f"Match event change stream error: {e}")
+				time.sleep(5)
+				continue
+			print(
+				"MATCH_EVENTS_CHANGE_STREAM is on but MongoDB is not a replica set, so there "
+				"will be no match notifications: use a replica set or Atlas, or run one worker "
+				"with the change stream off"
+			)
+			_listener_failed = True
+			return
+		except PyMongoError as e:
+			print(f"Match event change stream error: {e}")
+			time.sleep(5)
@@ -0,0 +1,18 @@
+from flask import Blueprint, Response, request
+from utils import metrics
+import hmac
+import os
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# When set, scrapers must send "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+	"""Expose request and MongoDB metrics, summed over every worker, in the Prometheus text format."""
+	if METRICS_TOKEN:
+		supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+		if not hmac.compare_digest(supplied, METRICS_TOKEN):
+			return Response('Unauthorized\n', status=401, mimetype='text/plain')
+	return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,23 +1,87 @@
 from flask import Blueprint, request, jsonify
-from dotenv import load_dotenv
 from datetime import datetime
-from pymongo import MongoClient
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from routes.auth import login_required, get_current_user
+from utils.apartments import REQUEST_APARTMENT_FIELDS, UnknownApartment, resolve_fields
+from utils.batch_matching import recompute_apartments
+from utils.db import collection, get_db
+from utils.expiry import is_expired, with_expiry
+from utils.http_cache import PREFERENCE, VersionSync, conditional, record_write
+from utils.match_worker import MatchWorker
+from utils.matching import CANDIDATE_PROJECTION, find_matches, get_choices, iter_matches, match_sort_key
+from utils.pagination import InvalidPageArgs, page_args, top_k
+from utils.pubsub import MATCH_EVENTS_CHANGE_STREAM, broker, publish_match_event
+from utils.request_cache import RequestCache
+from utils.utils import apply_set, dotted_set, with_id
+import atexit
 import os
 
-load_dotenv()
+swap_requests_collection = collection('swap_requests')
+users_collection = collection('users')
+matches_collection = collection('matches')
+interests_collection = collection('interests')
 
-# MongoDB connection (kept local to avoid circular imports)
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=20000)
-db = client["RUSwapping"]
+# Serve /get-matches from the materialized `matches` collection instead of
+# computing matches on every call. Writes keep the collection current through
+# a background worker; `flask match-all` rebuilds it from scratch.
+MATCH_STORE_ENABLED = os.environ.get('MATCH_STORE_ENABLED', '').lower() in ('1', 'true', 'yes')
 
-swap_requests_collection = db['swap_requests']
-users_collection = db['users']
+# Otherwise matches are computed from this worker's in-memory copy of the
+# active swap requests. It is reloaded when another process bumps the
+# preference version, and at least every REQUEST_CACHE_MAX_AGE seconds so
+# requests removed by the expiry TTL index drop out.
+REQUEST_CACHE_ENABLED = os.environ.get('REQUEST_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+REQUEST_CACHE_MAX_AGE = float(os.environ.get('REQUEST_CACHE_MAX_AGE', 300))
 
 pref_swap_requests_bp = Blueprint('pref_swap_requests', __name__)
 
+request_cache = RequestCache()
+request_cache_sync = VersionSync(PREFERENCE, max_age=REQUEST_CACHE_MAX_AGE)
+
+def load_request_cache():
+	requests = swap_requests_collection.find({'type': 'swap_request'}, {**CANDIDATE_PROJECTION, 'expires_at': 1})
+	request_cache.load(r for r in requests if not is_expired(r))
+
+def get_request_cache():
+	"""Return the process-wide swap request cache, reloading it when stale."""
+	request_cache_sync.refresh(load_request_cache)
+	return request_cache
+
+def refresh_stored_matches(apartments, user_ids):
+	recompute_apartments(get_db(), apartments, user_ids)
+
+match_worker = MatchWorker(
+	refresh_stored_matches,
+	debounce=float(os.environ.get('MATCH_WORKER_DEBOUNCE', 0.25)),
+	max_workers=int(os.environ.get('MATCH_WORKER_THREADS', 1))
+)
+# gunicorn workers also call this from the worker_exit hook
+atexit.register(match_worker.shutdown)
+
+def enqueue_recompute(*request_docs):
+	"""Schedule a stored-match refresh for the apartments the given versions of a request touch."""
+	if not MATCH_STORE_ENABLED:
+		return
+	apartments, user_ids = set(), set()
+	for doc in request_docs:
+		if doc:
+			apartments.add(doc.get('current_apartment_id'))
+			apartments.update(get_choices(doc))
+			user_ids.add(doc.get('user_id'))
+	match_worker.enqueue(apartments, user_ids)
+
+def notify_matches(request_doc, position=None):
+	"""Push a match event to every user the given swap request matches."""
+	if not broker.listening():
+		return
+	if REQUEST_CACHE_ENABLED:
+		matches = get_request_cache().matches(request_doc.get('user_id'))
+	else:
+		matches = find_matches(swap_requests_collection, request_doc)
+	publish_match_event('preference', [m['other_user_id'] for m in matches], position)
+
 @pref_swap_requests_bp.route('/create-request', methods=['POST'])
 @login_required
 def create_request():
@@ -37,13 +101,6 @@ def create_request():
 	if not current_apartment or not first_choice or not second_choice or not third_choice:
 		return jsonify({'error': 'All fields are required'}), 400
 
-	existing_request = swap_requests_collection.find_one({
-		'user_id': current_user['id'],
-		'type': 'swap_request'
-	})
-	if existing_request:
-		return jsonify({'error': 'You already have a swap request. Please delete your existing request first or update it.'}), 400
-
 	doc = {
 		'user_id': current_user['id'],
 		'user_name': current_user['name'],
@@ -58,8 +115,22 @@ def create_request():
 		'created_at': datetime.utcnow(),
 		'type': 'swap_request'
 	}
-
-	res = swap_requests_collection.insert_one(doc)
+	doc = with_expiry(doc)
+	try:
+		resolve_fields(doc, REQUEST_APARTMENT_FIELDS['swap_request'])
+	except UnknownApartment as e:
+		return jsonify({'error': str(e)}), 400
+
+	# The user_id_type_unique index rejects a second swap request atomically.
+	try:
+		res = swap_requests_collection.insert_one(doc)
+	except DuplicateKeyError:
+		return jsonify({'error': 'You already have a swap request. Please delete your existing request first or update it.'}), 400
+	record_write(PREFERENCE)
+	request_cache.add(doc)
+	enqueue_recompute(doc)
+	if not MATCH_EVENTS_CHANGE_STREAM:
+		notify_matches(doc)
 	return jsonify({'message': 'Swap request created successfully!', 'request_id': str(res.inserted_id)}), 201
 
 @pref_swap_requests_bp.route('/delete-request', methods=['POST'])
@@ -71,9 +142,12 @@ def delete_request():
 	if not request_id:
 		return jsonify({'error': 'request_id is required'}), 400
 	current_user = get_current_user()
-	result = swap_requests_collection.delete_one({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'})
-	if result.deleted_count == 0:
+	deleted = swap_requests_collection.find_one_and_delete({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'})
+	if deleted is None:
 		return jsonify({'error': 'Request not found or not authorized'}), 404
+	record_write(PREFERENCE)
+	request_cache.remove(current_user['id'])
+	enqueue_recompute(deleted)
 	return jsonify({'message': 'Swap request deleted successfully!'}), 200
 
 @pref_swap_requests_bp.route('/update-request', methods=['POST'])
@@ -89,10 +163,6 @@ def update_request():
 		return jsonify({'error': 'request_id is required'}), 400
 
 	current_user = get_current_user()
-	existing_request = swap_requests_collection.find_one({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'})
-	if not existing_request:
-		return jsonify({'error': 'Request not found or not authorized'}), 404
-
 	current_apartment = request_data.get('current_apartment')
 	first_choice = request_data.get('first_choice')
 	second_choice = request_data.get('second_choice')
@@ -104,7 +174,7 @@ def update_request():
 	if 'current_room' in request_data:
 		update_data['current_room'] = request_data.get('current_room', '')
 	if any(v is not None for v in [first_choice, second_choice, third_choice]):
-		prefs = existing_request.get('preferences', {})
+		prefs = {}
 		if first_choice is not None:
 			prefs['first_choice'] = first_choice
 		if second_choice is not None:
@@ -115,16 +185,36 @@ def update_request():
 
 	if not update_data:
 		return jsonify({'error': 'No updatable fields provided'}), 400
+	try:
+		resolve_fields(update_data, REQUEST_APARTMENT_FIELDS['swap_request'])
+	except UnknownApartment as e:
+		return jsonify({'error': str(e)}), 400
+
+	# Only the given fields are $set (preferences.* individually), and the
+	# previous version comes back from the same round trip.
+	set_fields = dotted_set(update_data)
+	existing_request = swap_requests_collection.find_one_and_update(
+		{'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'},
+		{'$set': with_expiry({**set_fields, 'updated_at': datetime.utcnow()})},
+		return_document=ReturnDocument.BEFORE
+	)
+	if not existing_request:
+		return jsonify({'error': 'Request not found or not authorized'}), 404
 
-	update_data['updated_at'] = datetime.utcnow()
-	result = swap_requests_collection.update_one({'_id': ObjectId(request_id), 'user_id': current_user['id']}, {'$set': update_data})
-	if result.modified_count > 0:
+	updated_request = apply_set(existing_request, set_fields)
+	if updated_request != existing_request:
+		record_write(PREFERENCE)
+		request_cache.add(updated_request)
+		enqueue_recompute(existing_request, updated_request)
+		if not MATCH_EVENTS_CHANGE_STREAM:
+			notify_matches(updated_request)
 		return jsonify({'message': 'Swap request updated successfully!'}), 200
 	else:
 		return jsonify({'message': 'No changes applied'}), 200 
 
 @pref_swap_requests_bp.route('/get-requests', methods=['GET'])
 @login_required
+@conditional
 def get_request():
 	"""Return the current user's active swap request."""
 	current_user = get_current_user()
@@ -134,9 +224,7 @@ def get_request():
 	})
 	if user_request:
 		user_request['is_own'] = True
-		# Convert ObjectId to str and nested types
-		from utils.utils import to_jsonable
-		return jsonify([to_jsonable(user_request)])
+		return jsonify([with_id(user_request)])
 	else:
 		return jsonify([]) 
 
@@ -146,86 +234,65 @@ def delete_swap_request(request_id):
 	"""Delete a swap request permanently (matches frontend DELETE call)."""
 
 	current_user = get_current_user()
-	result = swap_requests_collection.delete_one({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'})
+	deleted = swap_requests_collection.find_one_and_delete({'_id': ObjectId(request_id), 'user_id': current_user['id'], 'type': 'swap_request'})
 
-	swap_requests_collection.delete_many({
-		'type': 'interest',
+	interests_collection.delete_many({
 		'$or': [
 			{'user_id': current_user['id']},
 			{'other_user_id': current_user['id']}
 		]
 	})
 
-	if result.deleted_count == 0:
+	if deleted is None:
 		return jsonify({'error': 'Request not found or not authorized'}), 404
 
+	record_write(PREFERENCE)
+	request_cache.remove(current_user['id'])
+	enqueue_recompute(deleted)
 	return jsonify({'message': 'Request deleted successfully'}), 200 
 
 	# Additional endpoints for frontend functionality
 @pref_swap_requests_bp.route('/get-matches', methods=['GET'])
 @login_required
+@conditional
 def get_matches():
-	"""Get mutual matches for the current user."""
+	"""Get mutual matches for the current user, best first.
+
+	Accepts `limit` and `cursor` query parameters; the cursor for the next
+	page, if any, is returned in the X-Next-Cursor header.
+	"""
 	current_user = get_current_user()
 	if not current_user:
 		return jsonify([])
 
-	# Fetch current user's active swap request
-	my_request = swap_requests_collection.find_one({
-		'user_id': current_user['id'],
-		'type': 'swap_request'
-	})
-	if not my_request:
-		return jsonify([])
-
-	my_current_apartment = my_request.get('current_apartment')
-	my_prefs = (my_request.get('preferences') or {})
-	my_choices = [
-		my_prefs.get('first_choice'),
-		my_prefs.get('second_choice'),
-		my_prefs.get('third_choice')
-	]
-
-	matches = []
-
-	# Loop through all other users' swap requests (exclude non-swap documents and self)
-	for other_request in swap_requests_collection.find({'type': 'swap_request'}):
-		# Skip own document
-		if other_request.get('user_id') == current_user['id']:
-			continue
-
-		other_prefs = (other_request.get('preferences') or {})
-		other_current_apartment = other_request.get('current_apartment')
-
-		other_choices = [
-			other_prefs.get('first_choice'),
-			other_prefs.get('second_choice'),
-			other_prefs.get('third_choice')
-		]
-
-		# Determine each side's preference levels
-		other_pref_level = None
-		my_pref_level = None
-
-		if my_current_apartment in other_choices:
-			other_pref_level = other_choices.index(my_current_apartment) + 1
-
-		if other_current_apartment in my_choices:
-			my_pref_level = my_choices.index(other_current_apartment) + 1
-
-		# Mutual match if both have each other in preferences
-		if other_pref_level is not None and my_pref_level is not None:
-			
-			other_user_email_display = other_request.get('email', '')
-			
-
-			matches.append({
-				'other_user_id': other_request.get('user_id') or str(other_request.get('_id')),
-				'other_user_name': other_request.get('user_name') or other_request.get('name', ''),
-				'other_current_apartment': other_current_apartment,
-				'other_current_room': other_request.get('current_room', ''),
-				'my_preference_level': my_pref_level,
-				'other_user_email_display': other_user_email_display
-			})
-
-	return jsonify(matches) 
\ No newline at end of file
+	try:
+		limit, after = page_args(request.args)
+		matches, next_cursor = matches_for_user(current_user['id'], limit, after)
+	except InvalidPageArgs as e:
+		return jsonify({'error': str(e)}), 400
+
+	response = jsonify(matches)
+	if next_cursor:
+		response.headers['X-Next-Cursor'] = next_cursor
+	return response
+
+def matches_for_user(user_id, limit, after=None):
+	"""One page of mutual matches for user_id's swap request.
+
+	Returns (matches, next_cursor).
+	"""
+	if MATCH_STORE_ENABLED:
+		# Matches precomputed by the batch matcher (see `flask match-all`)
+		matches = matches_collection.find(
+			{'user_id': user_id},
+			{'_id': 0, 'user_id': 0, 'computed_at': 0}
+		)
+	elif REQUEST_CACHE_ENABLED:
+		# No database round trip: the cache already holds every candidate
+		matches = get_request_cache().matches(user_id)
+	else:
+		my_request = swap_requests_collection.find_one({'user_id': user_id, 'type': 'swap_request'})
+		if not my_request:
+			return [], None
+		matches = iter_matches(swap_requests_collection, my_request)
+	return top_k(matches, match_sort_key, limit, after)
@@ -0,0 +1,22 @@
+// Flash message handling
+function showAlert(message, type = 'success') {
+    const alertDiv = document.createElement('div');
+    alertDiv.className = `alert alert-${type}`;
+    alertDiv.textContent = message;
+
+    const container = document.querySelector('.container');
+    container.insertBefore(alertDiv, container.firstChild);
+
+    setTimeout(() => {
+        alertDiv.remove();
+    }, 5000);
+}
+
+// API error handling
+function handleApiError(response) {
+    if (response.ok) return response;
+
+    return response.json().then(data => {
+        throw new Error(data.error || 'An error occurred');
+    });
+}
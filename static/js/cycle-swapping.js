@@ -5,105 +5,126 @@ let lastCycleUserRequest = null;
 
 // Load data when page loads
 document.addEventListener('DOMContentLoaded', function() {
-    loadUserInfo();
-    loadCycleUserRequest();
-    loadCycleMatches();
+    loadDashboardState();
+    subscribeToMatchEvents('cycle', loadCycleMatches);
 });
 
-async function loadUserInfo() {
-    try {
-        const response = await fetch('/get-user-info');
-        if (response.ok) {
-            const userData = await response.json();
-            const userDisplayName = document.getElementById('userDisplayName');
-            if (userDisplayName) {
-                const fullName = userData.name || 'User';
-                userDisplayName.textContent = fullName;
-            }
-        }
-    } catch (error) {
-        console.error('Error loading user info:', error);
+async function loadDashboardState() {
+    const state = await fetchDashboardState(['user', 'cycle_requests', 'cycle_matches']);
+    if (!state) return;
+    renderUserInfo(state.user);
+    renderCycleUserRequest(state.cycle_requests);
+    renderCycleMatches(state.cycle_matches);
+}
+
+function renderUserInfo(userData) {
+    const userDisplayName = document.getElementById('userDisplayName');
+    if (userDisplayName) {
+        const fullName = userData.name || 'User';
+        userDisplayName.textContent = fullName;
     }
 }
 
 async function loadCycleUserRequest() {
     try {
         const response = await fetch('/get-cycle-requests');
-        const requests = await response.json();
-        const userRequest = Array.isArray(requests) ? requests.find(req => req.is_own) : null;
-        if (userRequest) {
-            lastCycleUserRequest = userRequest;
-            currentCycleRequestId = userRequest.id;
-            displayCycleUserRequest(userRequest);
-            document.getElementById('cycleNoRequest').style.display = 'none';
-            document.getElementById('cycleHasRequest').style.display = 'block';
-        } else {
-            lastCycleUserRequest = null;
-            document.getElementById('cycleNoRequest').style.display = 'block';
-            document.getElementById('cycleHasRequest').style.display = 'none';
-        }
+        renderCycleUserRequest(await response.json());
     } catch (error) {
         console.error('Error loading cycle user request:', error);
     }
 }
 
+function renderCycleUserRequest(requests) {
+    const userRequest = Array.isArray(requests) ? requests.find(req => req.is_own) : null;
+    if (userRequest) {
+        lastCycleUserRequest = userRequest;
+        currentCycleRequestId = userRequest.id;
+        displayCycleUserRequest(userRequest);
+        document.getElementById('cycleNoRequest').style.display = 'none';
+        document.getElementById('cycleHasRequest').style.display = 'block';
+    } else {
+        lastCycleUserRequest = null;
+        document.getElementById('cycleNoRequest').style.display = 'block';
+        document.getElementById('cycleHasRequest').style.display = 'none';
+    }
+}
+
 async function loadCycleMatches() {
     try {
         const response = await fetch('/get-cycle-matches');
-        const matches = await response.json();
-        const noMatches = document.getElementById('cycleNoMatches');
-        const matchesList = document.getElementById('cycleMatchesList');
-
-        if (!Array.isArray(matches) || matches.length === 0) {
-            noMatches.style.display = 'block';
-            matchesList.style.display = 'none';
-            matchesList.innerHTML = '';
-            return;
-        }
-
-        noMatches.style.display = 'none';
-        matchesList.style.display = 'grid';
-
-        matchesList.innerHTML = matches.map(m => {
-            if (m.match_type === 'direct_swap') {
-                return `
-                <div class="listing-card">
-                    <div class="listing-header">
-                        <div class="listing-title">Direct Swap Available</div>
-                        <span class="match-indicator">Direct</span>
-                    </div>
-                    <div style="margin-bottom: 10px;">
-                        <strong>They are at:</strong> ${m.other_current_apartment || ''}
-                        ${m.other_current_room ? ` (${m.other_current_room})` : ''}
-                    </div>
-                    <div class="contact-info">
-                        <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
-                    </div>
-                </div>`;
-            } else if (m.match_type === 'three_way_chain') {
-                return `
-                <div class="listing-card">
-                    <div class="listing-header">
-                        <div class="listing-title">3-Way Chain Possible</div>
-                        <span class="match-indicator">Chain</span>
-                    </div>
-                    <div style="margin-bottom: 10px;">
-                        <div><strong>Person 1 (You want):</strong> ${m.other_current_apartment || ''}${m.other_current_room ? ` (${m.other_current_room})` : ''}</div>
-                        <div><strong>Person 2 (Completes chain):</strong> ${m.third_current_apartment || ''}${m.third_current_room ? ` (${m.third_current_room})` : ''}</div>
-                    </div>
-                    <div class="contact-info">
-                        <div><strong>Person 1 Contact:</strong> ${m.other_user_email_display || 'Email not available'}</div>
-                        <div><strong>Person 2 Contact:</strong> ${m.third_user_email_display || 'Email not available'}</div>
-                    </div>
-                </div>`;
-            }
-            return '';
-        }).join('');
+        renderCycleMatches(await response.json());
     } catch (error) {
         console.error('Error loading cycle matches:', error);
     }
 }
 
+function renderCycleMatches(matches) {
+    const noMatches = document.getElementById('cycleNoMatches');
+    const matchesList = document.getElementById('cycleMatchesList');
+
+    if (!Array.isArray(matches) || matches.length === 0) {
+        noMatches.style.display = 'block';
+        matchesList.style.display = 'none';
+        matchesList.innerHTML = '';
+        return;
+    }
+
+    noMatches.style.display = 'none';
+    matchesList.style.display = 'grid';
+
+    matchesList.innerHTML = matches.map(m => {
+        if (m.match_type === 'direct_swap') {
+            return `
+            <div class="listing-card">
+                <div class="listing-header">
+                    <div class="listing-title">Direct Swap Available</div>
+                    <span class="match-indicator">Direct</span>
+                </div>
+                <div style="margin-bottom: 10px;">
+                    <strong>They are at:</strong> ${m.other_current_apartment || ''}
+                    ${m.other_current_room ? ` (${m.other_current_room})` : ''}
+                </div>
+                <div class="contact-info">
+                    <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
+                </div>
+            </div>`;
+        } else if (m.match_type === 'three_way_chain') {
+            return `
+            <div class="listing-card">
+                <div class="listing-header">
+                    <div class="listing-title">3-Way Chain Possible</div>
+                    <span class="match-indicator">Chain</span>
+                </div>
+                <div style="margin-bottom: 10px;">
+                    <div><strong>Person 1 (You want):</strong> ${m.other_current_apartment || ''}${m.other_current_room ? ` (${m.other_current_room})` : ''}</div>
+                    <div><strong>Person 2 (Completes chain):</strong> ${m.third_current_apartment || ''}${m.third_current_room ? ` (${m.third_current_room})` : ''}</div>
+                </div>
+                <div class="contact-info">
+                    <div><strong>Person 1 Contact:</strong> ${m.other_user_email_display || 'Email not available'}</div>
+                    <div><strong>Person 2 Contact:</strong> ${m.third_user_email_display || 'Email not available'}</div>
+                </div>
+            </div>`;
+        } else if (m.match_type === 'multi_way_cycle') {
+            const people = (m.participants || []).map((p, i) => `
+                    <div><strong>Person ${i + 1}${i === 0 ? ' (You want)' : ''}:</strong> ${p.current_apartment || ''}${p.current_room ? ` (${p.current_room})` : ''}</div>`).join('');
+            const contacts = (m.participants || []).map((p, i) => `
+                    <div><strong>Person ${i + 1} Contact:</strong> ${p.email_display || 'Email not available'}</div>`).join('');
+            return `
+            <div class="listing-card">
+                <div class="listing-header">
+                    <div class="listing-title">${m.cycle_length}-Way Chain Possible</div>
+                    <span class="match-indicator">Chain</span>
+                </div>
+                <div style="margin-bottom: 10px;">${people}
+                </div>
+                <div class="contact-info">${contacts}
+                </div>
+            </div>`;
+        }
+        return '';
+    }).join('');
+}
+
 function showCycleCreateForm() {
     isCycleEditMode = false;
     document.getElementById('cycleFormTitle').textContent = 'Create Cycle Swap Request';
@@ -10,170 +10,174 @@ let lastCycleUserRequest = null;
 
 // Load data when page loads
 document.addEventListener('DOMContentLoaded', function() {
-    loadUserInfo();
-    loadUserRequest();
-    loadMatches();
-    loadCycleUserRequest();
+    loadDashboardState();
+    subscribeToMatchEvents('preference', loadMatches);
 });
 
-async function loadUserInfo() {
-    try {
-        const response = await fetch('/get-user-info');
-        if (response.ok) {
-            const userData = await response.json();
-            const userDisplayName = document.getElementById('userDisplayName');
-            if (userDisplayName) {
-                // Use the full name from the user data
-                const fullName = userData.name || 'User';
-                userDisplayName.textContent = fullName;
-            }
-        }
-    } catch (error) {
-        console.error('Error loading user info:', error);
+async function loadDashboardState() {
+    const state = await fetchDashboardState(['user', 'requests', 'matches', 'cycle_requests']);
+    if (!state) return;
+    renderUserInfo(state.user);
+    renderUserRequest(state.requests);
+    renderMatches(state.matches);
+    renderCycleUserRequest(state.cycle_requests);
+}
+
+function renderUserInfo(userData) {
+    const userDisplayName = document.getElementById('userDisplayName');
+    if (userDisplayName) {
+        // Use the full name from the user data
+        const fullName = userData.name || 'User';
+        userDisplayName.textContent = fullName;
     }
 }
 
 async function loadUserRequest() {
     try {
         const response = await fetch('/get-requests');
-        const requests = await response.json();
-        
-        const userRequest = requests.find(req => req.is_own);
-        
-        if (userRequest) {
-            lastUserRequest = userRequest;
-            currentRequestId = userRequest.id;
-            displayUserRequest(userRequest);
-            document.getElementById('noRequest').style.display = 'none';
-            document.getElementById('hasRequest').style.display = 'block';
-        } else {
-            lastUserRequest = null;
-            document.getElementById('noRequest').style.display = 'block';
-            document.getElementById('hasRequest').style.display = 'none';
-        }
+        renderUserRequest(await response.json());
     } catch (error) {
         console.error('Error loading user request:', error);
     }
 }
 
+function renderUserRequest(requests) {
+    const userRequest = requests.find(req => req.is_own);
+    
+    if (userRequest) {
+        lastUserRequest = userRequest;
+        currentRequestId = userRequest.id;
+        displayUserRequest(userRequest);
+        document.getElementById('noRequest').style.display = 'none';
+        document.getElementById('hasRequest').style.display = 'block';
+    } else {
+        lastUserRequest = null;
+        document.getElementById('noRequest').style.display = 'block';
+        document.getElementById('hasRequest').style.display = 'none';
+    }
+}
+
 async function loadMatches() {
     try {
         const response = await fetch('/get-matches');
         if (!response.ok) {
             throw new Error('Failed to load matches');
         }
-        const matches = await response.json();
-        // Treat all returned matches as confirmed now
-        const confirmed = matches;
-        const limited = confirmed.slice(0, 5);
-
-        // Show/hide confirmed match notice
-        const confirmedMatchNotice = document.getElementById('confirmedMatchNotice');
-        if (confirmedMatchNotice) {
-            confirmedMatchNotice.style.display = confirmed.length > 0 ? 'block' : 'none';
-        }
+        renderMatches(await response.json());
+    } catch (error) {
+        console.error('Error loading matches:', error);
+    }
+}
 
-        hasConfirmedMatches = confirmed.length > 0;
-
-        // Disable create request button if user has confirmed match
-        const createRequestBtn = document.getElementById('createRequestBtn');
-        if (createRequestBtn) {
-            if (hasConfirmedMatches) {
-                createRequestBtn.disabled = true;
-                createRequestBtn.textContent = 'Cannot Create Request (Has Confirmed Match)';
-                createRequestBtn.style.opacity = '0.6';
-                createRequestBtn.style.cursor = 'not-allowed';
-            } else {
-                createRequestBtn.disabled = false;
-                createRequestBtn.textContent = 'Create Swap Request';
-                createRequestBtn.style.opacity = '1';
-                createRequestBtn.style.cursor = 'pointer';
-            }
-        }
+function renderMatches(matches) {
+    // Treat all returned matches as confirmed now
+    const confirmed = matches;
+    const limited = confirmed.slice(0, 5);
 
-        // Disable edit and delete buttons if user has confirmed match
-        const editRequestBtn = document.getElementById('editRequestBtn');
-        const deleteRequestBtn = document.getElementById('deleteRequestBtn');
-        
-        if (editRequestBtn) {
-            editRequestBtn.disabled = false;
-            editRequestBtn.textContent = 'Edit Request';
-            editRequestBtn.style.opacity = '1';
-            editRequestBtn.style.cursor = 'pointer';
-        }
-        
-        if (deleteRequestBtn) {
-            deleteRequestBtn.disabled = false;
-            deleteRequestBtn.textContent = 'Delete Request';
-            deleteRequestBtn.style.opacity = '1';
-            deleteRequestBtn.style.cursor = 'pointer';
+    // Show/hide confirmed match notice
+    const confirmedMatchNotice = document.getElementById('confirmedMatchNotice');
+    if (confirmedMatchNotice) {
+        confirmedMatchNotice.style.display = confirmed.length > 0 ? 'block' : 'none';
+    }
+
+    hasConfirmedMatches = confirmed.length > 0;
+
+    // Disable create request button if user has confirmed match
+    const createRequestBtn = document.getElementById('createRequestBtn');
+    if (createRequestBtn) {
+        if (hasConfirmedMatches) {
+            createRequestBtn.disabled = true;
+            createRequestBtn.textContent = 'Cannot Create Request (Has Confirmed Match)';
+            createRequestBtn.style.opacity = '0.6';
+            createRequestBtn.style.cursor = 'not-allowed';
+        } else {
+            createRequestBtn.disabled = false;
+            createRequestBtn.textContent = 'Create Swap Request';
+            createRequestBtn.style.opacity = '1';
+            createRequestBtn.style.cursor = 'pointer';
         }
+    }
 
-        const noMatches = document.getElementById('noMatches');
-        const matchesList = document.getElementById('matchesList');
+    // Disable edit and delete buttons if user has confirmed match
+    const editRequestBtn = document.getElementById('editRequestBtn');
+    const deleteRequestBtn = document.getElementById('deleteRequestBtn');
+    
+    if (editRequestBtn) {
+        editRequestBtn.disabled = false;
+        editRequestBtn.textContent = 'Edit Request';
+        editRequestBtn.style.opacity = '1';
+        editRequestBtn.style.cursor = 'pointer';
+    }
+    
+    if (deleteRequestBtn) {
+        deleteRequestBtn.disabled = false;
+        deleteRequestBtn.textContent = 'Delete Request';
+        deleteRequestBtn.style.opacity = '1';
+        deleteRequestBtn.style.cursor = 'pointer';
+    }
+
+    const noMatches = document.getElementById('noMatches');
+    const matchesList = document.getElementById('matchesList');
+    
+    if (limited.length === 0) {
+        noMatches.style.display = 'block';
+        matchesList.style.display = 'none';
+        matchesList.innerHTML = '';
+    } else {
+        noMatches.style.display = 'none';
+        matchesList.style.display = 'grid';
         
-        if (limited.length === 0) {
-            noMatches.style.display = 'block';
-            matchesList.style.display = 'none';
-            matchesList.innerHTML = '';
-        } else {
-            noMatches.style.display = 'none';
-            matchesList.style.display = 'grid';
+        matchesList.innerHTML = limited.map(m => {
+            const myBadge = m.my_preference_level ? getMyPreferenceBadge(m.my_preference_level) : '';
+            const preferenceSuffix = m.my_preference_level ? ` (your ${getPreferenceText(m.my_preference_level)} choice)` : '';
             
-            matchesList.innerHTML = limited.map(m => {
-                const myBadge = m.my_preference_level ? getMyPreferenceBadge(m.my_preference_level) : '';
-                const preferenceSuffix = m.my_preference_level ? ` (your ${getPreferenceText(m.my_preference_level)} choice)` : '';
-                
-                return `
-                <div class="listing-card">
-                    <div class="listing-header">
-                        <div class="listing-title">Match with ${m.other_user_name}</div>
-                        <div style="display: flex; gap: 10px; align-items: center; flex-wrap: wrap;">
-                            ${myBadge}
-                            <span style="background: rgba(76, 175, 80, 0.3); padding: 5px 10px; border-radius: 15px; font-size: 0.8rem;">Confirmed</span>
-                        </div>
-                    </div>
-                    
-                    <div style="margin-bottom: 15px; padding: 10px; background: rgba(255, 255, 255, 0.1); border-radius: 8px;">
-                        <div style="margin-bottom: 8px;"><strong>Match Details:</strong></div>
-                        <div style="font-size: 0.9rem;">
-                            • ${m.other_current_apartment}${preferenceSuffix}
-                        </div>
-                    </div>
-                    
-                    <div style="margin-bottom: 10px;">
-                        <strong>They're currently at:</strong> ${m.other_current_apartment || ''}
-                        ${m.other_current_room ? ` (${m.other_current_room})` : ''}
+            return `
+            <div class="listing-card">
+                <div class="listing-header">
+                    <div class="listing-title">Match with ${m.other_user_name}</div>
+                    <div style="display: flex; gap: 10px; align-items: center; flex-wrap: wrap;">
+                        ${myBadge}
+                        <span style="background: rgba(76, 175, 80, 0.3); padding: 5px 10px; border-radius: 15px; font-size: 0.8rem;">Confirmed</span>
                     </div>
-                    <div class="contact-info" style="margin-bottom: 15px;">
-                        <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
+                </div>
+                
+                <div style="margin-bottom: 15px; padding: 10px; background: rgba(255, 255, 255, 0.1); border-radius: 8px;">
+                    <div style="margin-bottom: 8px;"><strong>Match Details:</strong></div>
+                    <div style="font-size: 0.9rem;">
+                        • ${m.other_current_apartment}${preferenceSuffix}
                     </div>
                 </div>
-            `;
-            }).join('');
-        }
-
-        // Hide Potential and Pending sections (feature removed)
-        const noPotential = document.getElementById('noPotential');
-        const potentialList = document.getElementById('potentialList');
-        const potentialSection = document.getElementById('potentialSection');
-        if (noPotential) noPotential.style.display = 'none';
-        if (potentialList) { potentialList.style.display = 'none'; potentialList.innerHTML = ''; }
-        if (potentialSection) potentialSection.style.display = 'none';
-
-        const noPending = document.getElementById('noPending');
-        const outgoingWrap = document.getElementById('outgoingPending');
-        const incomingWrap = document.getElementById('incomingPending');
-        const outgoingList = document.getElementById('outgoingPendingList');
-        const incomingList = document.getElementById('incomingPendingList');
-        if (noPending) noPending.style.display = 'none';
-        if (outgoingWrap) outgoingWrap.style.display = 'none';
-        if (incomingWrap) incomingWrap.style.display = 'none';
-        if (outgoingList) outgoingList.innerHTML = '';
-        if (incomingList) incomingList.innerHTML = '';
-    } catch (error) {
-        console.error('Error loading matches:', error);
+                
+                <div style="margin-bottom: 10px;">
+                    <strong>They're currently at:</strong> ${m.other_current_apartment || ''}
+                    ${m.other_current_room ? ` (${m.other_current_room})` : ''}
+                </div>
+                <div class="contact-info" style="margin-bottom: 15px;">
+                    <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
+                </div>
+            </div>
+        `;
+        }).join('');
     }
+
+    // Hide Potential and Pending sections (feature removed)
+    const noPotential = document.getElementById('noPotential');
+    const potentialList = document.getElementById('potentialList');
+    const potentialSection = document.getElementById('potentialSection');
+    if (noPotential) noPotential.style.display = 'none';
+    if (potentialList) { potentialList.style.display = 'none'; potentialList.innerHTML = ''; }
+    if (potentialSection) potentialSection.style.display = 'none';
+
+    const noPending = document.getElementById('noPending');
+    const outgoingWrap = document.getElementById('outgoingPending');
+    const incomingWrap = document.getElementById('incomingPending');
+    const outgoingList = document.getElementById('outgoingPendingList');
+    const incomingList = document.getElementById('incomingPendingList');
+    if (noPending) noPending.style.display = 'none';
+    if (outgoingWrap) outgoingWrap.style.display = 'none';
+    if (incomingWrap) incomingWrap.style.display = 'none';
+    if (outgoingList) outgoingList.innerHTML = '';
+    if (incomingList) incomingList.innerHTML = '';
 }
 
 function showCreateForm() {
@@ -292,24 +296,27 @@ document.getElementById('swapForm').addEventListener('submit', async function(e)
 async function loadCycleUserRequest() {
     try {
         const response = await fetch('/get-cycle-requests');
-        const requests = await response.json();
-        const userRequest = Array.isArray(requests) ? requests.find(req => req.is_own) : null;
-        if (userRequest) {
-            lastCycleUserRequest = userRequest;
-            currentCycleRequestId = userRequest.id;
-            displayCycleUserRequest(userRequest);
-            document.getElementById('cycleNoRequest').style.display = 'none';
-            document.getElementById('cycleHasRequest').style.display = 'block';
-        } else {
-            lastCycleUserRequest = null;
-            document.getElementById('cycleNoRequest').style.display = 'block';
-            document.getElementById('cycleHasRequest').style.display = 'none';
-        }
+        renderCycleUserRequest(await response.json());
     } catch (error) {
         console.error('Error loading cycle user request:', error);
     }
 }
 
+function renderCycleUserRequest(requests) {
+    const userRequest = Array.isArray(requests) ? requests.find(req => req.is_own) : null;
+    if (userRequest) {
+        lastCycleUserRequest = userRequest;
+        currentCycleRequestId = userRequest.id;
+        displayCycleUserRequest(userRequest);
+        document.getElementById('cycleNoRequest').style.display = 'none';
+        document.getElementById('cycleHasRequest').style.display = 'block';
+    } else {
+        lastCycleUserRequest = null;
+        document.getElementById('cycleNoRequest').style.display = 'block';
+        document.getElementById('cycleHasRequest').style.display = 'none';
+    }
+}
+
 function showCycleCreateForm() {
     isCycleEditMode = false;
     document.getElementById('cycleFormTitle').textContent = 'Create Cycle Request';
@@ -78,4 +78,65 @@ function displayCycleUserRequest(request) {
             <small>Posted: ${request.created_at || ''}</small>
         </div>
     `;
-} 
\ No newline at end of file
+}
+
+// ---- Page bootstrap ----
+async function fetchDashboardState(sections) {
+    try {
+        const response = await fetch(`/dashboard-state?include=${sections.join(',')}`);
+        if (!response.ok) {
+            throw new Error('Failed to load dashboard state');
+        }
+        return await response.json();
+    } catch (error) {
+        console.error('Error loading dashboard state:', error);
+        return null;
+    }
+}
+
+// ---- Live match notifications ----
+// Long-polls /match-events for notifications after the last cursor seen: each
+// poll waits on the server until there is one, and the server says how long to
+// wait before the next poll. Hidden tabs skip their polls.
+function subscribeToMatchEvents(kind, onMatch) {
+    let cursor = null;
+    let timer = null;
+    let delay = 0;
+    let closed = false;
+
+    async function poll() {
+        if (closed) {
+            return;
+        }
+        if (document.hidden) {
+            timer = setTimeout(poll, 10000);
+            return;
+        }
+        try {
+            const response = await fetch(cursor === null ? '/match-events' : `/match-events?since=${cursor}`);
+            if (response.ok) {
+                const data = await response.json();
+                cursor = data.cursor;
+                delay = data.retry_after * 1000;
+                const matches = data.events.filter(event => !kind || event.kind === kind);
+                if (matches.length) {
+                    onMatch(matches[matches.length - 1]);
+                }
+            } else {
+                delay = 10000;
+            }
+        } catch (error) {
+            console.error('Error polling match events:', error);
+            delay = 10000;
+        }
+        timer = setTimeout(poll, delay);
+    }
+
+    poll();
+    return {
+        close() {
+            closed = true;
+            clearTimeout(timer);
+        }
+    };
+}
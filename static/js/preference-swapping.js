@@ -5,123 +5,127 @@ let hasConfirmedMatches = false;
 
 // Load data when page loads
 document.addEventListener('DOMContentLoaded', function() {
-    loadUserInfo();
-    loadUserRequest();
-    loadMatches();
+    loadDashboardState();
+    subscribeToMatchEvents('preference', loadMatches);
 });
 
-async function loadUserInfo() {
-    try {
-        const response = await fetch('/get-user-info');
-        if (response.ok) {
-            const userData = await response.json();
-            const userDisplayName = document.getElementById('userDisplayName');
-            if (userDisplayName) {
-                const fullName = userData.name || 'User';
-                userDisplayName.textContent = fullName;
-            }
-        }
-    } catch (error) {
-        console.error('Error loading user info:', error);
+async function loadDashboardState() {
+    const state = await fetchDashboardState(['user', 'requests', 'matches']);
+    if (!state) return;
+    renderUserInfo(state.user);
+    renderUserRequest(state.requests);
+    renderMatches(state.matches);
+}
+
+function renderUserInfo(userData) {
+    const userDisplayName = document.getElementById('userDisplayName');
+    if (userDisplayName) {
+        const fullName = userData.name || 'User';
+        userDisplayName.textContent = fullName;
     }
 }
 
 async function loadUserRequest() {
     try {
         const response = await fetch('/get-requests');
-        const requests = await response.json();
-        
-        const userRequest = requests.find(req => req.is_own);
-        
-        if (userRequest) {
-            lastUserRequest = userRequest;
-            currentRequestId = userRequest.id;
-            displayUserRequest(userRequest);
-            document.getElementById('noRequest').style.display = 'none';
-            document.getElementById('hasRequest').style.display = 'block';
-        } else {
-            lastUserRequest = null;
-            document.getElementById('noRequest').style.display = 'block';
-            document.getElementById('hasRequest').style.display = 'none';
-        }
+        renderUserRequest(await response.json());
     } catch (error) {
         console.error('Error loading user request:', error);
     }
 }
 
+function renderUserRequest(requests) {
+    const userRequest = requests.find(req => req.is_own);
+    
+    if (userRequest) {
+        lastUserRequest = userRequest;
+        currentRequestId = userRequest.id;
+        displayUserRequest(userRequest);
+        document.getElementById('noRequest').style.display = 'none';
+        document.getElementById('hasRequest').style.display = 'block';
+    } else {
+        lastUserRequest = null;
+        document.getElementById('noRequest').style.display = 'block';
+        document.getElementById('hasRequest').style.display = 'none';
+    }
+}
+
 async function loadMatches() {
     try {
         const response = await fetch('/get-matches');
         if (!response.ok) {
             throw new Error('Failed to load matches');
         }
-        const matches = await response.json();
-        const confirmed = matches;
-        const limited = confirmed.slice(0, 5);
-
-        hasConfirmedMatches = confirmed.length > 0;
-
-        // Disable create request button if user has confirmed match
-        const createRequestBtn = document.getElementById('createRequestBtn');
-        if (createRequestBtn) {
-            if (hasConfirmedMatches) {
-                createRequestBtn.disabled = true;
-                createRequestBtn.textContent = 'Cannot Create Request (Has Confirmed Match)';
-                createRequestBtn.style.opacity = '0.6';
-                createRequestBtn.style.cursor = 'not-allowed';
-            } else {
-                createRequestBtn.disabled = false;
-                createRequestBtn.textContent = 'Create Preference Swap Request';
-                createRequestBtn.style.opacity = '1';
-                createRequestBtn.style.cursor = 'pointer';
-            }
+        renderMatches(await response.json());
+    } catch (error) {
+        console.error('Error loading matches:', error);
+    }
+}
+
+function renderMatches(matches) {
+    const confirmed = matches;
+    const limited = confirmed.slice(0, 5);
+
+    hasConfirmedMatches = confirmed.length > 0;
+
+    // Disable create request button if user has confirmed match
+    const createRequestBtn = document.getElementById('createRequestBtn');
+    if (createRequestBtn) {
+        if (hasConfirmedMatches) {
+            createRequestBtn.disabled = true;
+            createRequestBtn.textContent = 'Cannot Create Request (Has Confirmed Match)';
+            createRequestBtn.style.opacity = '0.6';
+            createRequestBtn.style.cursor = 'not-allowed';
+        } else {
+            createRequestBtn.disabled = false;
+            createRequestBtn.textContent = 'Create Preference Swap Request';
+            createRequestBtn.style.opacity = '1';
+            createRequestBtn.style.cursor = 'pointer';
         }
+    }
 
-        const noMatches = document.getElementById('noMatches');
-        const matchesList = document.getElementById('matchesList');
+    const noMatches = document.getElementById('noMatches');
+    const matchesList = document.getElementById('matchesList');
+    
+    if (limited.length === 0) {
+        noMatches.style.display = 'block';
+        matchesList.style.display = 'none';
+        matchesList.innerHTML = '';
+    } else {
+        noMatches.style.display = 'none';
+        matchesList.style.display = 'grid';
         
-        if (limited.length === 0) {
-            noMatches.style.display = 'block';
-            matchesList.style.display = 'none';
-            matchesList.innerHTML = '';
-        } else {
-            noMatches.style.display = 'none';
-            matchesList.style.display = 'grid';
+        matchesList.innerHTML = limited.map(m => {
+            const myBadge = m.my_preference_level ? getMyPreferenceBadge(m.my_preference_level) : '';
+            const preferenceSuffix = m.my_preference_level ? ` (your ${getPreferenceText(m.my_preference_level)} choice)` : '';
             
-            matchesList.innerHTML = limited.map(m => {
-                const myBadge = m.my_preference_level ? getMyPreferenceBadge(m.my_preference_level) : '';
-                const preferenceSuffix = m.my_preference_level ? ` (your ${getPreferenceText(m.my_preference_level)} choice)` : '';
-                
-                return `
-                <div class="listing-card">
-                    <div class="listing-header">
-                        <div class="listing-title">Match with ${m.other_user_name}</div>
-                        <div style="display: flex; gap: 10px; align-items: center; flex-wrap: wrap;">
-                            ${myBadge}
-                            <span style="background: rgba(76, 175, 80, 0.3); padding: 5px 10px; border-radius: 15px; font-size: 0.8rem;">Confirmed</span>
-                        </div>
-                    </div>
-                    
-                    <div style="margin-bottom: 15px; padding: 10px; background: rgba(255, 255, 255, 0.1); border-radius: 8px;">
-                        <div style="margin-bottom: 8px;"><strong>Match Details:</strong></div>
-                        <div style="font-size: 0.9rem;">
-                            • ${m.other_current_apartment}${preferenceSuffix}
-                        </div>
+            return `
+            <div class="listing-card">
+                <div class="listing-header">
+                    <div class="listing-title">Match with ${m.other_user_name}</div>
+                    <div style="display: flex; gap: 10px; align-items: center; flex-wrap: wrap;">
+                        ${myBadge}
+                        <span style="background: rgba(76, 175, 80, 0.3); padding: 5px 10px; border-radius: 15px; font-size: 0.8rem;">Confirmed</span>
                     </div>
-                    
-                    <div style="margin-bottom: 10px;">
-                        <strong>They're currently at:</strong> ${m.other_current_apartment || ''}
-                        ${m.other_current_room ? ` (${m.other_current_room})` : ''}
-                    </div>
-                    <div class="contact-info" style="margin-bottom: 15px;">
-                        <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
+                </div>
+                
+                <div style="margin-bottom: 15px; padding: 10px; background: rgba(255, 255, 255, 0.1); border-radius: 8px;">
+                    <div style="margin-bottom: 8px;"><strong>Match Details:</strong></div>
+                    <div style="font-size: 0.9rem;">
+                        • ${m.other_current_apartment}${preferenceSuffix}
                     </div>
                 </div>
-            `;
-            }).join('');
-        }
-    } catch (error) {
-        console.error('Error loading matches:', error);
+                
+                <div style="margin-bottom: 10px;">
+                    <strong>They're currently at:</strong> ${m.other_current_apartment || ''}
+                    ${m.other_current_room ? ` (${m.other_current_room})` : ''}
+                </div>
+                <div class="contact-info" style="margin-bottom: 15px;">
+                    <strong>Contact:</strong> ${m.other_user_email_display || 'Email not available'}
+                </div>
+            </div>
+        `;
+        }).join('');
     }
 }
 
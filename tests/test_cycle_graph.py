@@ -0,0 +1,89 @@
+"""CycleGraph finds the shortest cycles first and stops at its limits."""
+from datetime import datetime, timedelta
+
+from utils.cycle_graph import CycleGraph
+
+START = datetime(2026, 1, 1)
+
+
+def cycle_request(user_id, current, desired, minutes=0):
+	return {
+		'user_id': user_id,
+		'user_name': user_id,
+		'current_apartment': str(current),
+		'current_apartment_id': current,
+		'desired_choice': str(desired),
+		'desired_choice_id': desired,
+		'created_at': START + timedelta(minutes=minutes)
+	}
+
+
+def members(cycle):
+	return [member['user_id'] for member in cycle]
+
+
+def test_shortest_cycles_first():
+	graph = CycleGraph(max_length=4)
+	graph.load([
+		cycle_request('a', 1, 2),
+		cycle_request('b', 2, 3),
+		cycle_request('c', 3, 1),
+		cycle_request('d', 2, 1),
+		cycle_request('e', 3, 4),
+		cycle_request('f', 4, 1)
+	])
+	assert [members(c) for c in graph.find_cycles('a')] == [['a', 'd'], ['a', 'b', 'c'], ['a', 'b', 'e', 'f']]
+
+
+def test_every_member_moves_into_the_next_apartment():
+	graph = CycleGraph()
+	graph.load([cycle_request('a', 1, 2), cycle_request('b', 2, 3), cycle_request('c', 3, 1)])
+	cycle = graph.find_cycles('b')[0]
+	assert members(cycle) == ['b', 'c', 'a']
+	for member, nxt in zip(cycle, cycle[1:] + cycle[:1]):
+		assert member['desired_choice_id'] == nxt['current_apartment_id']
+
+
+def test_limit_and_max_length():
+	requests = [cycle_request('a', 1, 2), cycle_request('b', 2, 3), cycle_request('c', 3, 1)]
+	requests += [cycle_request(f'back{i}', 2, 1) for i in range(3)]
+	graph = CycleGraph(max_length=3)
+	graph.load(requests)
+	# the three requests from 2 back to 1 share one apartment edge
+	assert [len(c) for c in graph.find_cycles('a', limit=5)] == [2, 3]
+	assert [len(c) for c in graph.find_cycles('a', limit=1)] == [2]
+	assert [len(c) for c in graph.find_cycles('a', max_length=2)] == [2]
+
+
+def test_longest_waiting_requester_is_picked():
+	graph = CycleGraph()
+	graph.load([cycle_request('a', 1, 2), cycle_request('new', 2, 1, minutes=5), cycle_request('old', 2, 1, minutes=1)])
+	assert members(graph.find_cycles('a')[0]) == ['a', 'old']
+
+
+def test_longer_cycles_than_max_length_are_not_found():
+	graph = CycleGraph(max_length=3)
+	graph.load([cycle_request('a', 1, 2), cycle_request('b', 2, 3), cycle_request('c', 3, 4), cycle_request('d', 4, 1)])
+	assert graph.find_cycles('a') == []
+	assert len(graph.find_cycles('a', max_length=4)) == 1
+
+
+def test_expansion_budget_bounds_the_search():
+	# 1 -> 2, then 2 fans out to many apartments that all lead to 3 and back to 1
+	requests = [cycle_request('a', 1, 2), cycle_request('c', 3, 1)]
+	for i in range(10, 60):
+		requests += [cycle_request(f'out{i}', 2, i), cycle_request(f'via{i}', i, 3)]
+	unbounded = CycleGraph(max_length=4)
+	unbounded.load(requests)
+	bounded = CycleGraph(max_length=4, max_expansions=10)
+	bounded.load(requests)
+	assert len(unbounded.find_cycles('a', limit=100)) == 50
+	assert len(bounded.find_cycles('a', limit=100)) == 10
+
+
+def test_remove_breaks_the_cycle():
+	graph = CycleGraph()
+	graph.load([cycle_request('a', 1, 2), cycle_request('b', 2, 1)])
+	graph.remove('b')
+	assert graph.find_cycles('a') == []
+	assert graph.find_cycles('b') == []
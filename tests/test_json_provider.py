@@ -0,0 +1,78 @@
+"""orjson and the standard library encoder send MongoDB documents the same way."""
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from bson import Binary, Decimal128, ObjectId
+from flask import Flask, jsonify
+from werkzeug.http import http_date
+
+from utils import json_provider
+from utils.json_provider import MongoJSONProvider, dumps, format_date
+
+OID = ObjectId('6ad4acb1bca7754605d554e4')
+USER_UUID = uuid.UUID('12345678-1234-5678-1234-567812345678')
+
+DOC = {
+	'_id': OID,
+	'user_id': 'alice',
+	'created_at': datetime(2025, 1, 2, 3, 4, 5, 678000),
+	'expires_at': datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-5))),
+	'move_in': date(2025, 9, 1),
+	'deposit': Decimal128('250.50'),
+	'token': Binary.from_uuid(USER_UUID),
+	'nested': [{'other_id': OID, 'name': 'Zoë'}]
+}
+
+EXPECTED = {
+	'_id': str(OID),
+	'user_id': 'alice',
+	'created_at': 'Thu, 02 Jan 2025 03:04:05 GMT',
+	'expires_at': 'Thu, 02 Jan 2025 08:04:05 GMT',
+	'move_in': 'Mon, 01 Sep 2025 00:00:00 GMT',
+	'deposit': '250.50',
+	'token': str(USER_UUID),
+	'nested': [{'other_id': str(OID), 'name': 'Zoë'}]
+}
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+	if request.param == 'orjson':
+		pytest.importorskip('orjson')
+	else:
+		monkeypatch.setattr(json_provider, 'orjson', None)
+	return request.param
+
+
+@pytest.mark.parametrize('value', [
+	datetime(2025, 1, 2, 3, 4, 5), datetime(1999, 12, 31, 23, 59, 59), date(2024, 2, 29),
+	datetime(2025, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+])
+def test_format_date_matches_werkzeug(value):
+	assert format_date(value) == http_date(value)
+
+
+def test_dumps(encoder):
+	assert json.loads(dumps(DOC)) == EXPECTED
+
+
+def test_sort_keys_and_indent(encoder):
+	text = dumps({'b': 1, 'a': OID}, sort_keys=True, indent=True)
+	assert text.index('"a"') < text.index('"b"')
+	assert '\n  "a"' in text
+
+
+def test_jsonify(encoder):
+	app = Flask(__name__)
+	app.json = MongoJSONProvider(app)
+	with app.app_context():
+		response = jsonify(DOC)
+	assert response.mimetype == 'application/json'
+	assert json.loads(response.get_data()) == EXPECTED
+
+
+def test_other_types_fall_back_to_flask(encoder):
+	assert json.loads(dumps({'amount': Decimal('1.5'), 'id': USER_UUID})) == {'amount': '1.5', 'id': str(USER_UUID)}
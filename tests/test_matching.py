@@ -0,0 +1,84 @@
+"""Every matching path finds the same pairs at the same preference levels."""
+import random
+
+import pytest
+
+from routes.main import memory_database
+from utils.matching import find_matches, iter_mutual_pairs
+from utils.request_cache import RequestCache
+
+APARTMENTS = list(range(1, 7))
+
+
+def random_requests(count, seed):
+	rng = random.Random(seed)
+	requests = []
+	for i in range(count):
+		current = rng.choice(APARTMENTS)
+		# repeats, missing choices and one's own apartment all occur
+		choices = [rng.choice(APARTMENTS + [None]) for _ in range(3)]
+		requests.append({
+			'user_id': f'user{i:03d}',
+			'user_name': f'user{i:03d}',
+			'email': f'user{i:03d}@scarletmail.rutgers.edu',
+			'current_apartment': str(current),
+			'current_apartment_id': current,
+			'preferences': dict(zip(('first_choice_id', 'second_choice_id', 'third_choice_id'), choices)),
+			'type': 'swap_request'
+		})
+	return requests
+
+
+def pairs_from_matches(user_id, matches):
+	return {(user_id, m['other_user_id'], m['my_preference_level'], m['other_preference_level']) for m in matches}
+
+
+def pairs_from_mutual(pairs):
+	found = set()
+	for a, b, a_level, b_level in pairs:
+		found.add((a['user_id'], b['user_id'], a_level, b_level))
+		found.add((b['user_id'], a['user_id'], b_level, a_level))
+	return found
+
+
+@pytest.fixture(params=[1, 2, 3])
+def requests(request):
+	return random_requests(80, seed=request.param)
+
+
+def test_same_apartment_never_matches():
+	a = {'user_id': 'a', 'current_apartment_id': 1, 'preferences': {'first_choice_id': 1, 'second_choice_id': 2}}
+	b = {'user_id': 'b', 'current_apartment_id': 1, 'preferences': {'first_choice_id': 1}}
+	cache = RequestCache()
+	cache.load([a, b])
+	assert cache.matches('a') == []
+	assert list(iter_mutual_pairs([a, b])) == []
+
+
+def test_request_cache_and_queries_agree_with_batch(requests):
+	expected = pairs_from_mutual(iter_mutual_pairs(requests))
+	assert expected
+
+	cache = RequestCache()
+	cache.load(requests)
+	db = memory_database()
+	db['swap_requests'].insert_many([dict(r) for r in requests])
+
+	from_cache, from_queries = set(), set()
+	for r in requests:
+		from_cache |= pairs_from_matches(r['user_id'], cache.matches(r['user_id']))
+		from_queries |= pairs_from_matches(r['user_id'], find_matches(db['swap_requests'], r))
+	assert from_cache == expected
+	assert from_queries == expected
+
+
+def test_numpy_matcher_agrees_with_batch(requests):
+	pytest.importorskip('numpy')
+	from utils.numpy_matcher import NumpyMatcher
+
+	matcher = NumpyMatcher(requests)
+	assert pairs_from_mutual(matcher.iter_pairs()) == pairs_from_mutual(iter_mutual_pairs(requests))
+	for r in requests:
+		assert pairs_from_matches(r['user_id'], matcher.matches_for(r['user_id'])) == {
+			pair for pair in pairs_from_mutual(iter_mutual_pairs(requests)) if pair[0] == r['user_id']
+		}
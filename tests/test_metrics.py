@@ -0,0 +1,56 @@
+"""/metrics adds up the snapshots of every worker, including exited ones."""
+import json
+
+import pytest
+
+from utils import metrics
+
+OTHER_PID = 999999999
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+	monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+	monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+	for metric in metrics.REGISTRY:
+		metric.clear()
+	yield tmp_path
+	for metric in metrics.REGISTRY:
+		metric.clear()
+
+
+def count_line(text):
+	return next(
+		line for line in text.splitlines()
+		if line.startswith('http_request_duration_seconds_count{endpoint="get_matches"')
+	)
+
+
+def other_worker(metrics_dir, requests):
+	series = [[['get_matches', 'GET', '200'], [requests] * len(metrics.LATENCY_BUCKETS) + [0.001 * requests, requests]]]
+	(metrics_dir / f'{OTHER_PID}.json').write_text(json.dumps({'http_request_duration_seconds': series}))
+
+
+def test_render_sums_every_worker(metrics_dir):
+	metrics.request_duration.observe(0.002, 'get_matches', 'GET', '200')
+	other_worker(metrics_dir, 3)
+	assert count_line(metrics.render()).endswith(' 4')
+
+
+def test_exited_worker_is_kept_in_the_archive(metrics_dir):
+	metrics.request_duration.observe(0.002, 'get_matches', 'GET', '200')
+	other_worker(metrics_dir, 3)
+	metrics.archive_snapshot(OTHER_PID)
+	assert not (metrics_dir / f'{OTHER_PID}.json').exists()
+	assert count_line(metrics.render()).endswith(' 4')
+
+	other_worker(metrics_dir, 2)
+	metrics.archive_snapshot(OTHER_PID)
+	assert count_line(metrics.render()).endswith(' 6')
+
+
+def test_clear_snapshots(metrics_dir):
+	other_worker(metrics_dir, 3)
+	metrics.archive_snapshot(OTHER_PID)
+	metrics.clear_snapshots()
+	assert list(metrics_dir.glob('*.json')) == []
@@ -0,0 +1,85 @@
+"""top_k and cursors page through matches without gaps or repeats."""
+import pytest
+
+from routes.preference_swapping_requests import matches_for_user
+from utils.pagination import (
+	DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageArgs, decode_cursor, encode_cursor, page_args, top_k
+)
+
+
+def key(item):
+	return (item['level'], item['id'])
+
+
+ITEMS = [{'level': level, 'id': f'u{i:02d}'} for i, level in enumerate([3, 1, 2, 1, 3, 2, 1, 2, 3, 1, 2])]
+
+
+def test_pages_cover_every_item_in_order():
+	seen, after = [], None
+	while True:
+		page, cursor = top_k(iter(ITEMS), key, 4, after)
+		seen += page
+		if cursor is None:
+			break
+		after = decode_cursor(cursor)
+	assert seen == sorted(ITEMS, key=key)
+
+
+def test_last_full_page_has_no_cursor():
+	page, cursor = top_k(ITEMS, key, len(ITEMS))
+	assert len(page) == len(ITEMS)
+	assert cursor is None
+
+
+def test_cursor_round_trip():
+	assert decode_cursor(encode_cursor((1, -2.5, 'u01'))) == (1, -2.5, 'u01')
+
+
+@pytest.mark.parametrize('token', ['not base64!', 'eyJhIjoxfQ', ''.join(['x'] * 7)])
+def test_malformed_cursor(token):
+	with pytest.raises(InvalidPageArgs):
+		decode_cursor(token)
+
+
+def test_incomparable_cursor():
+	with pytest.raises(InvalidPageArgs):
+		top_k(ITEMS, key, 4, decode_cursor(encode_cursor(['u01', 1])))
+
+
+def test_page_args():
+	assert page_args({}) == (DEFAULT_PAGE_SIZE, None)
+	assert page_args({'limit': '0'})[0] == 1
+	assert page_args({'limit': '100000'})[0] == MAX_PAGE_SIZE
+	with pytest.raises(InvalidPageArgs):
+		page_args({'limit': 'ten'})
+
+
+def test_matches_for_user_pages(monkeypatch):
+	from routes import preference_swapping_requests as prefs
+	from utils.request_cache import RequestCache
+
+	cache = RequestCache()
+	requests = [{
+		'user_id': 'me', 'current_apartment_id': 1,
+		'preferences': {'first_choice_id': 2, 'second_choice_id': 3, 'third_choice_id': 4}
+	}]
+	for apartment in (2, 3, 4):
+		for i in range(3):
+			requests.append({
+				'user_id': f'{apartment}-{i}', 'current_apartment_id': apartment,
+				'preferences': {'first_choice_id': 1}
+			})
+	cache.load(requests)
+	monkeypatch.setattr(prefs, 'MATCH_STORE_ENABLED', False)
+	monkeypatch.setattr(prefs, 'REQUEST_CACHE_ENABLED', True)
+	monkeypatch.setattr(prefs, 'get_request_cache', lambda: cache)
+
+	seen, after = [], None
+	while True:
+		page, cursor = matches_for_user('me', 2, after)
+		seen += page
+		if cursor is None:
+			break
+		after = decode_cursor(cursor)
+	assert [m['other_user_id'] for m in seen] == ['2-0', '2-1', '2-2', '3-0', '3-1', '3-2', '4-0', '4-1', '4-2']
+	assert [m['my_preference_level'] for m in seen] == [1, 1, 1, 2, 2, 2, 3, 3, 3]
@@ -0,0 +1,93 @@
+"""Login rate limits and the host-wide password hashing slots."""
+import pytest
+
+from utils import passwords
+from utils.passwords import HostSlots, RateLimited, TokenBucketLimiter
+
+
+class Clock:
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	clock = Clock()
+	monkeypatch.setattr(passwords.time, 'monotonic', clock)
+	return clock
+
+
+@pytest.fixture
+def limiters(monkeypatch):
+	ip = TokenBucketLimiter(rate=1, burst=3)
+	email = TokenBucketLimiter(rate=1, burst=2)
+	monkeypatch.setattr(passwords, 'ip_limiter', ip)
+	monkeypatch.setattr(passwords, 'email_limiter', email)
+	return ip, email
+
+
+def test_bucket_refills_over_time(clock):
+	limiter = TokenBucketLimiter(rate=0.5, burst=2)
+	limiter.take('k')
+	limiter.take('k')
+	with pytest.raises(RateLimited) as e:
+		limiter.take('k')
+	assert e.value.retry_after == pytest.approx(2)
+	clock.now += 2
+	limiter.take('k')
+
+
+def test_buckets_are_per_key(clock):
+	limiter = TokenBucketLimiter(rate=1, burst=1)
+	limiter.take('a')
+	limiter.take('b')
+	with pytest.raises(RateLimited):
+		limiter.take('a')
+
+
+def test_oldest_keys_are_evicted(clock):
+	limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2)
+	limiter.take('a')
+	limiter.take('b')
+	limiter.take('c')
+	# 'a' was dropped, so it starts again with a full bucket
+	limiter.take('a')
+
+
+def test_successful_logins_do_not_use_up_the_address(clock, limiters):
+	for i in range(10):
+		passwords.check_login_limits('10.0.0.1', f'student{i}@scarletmail.rutgers.edu')
+
+
+def test_failed_logins_use_up_the_address(clock, limiters):
+	for i in range(3):
+		passwords.check_login_limits('10.0.0.1', f'student{i}@scarletmail.rutgers.edu')
+		passwords.login_failed('10.0.0.1')
+	with pytest.raises(RateLimited):
+		passwords.check_login_limits('10.0.0.1', 'student9@scarletmail.rutgers.edu')
+	passwords.check_login_limits('10.0.0.2', 'student9@scarletmail.rutgers.edu')
+
+
+def test_every_attempt_counts_against_the_email(clock, limiters):
+	passwords.check_login_limits('10.0.0.1', 'Student@scarletmail.rutgers.edu')
+	passwords.check_login_limits('10.0.0.2', 'student@scarletmail.rutgers.edu')
+	with pytest.raises(RateLimited):
+		passwords.check_login_limits('10.0.0.3', 'STUDENT@scarletmail.rutgers.edu')
+
+
+def test_host_slots(tmp_path):
+	slots = HostSlots(str(tmp_path), 'test', 2)
+	# a second instance stands in for another worker process on the host
+	other = HostSlots(str(tmp_path), 'test', 2)
+	first = slots.acquire()
+	second = other.acquire()
+	assert first is not None and second is not None
+	assert slots.acquire(timeout=0.05) is None
+	other.release(second)
+	third = slots.acquire()
+	assert third is not None
+	slots.release(first)
+	slots.release(third)
@@ -0,0 +1,126 @@
+"""ETags of match responses built from per-worker request caches."""
+import threading
+
+import pytest
+
+from routes import preference_swapping_requests as prefs
+from routes.main import create_app, memory_database
+from utils import http_cache
+from utils.apartments import REQUEST_APARTMENT_FIELDS, resolve_fields
+from utils.db import set_database
+from utils.http_cache import PREFERENCE, VersionSync, bump_version
+from utils.request_cache import RequestCache
+
+
+def swap_request(user_id, current, *choices):
+	doc = {
+		'user_id': user_id,
+		'user_name': user_id,
+		'email': f'{user_id}@scarletmail.rutgers.edu',
+		'current_apartment': current,
+		'preferences': dict(zip(('first_choice', 'second_choice', 'third_choice'), choices)),
+		'type': 'swap_request'
+	}
+	return resolve_fields(doc, REQUEST_APARTMENT_FIELDS['swap_request'])
+
+
+def bump_elsewhere(db):
+	# a write by another worker: the counter moves without this process knowing why
+	db['versions'].update_one({'_id': PREFERENCE}, {'$inc': {'v': 1}}, upsert=True)
+
+
+@pytest.fixture
+def db(monkeypatch):
+	db = memory_database()
+	set_database(db)
+	monkeypatch.setattr(prefs, 'REQUEST_CACHE_ENABLED', True)
+	monkeypatch.setattr(prefs, 'MATCH_STORE_ENABLED', False)
+	monkeypatch.setattr(prefs, 'request_cache', RequestCache())
+	monkeypatch.setattr(prefs, 'request_cache_sync', VersionSync(PREFERENCE, max_age=300))
+	monkeypatch.setattr(http_cache.version_poll, 'interval', 0)
+	monkeypatch.setattr(http_cache.version_poll, '_values', {})
+	yield db
+	set_database(None)
+
+
+@pytest.fixture
+def client(db):
+	app = create_app()
+	app.config['TESTING'] = True
+	client = app.test_client()
+	with client.session_transaction() as session:
+		session.update({'user_id': 'alice', 'user_email': 'alice@scarletmail.rutgers.edu', 'user_name': 'alice'})
+	return client
+
+
+def get_matches(client, etag=None):
+	return client.get('/get-matches', headers={'If-None-Match': etag} if etag else {})
+
+
+def test_response_built_during_reload_is_not_reused(db, client, monkeypatch):
+	db['swap_requests'].insert_one(swap_request('alice', 'A', 'B', 'C', 'D'))
+	first = get_matches(client)
+	assert first.status_code == 200 and first.get_json() == []
+
+	# bob's matching request is written by another worker
+	db['swap_requests'].insert_one(swap_request('bob', 'B', 'A', 'C', 'D'))
+	bump_elsewhere(db)
+
+	loading, release = threading.Event(), threading.Event()
+	load = prefs.load_request_cache
+
+	def slow_load():
+		loading.set()
+		release.wait(5)
+		load()
+
+	monkeypatch.setattr(prefs, 'load_request_cache', slow_load)
+	reloader = threading.Thread(target=get_matches, args=(client,))
+	reloader.start()
+	assert loading.wait(5)
+
+	# served from the old copy while the reload runs, which still holds
+	# exactly what the page has
+	during = get_matches(client, first.headers['ETag'])
+	assert during.status_code == 304
+
+	release.set()
+	reloader.join(5)
+
+	after = get_matches(client, first.headers['ETag'])
+	assert after.status_code == 200
+	assert [m['other_user_id'] for m in after.get_json()] == ['bob']
+
+
+def test_response_built_before_cache_update_is_not_reused(db, client):
+	db['swap_requests'].insert_one(swap_request('alice', 'A', 'B', 'C', 'D'))
+	assert get_matches(client).get_json() == []
+
+	# a write route of this worker, caught between bump_version and request_cache.add
+	bob = swap_request('bob', 'B', 'A', 'C', 'D')
+	db['swap_requests'].insert_one(bob)
+	bump_version(PREFERENCE)
+	between = get_matches(client)
+	assert between.get_json() == []
+	prefs.request_cache.add(bob)
+
+	after = get_matches(client, between.headers['ETag'])
+	assert after.status_code == 200
+	assert [m['other_user_id'] for m in after.get_json()] == ['bob']
+
+
+def test_unchanged_cache_still_revalidates(db, client):
+	db['swap_requests'].insert_one(swap_request('alice', 'A', 'B', 'C', 'D'))
+	first = get_matches(client)
+	assert get_matches(client, first.headers['ETag']).status_code == 304
+
+
+def test_another_worker_revalidates_the_same_etag(db, client, monkeypatch):
+	db['swap_requests'].insert_many([swap_request('alice', 'A', 'B', 'C', 'D'), swap_request('bob', 'B', 'A', 'C', 'D')])
+	first = get_matches(client)
+	assert [m['other_user_id'] for m in first.get_json()] == ['bob']
+
+	# the next poll reaches a worker with its own, freshly loaded copy
+	monkeypatch.setattr(prefs, 'request_cache', RequestCache())
+	monkeypatch.setattr(prefs, 'request_cache_sync', VersionSync(PREFERENCE, max_age=300))
+	assert get_matches(client, first.headers['ETag']).status_code == 304
@@ -0,0 +1,97 @@
+"""Swap request writes: one request per user, partial updates, and what they bump."""
+import pytest
+
+from routes import preference_swapping_requests as prefs
+from routes.main import create_app, memory_database
+from utils import http_cache
+from utils.db import set_database
+from utils.http_cache import PREFERENCE, VersionSync
+from utils.request_cache import RequestCache
+
+REQUEST = {'current_apartment': 'A', 'first_choice': 'B', 'second_choice': 'C', 'third_choice': 'D'}
+
+
+@pytest.fixture
+def db(monkeypatch):
+	db = memory_database()
+	set_database(db)
+	monkeypatch.setattr(prefs, 'REQUEST_CACHE_ENABLED', True)
+	monkeypatch.setattr(prefs, 'MATCH_STORE_ENABLED', False)
+	monkeypatch.setattr(prefs, 'request_cache', RequestCache())
+	monkeypatch.setattr(prefs, 'request_cache_sync', VersionSync(PREFERENCE, max_age=300))
+	monkeypatch.setattr(http_cache, 'MATCH_EVENTS_CHANGE_STREAM', False)
+	monkeypatch.setattr(http_cache.version_poll, '_values', {})
+	yield db
+	set_database(None)
+
+
+@pytest.fixture
+def client(db):
+	app = create_app()
+	app.config['TESTING'] = True
+	client = app.test_client()
+	with client.session_transaction() as session:
+		session.update({'user_id': 'alice', 'user_email': 'alice@scarletmail.rutgers.edu', 'user_name': 'alice'})
+	return client
+
+
+def own_request(db):
+	return db['swap_requests'].find_one({'user_id': 'alice', 'type': 'swap_request'})
+
+
+def test_second_create_is_rejected(db, client):
+	assert client.post('/create-request', json=REQUEST).status_code == 201
+	second = client.post('/create-request', json={**REQUEST, 'first_choice': 'E'})
+	assert second.status_code == 400
+	assert 'already have a swap request' in second.get_json()['error']
+	assert db['swap_requests'].count_documents({'user_id': 'alice'}) == 1
+	assert own_request(db)['preferences']['first_choice'] == 'B'
+
+
+def test_update_sets_only_the_given_fields(db, client):
+	client.post('/create-request', json=REQUEST)
+	before = own_request(db)
+
+	response = client.post('/update-request', json={'request_id': str(before['_id']), 'second_choice': 'E'})
+	assert response.status_code == 200
+
+	after = own_request(db)
+	assert after['preferences']['first_choice'] == 'B'
+	assert after['preferences']['second_choice'] == 'E'
+	assert after['preferences']['third_choice'] == 'D'
+	assert after['preferences']['first_choice_id'] == before['preferences']['first_choice_id']
+	assert after['preferences']['second_choice_id'] != before['preferences']['second_choice_id']
+	assert prefs.request_cache.get('alice').choices == tuple(
+		after['preferences'][field] for field in ('first_choice_id', 'second_choice_id', 'third_choice_id')
+	)
+
+
+def test_update_without_changes(db, client):
+	client.post('/create-request', json=REQUEST)
+	request_id = str(own_request(db)['_id'])
+	response = client.post('/update-request', json={'request_id': request_id, 'first_choice': 'B'})
+	assert response.get_json() == {'message': 'No changes applied'}
+
+
+def test_update_of_someone_elses_request(db, client):
+	other = db['swap_requests'].insert_one({'user_id': 'bob', 'type': 'swap_request', 'current_apartment': 'B'})
+	response = client.post('/update-request', json={'request_id': str(other.inserted_id), 'first_choice': 'C'})
+	assert response.status_code == 404
+
+
+def test_writes_bump_versions_only_without_the_change_stream(db, client, monkeypatch):
+	client.post('/create-request', json=REQUEST)
+	assert db['versions'].find_one({'_id': PREFERENCE})['v'] == 1
+
+	monkeypatch.setattr(http_cache, 'MATCH_EVENTS_CHANGE_STREAM', True)
+	client.post('/update-request', json={'request_id': str(own_request(db)['_id']), 'first_choice': 'E'})
+	assert db['versions'].find_one({'_id': PREFERENCE})['v'] == 1
+
+
+def test_delete_by_request_id(db, client):
+	client.post('/create-request', json=REQUEST)
+	request_id = own_request(db)['_id']
+	cache = RequestCache()
+	cache.load(db['swap_requests'].find({'type': 'swap_request'}))
+	cache.remove_request(request_id)
+	assert cache.get('alice') is None
@@ -0,0 +1,8 @@
+"""Shared application code.
+
+Importing the package loads `.env` once per process, before any module reads
+its settings from the environment.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
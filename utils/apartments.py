@@ -0,0 +1,188 @@
+import csv
+import os
+import re
+import threading
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.db import get_db
+
+APARTMENTS_COLLECTION = 'apartments'
+COUNTERS_COLLECTION = 'counters'
+
+# Reject apartments that are not in the catalog instead of registering them
+# on first use. Turn on once the catalog has been imported.
+APARTMENT_CATALOG_STRICT = os.environ.get('APARTMENT_CATALOG_STRICT', '').lower() in ('1', 'true', 'yes')
+
+
+class UnknownApartment(ValueError):
+	"""An apartment label that is not in the catalog (strict mode only)."""
+
+
+def normalize_label(label):
+	"""Catalog key for a label: case, punctuation and spacing are ignored."""
+	return ' '.join(re.sub(r'[^\w\s]', ' ', str(label)).casefold().split())
+
+
+class ApartmentCatalog:
+	"""Maps free-text apartment labels to compact integer IDs.
+
+	Each apartment is stored once as {_id: int, label, key} where key is the
+	normalized label, so "Livingston Apts A" and "livingston apts a" resolve
+	to the same ID. IDs come from an atomic counter and are never reused.
+	Lookups are cached per process; the catalog only ever grows, so cached
+	entries never go stale.
+	"""
+
+	def __init__(self, get_database=get_db, strict=False):
+		self.get_database = get_database
+		self.strict = strict
+		self._by_key = {}
+		self._labels = {}
+		self._lock = threading.Lock()
+
+	def _remember(self, doc):
+		with self._lock:
+			self._by_key[doc['key']] = doc['_id']
+			self._labels[doc['_id']] = doc['label']
+		return doc['_id'], doc['label']
+
+	def _next_id(self, db):
+		counter = db[COUNTERS_COLLECTION].find_one_and_update(
+			{'_id': APARTMENTS_COLLECTION},
+			{'$inc': {'seq': 1}},
+			upsert=True,
+			return_document=ReturnDocument.AFTER
+		)
+		return counter['seq']
+
+	def resolve(self, label, create=None):
+		"""Return (apartment_id, canonical_label) for a user-supplied label.
+
+		Unknown labels are registered unless the catalog is strict (or
+		create=False), in which case UnknownApartment is raised.
+		"""
+		key = normalize_label(label)
+		if not key:
+			raise UnknownApartment('Apartment name is required')
+		apartment_id = self._by_key.get(key)
+		if apartment_id is not None:
+			return apartment_id, self._labels[apartment_id]
+
+		db = self.get_database()
+		apartments = db[APARTMENTS_COLLECTION]
+		doc = apartments.find_one({'key': key})
+		if doc is None:
+			if create is None:
+				create = not self.strict
+			if not create:
+				raise UnknownApartment(f'Unknown apartment: {label}')
+			doc = {'_id': self._next_id(db), 'label': ' '.join(str(label).split()), 'key': key}
+			try:
+				apartments.insert_one(doc)
+			except DuplicateKeyError:
+				# registered concurrently by another request; use theirs
+				doc = apartments.find_one({'key': key})
+		return self._remember(doc)
+
+	def label(self, apartment_id):
+		"""Canonical label for an apartment ID, or None if it does not exist."""
+		if apartment_id not in self._labels:
+			doc = self.get_database()[APARTMENTS_COLLECTION].find_one({'_id': apartment_id})
+			if doc is None:
+				return None
+			self._remember(doc)
+		return self._labels[apartment_id]
+
+	def all(self):
+		"""Every catalog entry as {'id', 'label'}, ordered by label."""
+		docs = self.get_database()[APARTMENTS_COLLECTION].find({}, {'label': 1, 'key': 1})
+		return sorted(({'id': d['_id'], 'label': d['label']} for d in docs), key=lambda a: a['label'])
+
+	def import_labels(self, labels):
+		"""Register every label; returns (added, existing) counts."""
+		added = existing = 0
+		for label in labels:
+			if not normalize_label(label):
+				continue
+			try:
+				self.resolve(label, create=False)
+				existing += 1
+			except UnknownApartment:
+				self.resolve(label, create=True)
+				added += 1
+		return added, existing
+
+	def clear(self):
+		with self._lock:
+			self._by_key.clear()
+			self._labels.clear()
+
+
+catalog = ApartmentCatalog(strict=APARTMENT_CATALOG_STRICT)
+
+
+def read_labels_csv(f):
+	"""Apartment labels from a CSV with a `label` (or `name`) column, or one label per line."""
+	rows = list(csv.reader(f))
+	if not rows:
+		return []
+	header = [h.strip().lower() for h in rows[0]]
+	for column in ('label', 'name', 'apartment'):
+		if column in header:
+			index = header.index(column)
+			return [row[index] for row in rows[1:] if len(row) > index and row[index].strip()]
+	return [row[0] for row in rows if row and row[0].strip()]
+
+
+def resolve_fields(doc, fields, resolver=None):
+	"""Replace each label field of doc (dotted paths allowed) with its canonical
+	label and set the matching `<field>_id`. Returns doc."""
+	resolver = resolver or catalog.resolve
+	for field in fields:
+		parent, _, name = field.rpartition('.')
+		target = doc
+		for part in filter(None, parent.split('.')):
+			target = target.get(part) or {}
+		value = target.get(name)
+		if value:
+			target[name + '_id'], target[name] = resolver(value)
+		elif name in target:
+			target[name + '_id'] = None
+	return doc
+
+
+REQUEST_APARTMENT_FIELDS = {
+	'swap_request': (
+		'current_apartment',
+		'preferences.first_choice',
+		'preferences.second_choice',
+		'preferences.third_choice'
+	),
+	'cycle_request': ('current_apartment', 'desired_choice')
+}
+
+
+def backfill_request_ids(db, resolver=None):
+	"""Give every stored swap/cycle request the apartment IDs for its labels.
+
+	Returns the number of requests updated.
+	"""
+	updated = 0
+	swap_requests = db['swap_requests']
+	for request_type, fields in REQUEST_APARTMENT_FIELDS.items():
+		for doc in swap_requests.find({'type': request_type}):
+			before = repr(doc)
+			resolve_fields(doc, fields, resolver)
+			if repr(doc) == before:
+				continue
+			update = {}
+			for field in fields:
+				top = field.split('.')[0]
+				if top == field:
+					update[field + '_id'] = doc.get(field + '_id')
+				update[top] = doc.get(top)
+			swap_requests.update_one({'_id': doc['_id']}, {'$set': update})
+			updated += 1
+	return updated
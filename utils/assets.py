@@ -0,0 +1,133 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies every CSS and JS file under static/ to
+static/dist/ with a content hash in its name (js/base.js ->
+js/base.3f2a9c1e0b7d.js), next to .gz and, when the brotli package is
+installed, .br copies, and records the mapping in static/dist/manifest.json.
+
+init_app() makes url_for('static', filename='js/base.js') point at the
+hashed copy, and serves hashed copies with the best encoding the browser
+accepts and `Cache-Control: immutable`: a file's URL changes whenever its
+content does, so browsers can keep it for a year without revalidating.
+Without a manifest (or in debug mode) static files are served as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+try:
+	import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+	brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+
+# Far-future caching for content-addressed files.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Content-Encoding -> suffix of the precompressed copy, best first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprint(data, length=12):
+	return hashlib.sha256(data).hexdigest()[:length]
+
+
+def hashed_name(path, data):
+	root, ext = os.path.splitext(path)
+	return f'{root}.{fingerprint(data)}{ext}'
+
+
+def iter_sources(static_folder):
+	"""Relative paths (with forward slashes) of the assets to build, skipping dist/."""
+	for root, dirs, files in os.walk(static_folder):
+		dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(static_folder, DIST_DIR))
+		for name in sorted(files):
+			if name.endswith(ASSET_EXTENSIONS):
+				yield os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+
+
+def write_file(path, data):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'wb') as f:
+		f.write(data)
+
+
+def build_assets(static_folder):
+	"""Write fingerprinted and precompressed copies of the assets; returns the manifest.
+
+	Copies from earlier builds are left in place, so pages rendered before a
+	deploy can still load the files they reference.
+	"""
+	dist = os.path.join(static_folder, DIST_DIR)
+	manifest = {}
+	for source in iter_sources(static_folder):
+		with open(os.path.join(static_folder, source), 'rb') as f:
+			data = f.read()
+		target = hashed_name(source, data)
+		manifest[source] = target
+		path = os.path.join(dist, target)
+		write_file(path, data)
+		# mtime=0 keeps the output identical between builds of the same file
+		write_file(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+		if brotli is not None:
+			write_file(path + '.br', brotli.compress(data))
+	write_file(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+	return manifest
+
+
+def load_manifest(static_folder):
+	try:
+		with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def accepted_encodings():
+	"""Content codings the current request accepts (q=0 excluded)."""
+	return {coding for coding, quality in request.accept_encodings if quality > 0}
+
+
+def init_app(app):
+	"""Point static URLs at fingerprinted assets and serve them with long-lived caching."""
+	manifest = {} if app.debug else load_manifest(app.static_folder)
+	if not manifest:
+		return
+	app.extensions['asset_manifest'] = manifest
+	dist = os.path.join(app.static_folder, DIST_DIR)
+	fingerprinted = {f'{DIST_DIR}/{target}' for target in manifest.values()}
+
+	@app.url_defaults
+	def fingerprinted_static_url(endpoint, values):
+		if endpoint == 'static' and values.get('filename') in manifest:
+			values['filename'] = f"{DIST_DIR}/{manifest[values['filename']]}"
+
+	serve_static = app.view_functions['static']
+
+	def static(filename):
+		# Only this build's own files are known to have precompressed copies
+		if filename not in fingerprinted:
+			return serve_static(filename=filename)
+		name = filename[len(DIST_DIR) + 1:]
+		mimetype = mimetypes.guess_type(name)[0]
+		accepted = accepted_encodings()
+		for encoding, suffix in ENCODINGS:
+			if encoding in accepted and os.path.isfile(os.path.join(dist, name + suffix)):
+				response = send_from_directory(dist, name + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+				response.headers['Content-Encoding'] = encoding
+				break
+		else:
+			response = send_from_directory(dist, name, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+		response.vary.add('Accept-Encoding')
+		response.cache_control.public = True
+		response.cache_control.immutable = True
+		return response
+
+	app.view_functions['static'] = static
@@ -0,0 +1,205 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import DeleteMany, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from utils.indexes import INDEXES
+from utils.matching import (
+	CANDIDATE_PROJECTION, PREFERENCE_ID_FIELDS, assign_pairs, build_match, get_choices, iter_mutual_pairs,
+	match_levels
+)
+
+MATCHES_COLLECTION = 'matches'
+MATCH_RUNS_COLLECTION = 'match_runs'
+
+
+def match_documents(a, b, a_level, b_level, computed_at):
+	"""Both directions of a matched pair, as stored in the matches collection."""
+	for me, other, my_level, other_level in ((a, b, a_level, b_level), (b, a, b_level, a_level)):
+		doc = build_match(me, other, my_level, other_level)
+		doc['user_id'] = me['user_id']
+		doc['computed_at'] = computed_at
+		yield doc
+
+
+def mutual_pairs(requests, engine='python'):
+	"""Every mutual pair among requests, from the pure-Python or numpy engine."""
+	if engine == 'numpy':
+		from utils.numpy_matcher import NumpyMatcher
+		return NumpyMatcher(requests).iter_pairs()
+	if engine != 'python':
+		raise ValueError(f'Unknown matching engine: {engine}')
+	return iter_mutual_pairs(requests)
+
+
+def run_batch_matching(db, assign=False, batch_size=1000, engine='python'):
+	"""Compute every mutual preference match and materialize it into `matches`.
+
+	Results are written to a staging collection that is renamed over `matches`
+	once complete, so readers never see a half-written run. With assign=True
+	each user keeps at most one partner, picked greedily by preference
+	weight (see utils.matching.assign_pairs). engine='numpy' computes the pairs with the vectorized
+	matcher in utils.numpy_matcher.
+	"""
+	started = time.perf_counter()
+	computed_at = datetime.utcnow()
+
+	requests = list(db['swap_requests'].find({'type': 'swap_request'}, CANDIDATE_PROJECTION))
+	pairs = mutual_pairs(requests, engine)
+	if assign:
+		pairs = assign_pairs(pairs)
+
+	staging = db[MATCHES_COLLECTION + '_staging']
+	staging.drop()
+	staging.create_indexes(INDEXES[MATCHES_COLLECTION])
+
+	pair_count = 0
+	batch = []
+	for a, b, a_level, b_level in pairs:
+		pair_count += 1
+		batch.extend(match_documents(a, b, a_level, b_level, computed_at))
+		if len(batch) >= batch_size:
+			staging.insert_many(batch, ordered=False)
+			batch = []
+	if batch:
+		staging.insert_many(batch, ordered=False)
+
+	if pair_count:
+		staging.rename(MATCHES_COLLECTION, dropTarget=True)
+	else:
+		db[MATCHES_COLLECTION].delete_many({})
+		staging.drop()
+
+	stats = {
+		'started_at': computed_at,
+		'duration_seconds': round(time.perf_counter() - started, 3),
+		'requests': len(requests),
+		'pairs': pair_count,
+		'mode': 'assignment' if assign else 'all',
+		'engine': engine
+	}
+	db[MATCH_RUNS_COLLECTION].insert_one(dict(stats))
+	return stats
+
+
+def stored_match_mode(db):
+	"""Mode of the last `match-all` run ('all' or 'assignment'); 'all' if there was none."""
+	run = db[MATCH_RUNS_COLLECTION].find_one({}, {'mode': 1}, sort=[('_id', -1)])
+	return run.get('mode', 'all') if run else 'all'
+
+
+def recompute_apartments(db, apartments, user_ids=()):
+	"""Refresh the stored matches of every swap request living in `apartments` (catalog IDs).
+
+	When a request changes, only residents of the apartments it lived in or
+	asked for can gain or lose a match, so recomputing their view of the world
+	keeps `matches` exact. user_ids are owners of changed or deleted requests,
+	whose stored matches are always cleared first. Uses two queries no matter
+	how many residents there are.
+
+	If the last `match-all` run stored an assignment (one partner per user),
+	only the changed owners' pairs are revalidated; see revalidate_assignments.
+	"""
+	if stored_match_mode(db) == 'assignment':
+		return revalidate_assignments(db, user_ids)
+
+	apartments = [a for a in set(apartments) if a is not None]
+	swap_requests = db['swap_requests']
+	residents = []
+	if apartments:
+		residents = list(swap_requests.find(
+			{'type': 'swap_request', 'current_apartment_id': {'$in': apartments}},
+			CANDIDATE_PROJECTION
+		))
+
+	# Anyone who could match a resident lives in one of the residents' choices
+	# and wants one of the affected apartments.
+	wanted = list({choice for r in residents for choice in get_choices(r) if choice is not None})
+	partners = []
+	if wanted:
+		partners = list(swap_requests.find({
+			'type': 'swap_request',
+			'current_apartment_id': {'$in': wanted},
+			'$or': [{'preferences.' + field: {'$in': apartments}} for field in PREFERENCE_ID_FIELDS]
+		}, CANDIDATE_PROJECTION))
+
+	pool = {r['user_id']: r for r in partners}
+	pool.update((r['user_id'], r) for r in residents)
+	resident_ids = {r['user_id'] for r in residents}
+
+	computed_at = datetime.utcnow()
+	docs = [
+		doc
+		for pair in iter_mutual_pairs(pool.values())
+		for doc in match_documents(*pair, computed_at)
+		if doc['user_id'] in resident_ids
+	]
+
+	replace_user_matches(db[MATCHES_COLLECTION], resident_ids | set(user_ids), docs)
+	return len(docs)
+
+
+def replace_user_matches(matches, user_ids, docs):
+	"""Make the stored matches of each of user_ids exactly docs, in one bulk write.
+
+	Each user's other pairs are deleted and docs are upserted on the unique
+	(user_id, other_user_id) index, so refreshes of the same users running at
+	once in two processes cannot leave duplicate pairs behind.
+	"""
+	keep = defaultdict(list)
+	for doc in docs:
+		keep[doc['user_id']].append(doc['other_user_id'])
+	operations = [
+		DeleteMany({'user_id': user_id, 'other_user_id': {'$nin': keep.get(user_id, [])}})
+		for user_id in user_ids
+	]
+	operations.extend(
+		ReplaceOne({'user_id': doc['user_id'], 'other_user_id': doc['other_user_id']}, doc, upsert=True)
+		for doc in docs
+	)
+	if not operations:
+		return
+	try:
+		matches.bulk_write(operations, ordered=False)
+	except BulkWriteError as e:
+		# a concurrent refresh upserted the same pair first
+		if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+			raise
+
+
+def revalidate_assignments(db, user_ids):
+	"""Keep an assignment-mode store at one partner per user after user_ids' requests changed.
+
+	The assignment is global, so it cannot be redone for a few apartments:
+	each changed owner's stored pair is rewritten with the current preference
+	levels if the two requests still match, and dropped on both sides if not.
+	New pairs wait for the next `match-all --assign` run.
+	"""
+	user_ids = [user_id for user_id in set(user_ids) if user_id]
+	if not user_ids:
+		return 0
+	matches = db[MATCHES_COLLECTION]
+	partners = {
+		m['user_id']: m['other_user_id']
+		for m in matches.find({'user_id': {'$in': user_ids}}, {'user_id': 1, 'other_user_id': 1})
+	}
+	involved = list(set(user_ids) | set(partners.values()))
+	requests = {
+		r['user_id']: r
+		for r in db['swap_requests'].find({'type': 'swap_request', 'user_id': {'$in': involved}}, CANDIDATE_PROJECTION)
+	}
+
+	computed_at = datetime.utcnow()
+	# keyed by owner, so a pair whose both sides changed is written once
+	docs = {}
+	for user_id, other_id in partners.items():
+		me, other = requests.get(user_id), requests.get(other_id)
+		levels = match_levels(me, other) if me and other else None
+		if levels:
+			for doc in match_documents(me, other, *levels, computed_at):
+				docs[doc['user_id']] = doc
+
+	replace_user_matches(matches, involved, list(docs.values()))
+	return len(docs)
@@ -0,0 +1,339 @@
+"""Bulk loading of users and requests, and streaming export of matches.
+
+Used by the `flask import-requests` and `flask export-matches` commands.
+Everything takes a database handle, so the same code runs against MongoDB
+or the in-memory stand-in in utils/memory_db.py.
+"""
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+from werkzeug.security import generate_password_hash
+
+from utils.apartments import (
+	APARTMENT_CATALOG_STRICT, REQUEST_APARTMENT_FIELDS, ApartmentCatalog, UnknownApartment, resolve_fields
+)
+from utils.batch_matching import mutual_pairs
+from utils.cycle_graph import CYCLE_PROJECTION, CycleGraph
+from utils.expiry import with_expiry
+from utils.json_provider import dumps
+from utils.matching import CANDIDATE_PROJECTION, PREFERENCE_ID_FIELDS, get_choices
+from utils.passwords import PASSWORD_HASH_METHOD, PASSWORD_HASH_START_METHOD
+
+REQUIRED_FIELDS = {
+	'swap_request': ('current_apartment', 'first_choice', 'second_choice', 'third_choice'),
+	'cycle_request': ('current_apartment', 'desired_choice')
+}
+
+EXPORT_FIELDS = (
+	'kind', 'user_id', 'user_name', 'user_email', 'current_apartment',
+	'other_user_id', 'other_user_name', 'other_user_email', 'other_current_apartment',
+	'my_preference_level', 'other_preference_level', 'cycle_length', 'participants'
+)
+
+
+def detect_format(path, fmt=None):
+	if fmt:
+		return fmt
+	return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def read_rows(f, fmt):
+	"""Yield (row_number, row_dict) from an open CSV or JSONL file, lazily."""
+	if fmt == 'jsonl':
+		for number, line in enumerate(f, start=1):
+			if line.strip():
+				try:
+					yield number, json.loads(line)
+				except ValueError as e:
+					yield number, {'_error': f'Invalid JSON: {e}'}
+	else:
+		# row 1 is the header
+		for number, row in enumerate(csv.DictReader(f), start=2):
+			yield number, {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+
+
+class BulkImporter:
+	"""Loads rows of "user + request" data in batches of unordered inserts.
+
+	Each row names a user by `email` (created with `name` and `password` or
+	`password_hash` when new) and optionally carries one swap or cycle
+	request: `type` plus the same fields as the create routes. Rows that
+	cannot be loaded are reported by row number instead of stopping the run.
+	"""
+
+	def __init__(
+		self, db, batch_size=1000, password_method=None, hash_workers=None, strict_apartments=APARTMENT_CATALOG_STRICT
+	):
+		self.db = db
+		self.batch_size = batch_size
+		self.password_method = password_method or PASSWORD_HASH_METHOD
+		self.hash_workers = hash_workers or os.cpu_count() or 1
+		self._hash_pool = None
+		self.catalog = ApartmentCatalog(lambda: db, strict=strict_apartments)
+		self.stats = {'rows': 0, 'users_created': 0, 'requests_created': 0, 'errors': []}
+
+	def error(self, number, message):
+		self.stats['errors'].append((number, message))
+
+	def run(self, rows):
+		batch = []
+		try:
+			for number, row in rows:
+				self.stats['rows'] += 1
+				if '_error' in row:
+					self.error(number, row['_error'])
+					continue
+				batch.append((number, row))
+				if len(batch) >= self.batch_size:
+					self.load_batch(batch)
+					batch = []
+			if batch:
+				self.load_batch(batch)
+		finally:
+			if self._hash_pool is not None:
+				self._hash_pool.shutdown()
+				self._hash_pool = None
+		return self.stats
+
+	def hash_passwords(self, docs):
+		"""Replace each doc's plain-text `password` with a password_hash, hashing in parallel."""
+		pending = [doc for doc in docs if 'password' in doc]
+		if not pending:
+			return
+		if self._hash_pool is None:
+			self._hash_pool = ProcessPoolExecutor(
+				max_workers=self.hash_workers,
+				mp_context=multiprocessing.get_context(PASSWORD_HASH_START_METHOD)
+			)
+		passwords = [doc.pop('password') for doc in pending]
+		hashes = self._hash_pool.map(
+			generate_password_hash, passwords, [self.password_method] * len(passwords),
+			chunksize=max(1, len(passwords) // (self.hash_workers * 4))
+		)
+		for doc, password_hash in zip(pending, hashes):
+			doc['password_hash'] = password_hash
+
+	def insert_many(self, collection, numbered_docs, describe):
+		"""insert_many(ordered=False), reporting each failed document against its row."""
+		if not numbered_docs:
+			return 0
+		try:
+			return len(collection.insert_many([doc for _, doc in numbered_docs], ordered=False).inserted_ids)
+		except BulkWriteError as e:
+			for write_error in e.details.get('writeErrors', []):
+				number, doc = numbered_docs[write_error['index']]
+				self.error(number, describe(doc, write_error))
+			return e.details.get('nInserted', 0)
+
+	def load_batch(self, batch):
+		users = self.db['users']
+		emails = list({row.get('email') for _, row in batch if row.get('email')})
+		known = {u['email']: u for u in users.find({'email': {'$in': emails}}, {'email': 1, 'name': 1})}
+
+		new_users = []
+		pending = set()
+		for number, row in batch:
+			email = row.get('email')
+			if not email:
+				self.error(number, 'email is required')
+			elif email not in known and email not in pending:
+				doc = self.user_from_row(number, row)
+				if doc:
+					pending.add(email)
+					new_users.append((number, doc))
+		self.hash_passwords([doc for _, doc in new_users])
+		self.stats['users_created'] += self.insert_many(
+			users, new_users,
+			lambda doc, e: f"could not create user {doc['email']}: {e.get('errmsg')}"
+		)
+		if new_users:
+			created = [doc['email'] for _, doc in new_users]
+			known.update((u['email'], u) for u in users.find({'email': {'$in': created}}, {'email': 1, 'name': 1}))
+
+		requests = []
+		for number, row in batch:
+			user = known.get(row.get('email'))
+			if user is None or not (row.get('type') or row.get('current_apartment')):
+				continue
+			doc = self.request_from_row(number, row, user)
+			if doc:
+				requests.append((number, doc))
+		self.stats['requests_created'] += self.insert_many(
+			self.db['swap_requests'], requests,
+			lambda doc, e: (
+				f"{doc['email']} already has a {doc['type']}" if e.get('code') == 11000
+				else f"could not create {doc['type']}: {e.get('errmsg')}"
+			)
+		)
+
+	def user_from_row(self, number, row):
+		name = row.get('name')
+		if not name:
+			self.error(number, f"name is required to create user {row['email']}")
+			return None
+		doc = {'email': row['email'], 'name': name, 'created_at': datetime.utcnow()}
+		if row.get('password_hash'):
+			doc['password_hash'] = row['password_hash']
+		elif row.get('password'):
+			# hashed for the whole batch at once by hash_passwords()
+			doc['password'] = row['password']
+		else:
+			self.error(number, f"password or password_hash is required to create user {row['email']}")
+			return None
+		return doc
+
+	def request_from_row(self, number, row, user):
+		request_type = row.get('type') or ('cycle_request' if row.get('desired_choice') else 'swap_request')
+		if request_type not in REQUIRED_FIELDS:
+			self.error(number, f'unknown request type: {request_type}')
+			return None
+		missing = [field for field in REQUIRED_FIELDS[request_type] if not row.get(field)]
+		if missing:
+			self.error(number, f"missing {', '.join(missing)}")
+			return None
+
+		doc = {
+			'user_id': str(user['_id']),
+			'user_name': user.get('name', ''),
+			'current_apartment': row['current_apartment'],
+			'current_room': row.get('current_room') or '',
+			'email': user['email'],
+			'created_at': datetime.utcnow(),
+			'type': request_type
+		}
+		if request_type == 'swap_request':
+			doc['preferences'] = {
+				'first_choice': row['first_choice'],
+				'second_choice': row['second_choice'],
+				'third_choice': row['third_choice']
+			}
+		else:
+			doc['desired_choice'] = row['desired_choice']
+		try:
+			return with_expiry(resolve_fields(doc, REQUEST_APARTMENT_FIELDS[request_type], self.catalog.resolve))
+		except UnknownApartment as e:
+			self.error(number, str(e))
+			return None
+
+
+def iter_pairs_by_apartment(db, engine='python'):
+	"""Yield (a, b, a_level, b_level) once for every mutual pair of swap requests.
+
+	Pairs are computed one apartment at a time, from its residents and the
+	requests that could match them, so only one apartment's worth of requests
+	is in memory at once. Each pair comes from the group of its lower apartment
+	ID, with a living there.
+	"""
+	swap_requests = db['swap_requests']
+	apartments = swap_requests.distinct('current_apartment_id', {'type': 'swap_request'})
+	for apartment in sorted(a for a in apartments if a is not None):
+		residents = list(swap_requests.find(
+			{'type': 'swap_request', 'current_apartment_id': apartment}, CANDIDATE_PROJECTION
+		))
+		# partners in lower apartments were paired with these residents already
+		wanted = sorted({choice for r in residents for choice in get_choices(r) if choice is not None and choice > apartment})
+		if not wanted:
+			continue
+		partners = swap_requests.find({
+			'type': 'swap_request',
+			'current_apartment_id': {'$in': wanted},
+			'$or': [{'preferences.' + field: apartment} for field in PREFERENCE_ID_FIELDS]
+		}, CANDIDATE_PROJECTION)
+		for a, b, a_level, b_level in mutual_pairs(residents + list(partners), engine):
+			# partners can pair among themselves too; those pairs belong to their own group
+			if a['current_apartment_id'] == apartment:
+				yield a, b, a_level, b_level
+			elif b['current_apartment_id'] == apartment:
+				yield b, a, b_level, a_level
+
+
+def iter_preference_rows(db, engine='python', store=False):
+	"""One export row per mutually matching pair of swap requests, streamed.
+
+	With store=True the precomputed `matches` collection is streamed instead
+	(one row per user and match), so nothing is recomputed.
+	"""
+	if store:
+		for match in db['matches'].find({}, {'_id': 0}).batch_size(1000):
+			yield {
+				'kind': 'preference',
+				'user_id': match['user_id'],
+				'other_user_id': match['other_user_id'],
+				'other_user_name': match.get('other_user_name'),
+				'other_user_email': match.get('other_user_email_display'),
+				'other_current_apartment': match.get('other_current_apartment'),
+				'my_preference_level': match.get('my_preference_level'),
+				'other_preference_level': match.get('other_preference_level'),
+				'cycle_length': 2
+			}
+		return
+
+	for a, b, a_level, b_level in iter_pairs_by_apartment(db, engine):
+		yield {
+			'kind': 'preference',
+			'user_id': a['user_id'],
+			'user_name': a.get('user_name'),
+			'user_email': a.get('email'),
+			'current_apartment': a.get('current_apartment'),
+			'other_user_id': b['user_id'],
+			'other_user_name': b.get('user_name'),
+			'other_user_email': b.get('email'),
+			'other_current_apartment': b.get('current_apartment'),
+			'my_preference_level': a_level,
+			'other_preference_level': b_level,
+			'cycle_length': 2
+		}
+
+
+def iter_cycle_rows(db, max_length=4, limit=5, stats=None):
+	"""One export row per distinct swap cycle among cycle requests.
+
+	Every member's search finds the same cycle, so a cycle is only written by
+	its member with the lowest user_id. At most `limit` cycles are searched
+	per user; with a `stats` dict, the number of users whose search stopped
+	at that limit is counted in stats['truncated'].
+	"""
+	graph = CycleGraph(max_length=max_length)
+	graph.load(db['swap_requests'].find({'type': 'cycle_request'}, CYCLE_PROJECTION).batch_size(1000))
+	for user_id in graph.user_ids():
+		cycles = graph.find_cycles(user_id, limit=limit)
+		if stats is not None and len(cycles) >= limit:
+			stats['truncated'] = stats.get('truncated', 0) + 1
+		for cycle in cycles:
+			if any(member['user_id'] < user_id for member in cycle[1:]):
+				continue
+			me, nxt = cycle[0], cycle[1]
+			yield {
+				'kind': 'cycle',
+				'user_id': me['user_id'],
+				'user_name': me.get('user_name'),
+				'user_email': me.get('email'),
+				'current_apartment': me.get('current_apartment'),
+				'other_user_id': nxt['user_id'],
+				'other_user_name': nxt.get('user_name'),
+				'other_user_email': nxt.get('email'),
+				'other_current_apartment': nxt.get('current_apartment'),
+				'cycle_length': len(cycle),
+				'participants': '|'.join(member['user_id'] for member in cycle)
+			}
+
+
+def write_rows(rows, f, fmt):
+	"""Write export rows to an open file as they are produced; returns the count."""
+	count = 0
+	if fmt == 'jsonl':
+		for row in rows:
+			f.write(dumps(row) + '\n')
+			count += 1
+	else:
+		writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+		writer.writeheader()
+		for row in rows:
+			writer.writerow(row)
+			count += 1
+	return count
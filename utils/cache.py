@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+	"""Small thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+	def __init__(self, maxsize=1024, ttl=60):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._data)
+
+	def get(self, key, default=None):
+		with self._lock:
+			item = self._data.get(key, _MISSING)
+			if item is _MISSING:
+				return default
+			value, expires_at = item
+			if expires_at is not None and expires_at <= time.monotonic():
+				del self._data[key]
+				return default
+			self._data.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		expires_at = time.monotonic() + self.ttl if self.ttl else None
+		with self._lock:
+			self._data[key] = (value, expires_at)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def pop(self, key, default=None):
+		with self._lock:
+			item = self._data.pop(key, _MISSING)
+		return default if item is _MISSING else item[0]
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
@@ -0,0 +1,209 @@
+import threading
+from collections import defaultdict
+
+# The only cycle_request fields the graph keeps.
+CYCLE_PROJECTION = {
+	'user_id': 1,
+	'user_name': 1,
+	'email': 1,
+	'current_apartment': 1,
+	'current_apartment_id': 1,
+	'current_room': 1,
+	'desired_choice': 1,
+	'desired_choice_id': 1,
+	'created_at': 1
+}
+
+class CycleGraph:
+	"""In-memory "current apartment -> desired apartment" graph of cycle requests.
+
+	Apartments (by catalog ID) are the nodes and every cycle request is an edge. Edges are added
+	and removed one request at a time, so the graph never has to be rebuilt after
+	a write. Searches walk distinct apartment edges rather than individual
+	requests, which keeps the branching factor small even for popular apartments.
+	"""
+
+	def __init__(self, max_length=4, max_expansions=20000):
+		self.max_length = max_length
+		self.max_expansions = max_expansions
+		self.loaded = False
+		self._lock = threading.RLock()
+		# user_id -> request summary
+		self._requests = {}
+		# current apartment ID -> desired apartment ID -> {user_id: request summary}
+		self._edges = defaultdict(dict)
+		# desired apartment ID -> apartments with at least one request into it
+		self._sources = defaultdict(set)
+		# request _id -> user_id, for deletes that only carry the _id
+		self._by_request_id = {}
+		# writes made while load() is reading, replayed onto the new graph
+		self._journal = None
+
+	def __len__(self):
+		return len(self._requests)
+
+	def load(self, requests):
+		"""Replace the graph contents with the given cycle request documents.
+
+		The new graph is built while the old one keeps answering searches;
+		writes made meanwhile are applied to the old graph and replayed onto
+		the new one before it is swapped in.
+		"""
+		with self._lock:
+			self._journal = []
+		try:
+			fresh = CycleGraph(self.max_length, self.max_expansions)
+			for request in requests:
+				fresh._add(request)
+		except BaseException:
+			with self._lock:
+				self._journal = None
+			raise
+		with self._lock:
+			journal, self._journal = self._journal, None
+			self._requests, self._edges, self._sources = fresh._requests, fresh._edges, fresh._sources
+			self._by_request_id = fresh._by_request_id
+			for replay, arg in journal:
+				replay(arg)
+			self.loaded = True
+
+	def add(self, request):
+		"""Add (or replace) the edge for a cycle request document."""
+		if not request.get('user_id'):
+			return
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._add, request))
+			self._add(request)
+
+	def _add(self, request):
+		user_id = request['user_id']
+		source = request.get('current_apartment_id')
+		target = request.get('desired_choice_id')
+		self._remove(user_id)
+		if source is None or target is None or source == target:
+			return
+		summary = {
+			'request_id': request.get('_id'),
+			'user_id': user_id,
+			'user_name': request.get('user_name', ''),
+			'current_apartment': request.get('current_apartment'),
+			'current_apartment_id': source,
+			'current_room': request.get('current_room', ''),
+			'email': request.get('email', ''),
+			'desired_choice': request.get('desired_choice'),
+			'desired_choice_id': target,
+			'created_at': request.get('created_at')
+		}
+		self._requests[user_id] = summary
+		self._edges[source].setdefault(target, {})[user_id] = summary
+		self._sources[target].add(source)
+		if summary['request_id'] is not None:
+			self._by_request_id[summary['request_id']] = user_id
+
+	def remove(self, user_id):
+		"""Remove the edge owned by user_id, if any."""
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._remove, user_id))
+			self._remove(user_id)
+
+	def remove_request(self, request_id):
+		"""Remove the edge of the cycle request with this _id, if any."""
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._remove_request, request_id))
+			self._remove_request(request_id)
+
+	def _remove_request(self, request_id):
+		user_id = self._by_request_id.get(request_id)
+		if user_id is not None:
+			self._remove(user_id)
+
+	def _remove(self, user_id):
+		summary = self._requests.pop(user_id, None)
+		if summary is None:
+			return
+		self._by_request_id.pop(summary['request_id'], None)
+		source = summary['current_apartment_id']
+		target = summary['desired_choice_id']
+		users = self._edges[source].get(target)
+		if users is not None:
+			users.pop(user_id, None)
+			if not users:
+				del self._edges[source][target]
+				self._sources[target].discard(source)
+				if not self._sources[target]:
+					del self._sources[target]
+		if not self._edges[source]:
+			del self._edges[source]
+
+	def get(self, user_id):
+		return self._requests.get(user_id)
+
+	def user_ids(self):
+		with self._lock:
+			return list(self._requests)
+
+	def find_cycles(self, user_id, max_length=None, limit=5):
+		"""Return up to `limit` swap cycles through user_id, shortest first.
+
+		Each cycle is a list of request summaries starting with user_id's own
+		request; every member moves into the apartment of the member after them
+		and the last member moves into the first member's apartment.
+		"""
+		max_length = max_length or self.max_length
+		with self._lock:
+			me = self._requests.get(user_id)
+			if me is None:
+				return []
+
+			home = me['current_apartment_id']
+			start = me['desired_choice_id']
+			# apartments that have a request pointing back into my apartment
+			closers = self._sources.get(home, set())
+			apartment_paths = []
+			budget = [self.max_expansions]
+
+			def extend(path, visited, hops_left):
+				# path holds the apartments after `home`; hops_left more are needed
+				# before the last one must close the cycle back into `home`.
+				if hops_left == 0:
+					if path[-1] in closers:
+						apartment_paths.append(list(path))
+					return
+				targets = self._edges.get(path[-1], {}).keys() - visited
+				if hops_left == 1:
+					for target in targets & closers:
+						if len(apartment_paths) >= limit:
+							return
+						apartment_paths.append(path + [target])
+					return
+				for target in targets:
+					if len(apartment_paths) >= limit or budget[0] <= 0:
+						return
+					budget[0] -= 1
+					visited.add(target)
+					path.append(target)
+					extend(path, visited, hops_left - 1)
+					path.pop()
+					visited.discard(target)
+
+			# Iterative deepening so the shortest cycles are always found first.
+			for length in range(2, max_length + 1):
+				if len(apartment_paths) >= limit or start not in self._edges:
+					break
+				extend([start], {home, start}, length - 2)
+
+			cycles = []
+			for path in apartment_paths[:limit]:
+				cycle = [me]
+				for source, target in zip(path, path[1:] + [home]):
+					cycle.append(self._pick_requester(source, target))
+				cycles.append(cycle)
+			return cycles
+
+	def _pick_requester(self, source, target):
+		"""Pick the longest-waiting requester on the source -> target edge."""
+		users = self._edges[source][target]
+		return min(users.values(), key=lambda r: (r['created_at'] is None, r['created_at'] or 0))
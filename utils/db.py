@@ -0,0 +1,114 @@
+import os
+import threading
+
+from pymongo import MongoClient
+
+from utils.metrics import event_listeners
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', 'RUSwapping')
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+# Database served by get_db() instead of MongoDB (see set_database)
+_database_override = None
+
+
+def _int_env(name, default):
+	value = os.environ.get(name)
+	return int(value) if value else default
+
+
+def client_options():
+	"""MongoClient keyword arguments, configurable through the environment."""
+	return {
+		'maxPoolSize': _int_env('MONGO_MAX_POOL_SIZE', 50),
+		'minPoolSize': _int_env('MONGO_MIN_POOL_SIZE', 0),
+		'maxIdleTimeMS': _int_env('MONGO_MAX_IDLE_TIME_MS', None),
+		'waitQueueTimeoutMS': _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS', None),
+		'serverSelectionTimeoutMS': _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS', 20000),
+		'connectTimeoutMS': _int_env('MONGO_CONNECT_TIMEOUT_MS', 20000),
+		'socketTimeoutMS': _int_env('MONGO_SOCKET_TIMEOUT_MS', None),
+		'readPreference': os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+		# Per-endpoint command and pool wait metrics (see utils.metrics)
+		'event_listeners': event_listeners(),
+		# Don't open sockets or start monitor threads until the first operation,
+		# so a client created before a pre-forking server forks is never used.
+		'connect': False
+	}
+
+
+def get_client():
+	"""Return this process's MongoClient, creating it on first use.
+
+	The client is tied to the process id: a worker forked from a parent that
+	already had a client gets its own fresh client and connection pool instead
+	of sharing the parent's sockets.
+	"""
+	global _client, _client_pid
+	pid = os.getpid()
+	if _client is None or _client_pid != pid:
+		with _client_lock:
+			if _client is None or _client_pid != pid:
+				_client = MongoClient(MONGO_URI, **client_options())
+				_client_pid = pid
+	return _client
+
+
+def reset_client():
+	"""Forget the current client; the next get_client() call creates a new one."""
+	global _client, _client_pid
+	with _client_lock:
+		if _client is not None and _client_pid == os.getpid():
+			_client.close()
+		_client = None
+		_client_pid = None
+
+
+def supports_change_streams(timeout_ms=5000):
+	"""True if MONGO_URI points at a replica set or sharded cluster.
+
+	A standalone server has no change streams. Uses a short-lived client of
+	its own, so it is safe to call before a pre-forking server forks; raises
+	PyMongoError when the server cannot be reached.
+	"""
+	client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=timeout_ms)
+	try:
+		hello = client.admin.command('hello')
+	finally:
+		client.close()
+	return bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+
+
+def set_database(db):
+	"""Serve get_db() from db, e.g. the in-memory stand-in used by the load test.
+
+	Pass None to go back to MongoDB.
+	"""
+	global _database_override
+	_database_override = db
+
+
+def get_db():
+	"""Return the application database on this process's client."""
+	if _database_override is not None:
+		return _database_override
+	return get_client()[MONGO_DB_NAME]
+
+
+class LazyCollection:
+	"""Module-level handle for a collection that resolves the client on use."""
+
+	def __init__(self, name):
+		self.name = name
+
+	def __getattr__(self, attr):
+		return getattr(get_db()[self.name], attr)
+
+	def __repr__(self):
+		return f'LazyCollection({self.name!r})'
+
+
+def collection(name):
+	return LazyCollection(name)
@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timedelta
+
+from pymongo.errors import BulkWriteError
+
+from utils.cache import TTLCache
+from utils.db import collection
+
+# Swap and cycle requests expire this many days after their owner was last
+# active (0 keeps them forever). MongoDB's TTL monitor deletes them through
+# the expires_at_ttl index, so abandoned requests drop out of matching.
+REQUEST_TTL_DAYS = float(os.environ.get('REQUEST_TTL_DAYS', 120))
+# Refresh a user's expiry at most this often (seconds) per process.
+REQUEST_ACTIVITY_REFRESH = float(os.environ.get('REQUEST_ACTIVITY_REFRESH', 6 * 3600))
+
+REQUEST_TYPES = ['swap_request', 'cycle_request']
+
+swap_requests_collection = collection('swap_requests')
+_recently_refreshed = TTLCache(maxsize=100000, ttl=REQUEST_ACTIVITY_REFRESH)
+
+
+def expiry_date(now=None):
+	"""When a request touched now should expire, or None if requests never expire."""
+	if not REQUEST_TTL_DAYS:
+		return None
+	return (now or datetime.utcnow()) + timedelta(days=REQUEST_TTL_DAYS)
+
+
+def with_expiry(fields, now=None):
+	"""fields plus a fresh expires_at, when expiry is enabled."""
+	expires_at = expiry_date(now)
+	return {**fields, 'expires_at': expires_at} if expires_at else fields
+
+
+def is_expired(request, now=None):
+	expires_at = request.get('expires_at')
+	return expires_at is not None and expires_at <= (now or datetime.utcnow())
+
+
+def touch_requests(user_id):
+	"""Push back the expiry of user_id's requests; throttled per user."""
+	if not REQUEST_TTL_DAYS or not user_id or _recently_refreshed.get(user_id):
+		return
+	_recently_refreshed.set(user_id, True)
+	try:
+		swap_requests_collection.update_many(
+			{'user_id': user_id, 'type': {'$in': REQUEST_TYPES}},
+			{'$set': {'expires_at': expiry_date()}}
+		)
+	except Exception as e:
+		print(f"Could not refresh request expiry for {user_id}: {e}")
+
+
+def backfill_expiry(db):
+	"""Give requests created before expiry existed an expires_at; returns the count."""
+	expires_at = expiry_date()
+	if expires_at is None:
+		return 0
+	result = db['swap_requests'].update_many(
+		{'type': {'$in': REQUEST_TYPES}, 'expires_at': {'$exists': False}},
+		{'$set': {'expires_at': expires_at}}
+	)
+	return result.modified_count
+
+
+def move_interests(db, batch_size=1000):
+	"""Move legacy `type: interest` documents out of swap_requests into interests."""
+	swap_requests, interests = db['swap_requests'], db['interests']
+	moved = 0
+	while True:
+		batch = list(swap_requests.find({'type': 'interest'}).limit(batch_size))
+		if not batch:
+			return moved
+		for doc in batch:
+			doc.pop('type', None)
+		try:
+			interests.insert_many(batch, ordered=False)
+		except BulkWriteError as e:
+			# already copied by an earlier, interrupted run
+			if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+				raise
+		swap_requests.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+		moved += len(batch)
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from flask import make_response, request, session
+from pymongo import ReturnDocument
+
+from utils.db import collection
+from utils.pubsub import MATCH_EVENTS_CHANGE_STREAM
+
+VERSIONS_COLLECTION = 'versions'
+
+# Version counters: a process that changes data other processes keep a copy
+# of (see VersionSync) bumps the counter of its kind, so they know to reload.
+PREFERENCE = 'preference'
+CYCLE = 'cycle'
+
+HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+# How long (seconds) a worker trusts the counters it last read before reading
+# them again; writes by the same worker are seen at once. 0 reads every time.
+VERSION_POLL_INTERVAL = float(os.environ.get('VERSION_POLL_INTERVAL', 1))
+
+versions_collection = collection(VERSIONS_COLLECTION)
+
+
+def bump_version(*names):
+	"""Record that data behind the named version counters has changed.
+
+	Returns the new values, in order.
+	"""
+	values = []
+	for name in names:
+		doc = versions_collection.find_one_and_update(
+			{'_id': name}, {'$inc': {'v': 1}},
+			upsert=True, return_document=ReturnDocument.AFTER
+		)
+		values.append(doc['v'])
+		version_poll.wrote(name, doc['v'])
+	return tuple(values)
+
+
+def record_write(*names):
+	"""Called by a write route once it has changed a request.
+
+	With the change stream on, every worker's listener applies each change
+	to its own copies, so the route need not bump anything: the write costs
+	no extra round trip and no update of a document every writer contends
+	for. Otherwise the counters are bumped for other processes to reload.
+	"""
+	if not MATCH_EVENTS_CHANGE_STREAM:
+		bump_version(*names)
+
+
+def current_versions(names):
+	"""The named counters' values, in order, from a single lookup."""
+	found = {doc['_id']: doc.get('v', 0) for doc in versions_collection.find({'_id': {'$in': list(names)}})}
+	return tuple(found.get(name, 0) for name in names)
+
+
+class VersionPoll:
+	"""This process's view of the version counters, re-read at most every `interval` seconds.
+
+	Counters bumped by this process are updated immediately, and anything
+	following a counter through a VersionSync is told about the write, so a
+	single worker never waits on the poll to see its own changes.
+	"""
+
+	def __init__(self, interval=VERSION_POLL_INTERVAL):
+		self.interval = interval
+		self._lock = threading.Lock()
+		# name -> (value, read at)
+		self._values = {}
+		# name -> VersionSyncs following it
+		self._followers = defaultdict(list)
+
+	def get(self, names):
+		"""The named counters' values, in order, reading only the stale ones."""
+		now = time.monotonic()
+		with self._lock:
+			stale = [name for name in names if name not in self._values or now - self._values[name][1] >= self.interval]
+		if stale:
+			for name, value in zip(stale, current_versions(stale)):
+				self._store(name, value, now)
+		with self._lock:
+			return tuple(self._values[name][0] for name in names)
+
+	def _store(self, name, value, now):
+		with self._lock:
+			# never go backwards past a value this process already wrote
+			previous = self._values.get(name)
+			if previous is None or value >= previous[0]:
+				self._values[name] = (value, now)
+
+	def wrote(self, name, value):
+		# followers first, so a reader never sees the new value before they do
+		for sync in self._followers[name]:
+			sync.wrote(value)
+		self._store(name, value, time.monotonic())
+
+	def follow(self, sync):
+		self._followers[sync.name].append(sync)
+
+
+version_poll = VersionPoll()
+
+
+class VersionSync:
+	"""Keeps an in-process copy of some data (a cache, a graph) in step with a version counter.
+
+	refresh(load) calls load() when another process has bumped the counter
+	since the last load, or when the copy is older than max_age seconds.
+	Writes made by this process bump the counter too, but are applied to the
+	copy by the caller, so they do not force a reload.
+	"""
+
+	def __init__(self, name, max_age=None):
+		self.name = name
+		self.max_age = max_age
+		self._version = None
+		self._loaded_at = None
+		self._loading = False
+		# counter values produced by this process's writes, not yet caught up to
+		self._own = set()
+		self._state_lock = threading.Lock()
+		self._reload_lock = threading.Lock()
+		version_poll.follow(self)
+
+	def fresh(self, version):
+		# the copy can only be ahead of the poll through this process's writes
+		if self._loaded_at is None or self._version < version:
+			return False
+		return not self.max_age or time.monotonic() - self._loaded_at < self.max_age
+
+	def refresh(self, load):
+		"""Call load() if the copy is stale; returns whether it did.
+
+		While one thread reloads, others keep using the current copy rather
+		than waiting, unless there is no copy yet.
+		"""
+		if self.fresh(version_poll.get([self.name])[0]):
+			return False
+		if not self._reload_lock.acquire(blocking=self._loaded_at is None):
+			return False
+		try:
+			with self._state_lock:
+				self._loading = True
+			# read before loading: a write racing the load bumps past it
+			version = version_poll.get([self.name])[0]
+			if self.fresh(version):
+				return False
+			load()
+			with self._state_lock:
+				self._version, self._loaded_at = version, time.monotonic()
+				self._own = {value for value in self._own if value > version}
+				self._catch_up()
+			return True
+		finally:
+			with self._state_lock:
+				self._loading = False
+			self._reload_lock.release()
+
+	def wrote(self, value):
+		"""This process moved the counter to value and applies the change to the copy itself.
+
+		The copy must apply writes made during a load after it (RequestCache
+		journals them, CycleGraph holds its lock), so they count as ours too.
+		"""
+		with self._state_lock:
+			if self._loading or self._version is not None:
+				self._own.add(value)
+				if not self._loading:
+					self._catch_up()
+
+	def _catch_up(self):
+		# skip over our own writes; a gap means someone else wrote
+		while self._version + 1 in self._own:
+			self._version += 1
+			self._own.discard(self._version)
+
+
+def conditional(f):
+	"""Serve a per-user GET endpoint with ETags derived from its response.
+
+	The view always runs; the ETag is a hash of the endpoint, the session
+	user, the query string and the response, so a matching If-None-Match
+	gets an empty 304. Responses are often computed from a per-process copy
+	(RequestCache, CycleGraph) that no shared counter describes, and equal
+	responses get equal ETags in every worker.
+	"""
+	@wraps(f)
+	def decorated_function(*args, **kwargs):
+		response = make_response(f(*args, **kwargs))
+		if not HTTP_CACHE_ENABLED or response.status_code != 200:
+			return response
+		parts = [
+			request.endpoint, session.get('user_id'), request.query_string.decode(),
+			response.headers.get('X-Next-Cursor'), response.get_data()
+		]
+		etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+		if etag in request.if_none_match:
+			response = make_response('', 304)
+		response.set_etag(etag)
+		# the browser may keep the body but must revalidate it every time
+		response.headers['Cache-Control'] = 'private, no-cache'
+		return response
+	return decorated_function
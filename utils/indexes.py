@@ -0,0 +1,97 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Every index the application relies on, keyed by collection. Index names are
+# fixed so that the check can compare what exists against what is declared.
+INDEXES = {
+	'users': [
+		IndexModel([('email', ASCENDING)], name='email_unique', unique=True)
+	],
+	'swap_requests': [
+		# Per-user lookups: find_one({'user_id', 'type'}).
+		IndexModel([('type', ASCENDING), ('user_id', ASCENDING)], name='type_user_id'),
+		# One swap request and one cycle request per user. Legacy interest
+		# documents carry no current_apartment and so fall outside the constraint.
+		IndexModel(
+			[('user_id', ASCENDING), ('type', ASCENDING)],
+			name='user_id_type_unique',
+			unique=True,
+			partialFilterExpression={'current_apartment': {'$exists': True}}
+		),
+		# Matching: candidates by where they live and by what they want, on
+		# apartment catalog IDs.
+		IndexModel([('type', ASCENDING), ('current_apartment_id', ASCENDING)], name='type_current_apartment_id'),
+		IndexModel([('type', ASCENDING), ('desired_choice_id', ASCENDING)], name='type_desired_choice_id'),
+		IndexModel([('type', ASCENDING), ('preferences.first_choice_id', ASCENDING)], name='type_first_choice_id'),
+		IndexModel([('type', ASCENDING), ('preferences.second_choice_id', ASCENDING)], name='type_second_choice_id'),
+		IndexModel([('type', ASCENDING), ('preferences.third_choice_id', ASCENDING)], name='type_third_choice_id'),
+		# MongoDB deletes requests once expires_at has passed (see utils.expiry).
+		IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+	],
+	'interests': [
+		IndexModel([('user_id', ASCENDING)], name='user_id'),
+		IndexModel([('other_user_id', ASCENDING)], name='other_user_id')
+	],
+	'apartments': [
+		IndexModel([('key', ASCENDING)], name='key_unique', unique=True)
+	],
+	'matches': [
+		# One stored match per pair and direction; the incremental refreshes
+		# upsert on it (see utils.batch_matching.replace_user_matches).
+		IndexModel([('user_id', ASCENDING), ('other_user_id', ASCENDING)], name='user_id_other_user_id_unique', unique=True),
+		IndexModel([('other_user_id', ASCENDING)], name='other_user_id')
+	]
+}
+
+
+def check_indexes(db, declared=INDEXES):
+	"""Compare the declared indexes with what exists, per collection.
+
+	Returns {collection: {'missing': [...], 'extra': [...], 'conflicting': [...]}}
+	where conflicting lists declared names whose keys differ from the existing
+	index of the same name.
+	"""
+	report = {}
+	for name, models in declared.items():
+		existing = db[name].index_information()
+		existing.pop('_id_', None)
+		wanted = {model.document['name']: model.document for model in models}
+
+		missing, conflicting = [], []
+		for index_name, spec in wanted.items():
+			if index_name not in existing:
+				missing.append(index_name)
+			elif list(existing[index_name]['key']) != list(spec['key'].items()):
+				conflicting.append(index_name)
+
+		report[name] = {
+			'missing': missing,
+			'extra': sorted(set(existing) - set(wanted)),
+			'conflicting': conflicting
+		}
+	return report
+
+
+def ensure_indexes(db, declared=INDEXES):
+	"""Create any declared index that does not exist yet.
+
+	Safe to run repeatedly: existing indexes are left alone. Returns the
+	check_indexes() report taken before creation, with 'created' and 'failed'
+	added for each collection.
+	"""
+	report = check_indexes(db, declared)
+	for name, models in declared.items():
+		created, failed = [], []
+		for model in models:
+			index_name = model.document['name']
+			if index_name not in report[name]['missing']:
+				continue
+			try:
+				db[name].create_indexes([model])
+				created.append(index_name)
+			except OperationFailure as e:
+				# e.g. duplicate emails already stored block the unique index
+				failed.append(f'{index_name}: {e}')
+		report[name]['created'] = created
+		report[name]['failed'] = failed
+	return report
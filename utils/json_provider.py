@@ -0,0 +1,101 @@
+"""JSON encoding that understands MongoDB documents.
+
+MongoJSONProvider is installed on the app by create_app(), so views can
+jsonify() documents straight from pymongo: ObjectId and the other BSON
+scalar types are encoded as they are met instead of through a converted
+copy of the whole document. orjson is used when installed (it is optional:
+`pip install orjson`), otherwise the standard library encoder.
+"""
+import json
+from datetime import date, datetime, timezone
+
+from bson import Binary, Decimal128, ObjectId, Timestamp
+from bson.binary import UUID_SUBTYPE
+from flask.json.provider import DefaultJSONProvider
+
+try:
+	import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+	orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def format_date(d):
+	"""d in the RFC 822 format Flask has always sent dates in, e.g.
+	'Thu, 02 Jan 2025 03:04:05 GMT'. Same output as werkzeug's http_date,
+	several times faster, which matters with a date or two in every document.
+	"""
+	if isinstance(d, datetime):
+		if d.tzinfo is not None:
+			d = d.astimezone(timezone.utc)
+		hour, minute, second = d.hour, d.minute, d.second
+	else:
+		hour = minute = second = 0
+	return (
+		f'{_DAYS[d.weekday()]}, {d.day:02d} {_MONTHS[d.month - 1]} {d.year:04d} '
+		f'{hour:02d}:{minute:02d}:{second:02d} GMT'
+	)
+
+
+def encode_bson(o):
+	"""JSON-compatible form of a BSON value; everything else as Flask encodes it."""
+	if isinstance(o, ObjectId):
+		return str(o)
+	if isinstance(o, date):
+		return format_date(o)
+	if isinstance(o, Timestamp):
+		return format_date(o.as_datetime())
+	if isinstance(o, Decimal128):
+		return str(o.to_decimal())
+	if isinstance(o, Binary) and o.subtype in (UUID_SUBTYPE, 3):
+		return str(o.as_uuid(o.subtype))
+	# Decimal, UUID, dataclasses, __html__
+	return DefaultJSONProvider.default(o)
+
+
+def _orjson_options(sort_keys=False, indent=False):
+	# dates go through encode_bson so both encoders send the same format
+	options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+	if sort_keys:
+		options |= orjson.OPT_SORT_KEYS
+	if indent:
+		options |= orjson.OPT_INDENT_2
+	return options
+
+
+def dumps_bytes(obj, sort_keys=False, indent=False):
+	"""obj as UTF-8 JSON, with BSON types encoded by encode_bson."""
+	if orjson is not None:
+		return orjson.dumps(obj, default=encode_bson, option=_orjson_options(sort_keys, indent))
+	return json.dumps(
+		obj, default=encode_bson, sort_keys=sort_keys, indent=2 if indent else None,
+		ensure_ascii=False, separators=None if indent else (',', ':')
+	).encode()
+
+
+def dumps(obj, **kwargs):
+	return dumps_bytes(obj, **kwargs).decode()
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+	"""Flask JSON provider for pymongo documents, backed by orjson when available."""
+
+	default = staticmethod(encode_bson)
+
+	def dumps(self, obj, **kwargs):
+		if orjson is None or kwargs.keys() - {'sort_keys', 'indent'}:
+			return super().dumps(obj, **kwargs)
+		return dumps_bytes(obj, kwargs.get('sort_keys', self.sort_keys), bool(kwargs.get('indent'))).decode()
+
+	def response(self, *args, **kwargs):
+		if orjson is None:
+			return super().response(*args, **kwargs)
+		obj = self._prepare_response_obj(args, kwargs)
+		indent = self.compact is False or (self.compact is None and self._app.debug)
+		# encoded once, straight to the response body
+		body = dumps_bytes(obj, sort_keys=self.sort_keys, indent=indent)
+		return self._app.response_class(body + b'\n', mimetype=self.mimetype)
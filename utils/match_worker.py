@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MatchWorker:
+	"""Debounced background runner for match recompute jobs.
+
+	Writes call enqueue() with the apartments (and request owners) they
+	touched. Everything enqueued within `debounce` seconds is coalesced into a
+	single call of job(apartments, user_ids) on a small thread pool, so a burst
+	of edits to one apartment costs one recompute. Jobs never overlap, so a
+	slow older job cannot overwrite the results of a newer one.
+	"""
+
+	def __init__(self, job, debounce=0.25, max_workers=1):
+		self.job = job
+		self.debounce = debounce
+		self.max_workers = max_workers
+		self._lock = threading.Lock()
+		self._job_lock = threading.Lock()
+		self._apartments = set()
+		self._user_ids = set()
+		self._timer = None
+		self._executor = None
+		self._pid = None
+
+	def enqueue(self, apartments=(), user_ids=()):
+		with self._lock:
+			self._apartments.update(a for a in apartments if a)
+			self._user_ids.update(u for u in user_ids if u)
+			if self._timer is None:
+				self._timer = threading.Timer(self.debounce, self._submit)
+				self._timer.daemon = True
+				self._timer.start()
+
+	def _take_pending(self):
+		with self._lock:
+			apartments, user_ids = self._apartments, self._user_ids
+			self._apartments, self._user_ids = set(), set()
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			return apartments, user_ids
+
+	def _get_executor(self):
+		# Thread pools do not survive fork; give each process its own.
+		if self._executor is None or self._pid != os.getpid():
+			self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='match-worker')
+			self._pid = os.getpid()
+		return self._executor
+
+	def _submit(self):
+		apartments, user_ids = self._take_pending()
+		if apartments or user_ids:
+			self._get_executor().submit(self._run, apartments, user_ids)
+
+	def _run(self, apartments, user_ids):
+		with self._job_lock:
+			try:
+				self.job(apartments, user_ids)
+			except Exception as e:
+				print(f"Match recompute failed for {sorted(apartments)}: {e}")
+
+	def flush(self):
+		"""Run whatever is pending now, on the calling thread."""
+		apartments, user_ids = self._take_pending()
+		if apartments or user_ids:
+			self._run(apartments, user_ids)
+
+	def shutdown(self):
+		self.flush()
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+PREFERENCE_FIELDS = ('first_choice', 'second_choice', 'third_choice')
+# Catalog IDs of the choices (see utils.apartments); matching compares these.
+PREFERENCE_ID_FIELDS = tuple(field + '_id' for field in PREFERENCE_FIELDS)
+
+# The only swap_request fields matching and match rendering read.
+CANDIDATE_PROJECTION = {
+	'user_id': 1,
+	'user_name': 1,
+	'name': 1,
+	'email': 1,
+	'current_apartment': 1,
+	'current_apartment_id': 1,
+	'current_room': 1,
+	'preferences': 1,
+	'created_at': 1
+}
+
+
+def get_choices(request):
+	"""Return the apartment IDs of a swap request's three choices in preference order."""
+	prefs = request.get('preferences') or {}
+	return [prefs.get(field) for field in PREFERENCE_ID_FIELDS]
+
+
+def preference_level(choices, apartment):
+	"""1-based rank of apartment within choices, or None if it is not listed."""
+	if apartment is not None and apartment in choices:
+		return choices.index(apartment) + 1
+	return None
+
+
+def candidate_query(my_request):
+	"""Query for swap requests that could be a mutual match with my_request."""
+	my_current_apartment = my_request.get('current_apartment_id')
+	# listing your own apartment never matches anyone (see match_levels)
+	wanted_apartments = [
+		choice for choice in get_choices(my_request) if choice is not None and choice != my_current_apartment
+	]
+	if my_current_apartment is None or not wanted_apartments:
+		return None
+
+	# Only fetch candidates the database can already prove are mutual: they live
+	# in one of my choices and list my apartment among their own choices.
+	return {
+		'type': 'swap_request',
+		'user_id': {'$ne': my_request.get('user_id')},
+		'current_apartment_id': {'$in': wanted_apartments},
+		'$or': [{'preferences.' + field: my_current_apartment} for field in PREFERENCE_ID_FIELDS]
+	}
+
+
+def build_match(my_request, other_request, my_level, other_level):
+	"""Shape a match between two swap requests as returned to my_request's owner."""
+	return {
+		'other_user_id': other_request.get('user_id') or str(other_request.get('_id')),
+		'other_user_name': other_request.get('user_name') or other_request.get('name', ''),
+		'other_current_apartment': other_request.get('current_apartment'),
+		'other_current_room': other_request.get('current_room', ''),
+		'my_preference_level': my_level,
+		'other_preference_level': other_level,
+		'other_user_email_display': other_request.get('email', ''),
+		'other_created_at': other_request.get('created_at')
+	}
+
+
+def match_sort_key(match):
+	"""Best matches first: my most preferred apartment, then the newest request."""
+	created_at = match.get('other_created_at')
+	return (
+		match['my_preference_level'],
+		-created_at.timestamp() if created_at else 0.0,
+		match['other_user_id']
+	)
+
+
+def match_levels(my_request, other_request):
+	"""Return (my_level, other_level) if the two requests match each other, else None.
+
+	Two residents of the same apartment never match, even when both list it:
+	swapping would move neither of them. Every matching path (this one,
+	iter_mutual_pairs, the numpy matcher and the request cache) applies the
+	same rule.
+	"""
+	if my_request.get('current_apartment_id') == other_request.get('current_apartment_id'):
+		return None
+	my_level = preference_level(get_choices(my_request), other_request.get('current_apartment_id'))
+	other_level = preference_level(get_choices(other_request), my_request.get('current_apartment_id'))
+	if my_level is None or other_level is None:
+		return None
+	return my_level, other_level
+
+
+def iter_matches(collection, my_request):
+	"""Yield the mutual matches for a single swap request, unordered."""
+	query = candidate_query(my_request)
+	if query is None:
+		return
+
+	for other_request in collection.find(query, CANDIDATE_PROJECTION):
+		levels = match_levels(my_request, other_request)
+		if levels is not None:
+			yield build_match(my_request, other_request, *levels)
+
+
+def find_matches(collection, my_request):
+	"""Find the mutual matches for a single swap request."""
+	return list(iter_matches(collection, my_request))
+
+
+def iter_mutual_pairs(requests):
+	"""Yield (a, b, a_level, b_level) once for every mutually matching pair.
+
+	Indexes every request by the (current apartment, wanted apartment) edges it
+	offers, so a request's partners for one choice are found with a single
+	lookup of the reverse edge. Total work is proportional to the number of
+	requests plus the number of pairs produced.
+	"""
+	requests = [r for r in requests if r.get('current_apartment_id') is not None and r.get('user_id')]
+	offers = defaultdict(list)
+	for request in requests:
+		current = request['current_apartment_id']
+		seen = set()
+		for level, choice in enumerate(get_choices(request), start=1):
+			# a repeated choice only counts at its best (first) level, and one's
+			# own apartment never matches (see match_levels)
+			if choice is not None and choice != current and choice not in seen:
+				seen.add(choice)
+				offers[(current, choice)].append((request, level))
+
+	for (current, choice), askers in offers.items():
+		partners = offers.get((choice, current))
+		if not partners:
+			continue
+		for request, level in askers:
+			for other, other_level in partners:
+				# each pair is reachable from both edges; keep only one
+				if other['user_id'] > request['user_id']:
+					yield request, other, level, other_level
+
+
+def pair_weight(a_level, b_level):
+	"""Score a pair so that mutual first choices outrank everything else."""
+	return (4 - a_level) + (4 - b_level)
+
+
+def assign_pairs(pairs):
+	"""Pick at most one partner per user, preferring the highest-weight pairs.
+
+	This is the greedy approximation of a maximum-weight matching, not an
+	exact one: it is guaranteed to reach at least half of the optimal total
+	weight, and is often optimal for three-choice preference lists.
+	"""
+	ranked = sorted(
+		pairs,
+		key=lambda p: (-pair_weight(p[2], p[3]), min(p[2], p[3]))
+	)
+	taken = set()
+	for a, b, a_level, b_level in ranked:
+		if a['user_id'] in taken or b['user_id'] in taken:
+			continue
+		taken.add(a['user_id'])
+		taken.add(b['user_id'])
+		yield a, b, a_level, b_level
@@ -0,0 +1,543 @@
+"""In-memory stand-in for the subset of pymongo the app uses.
+
+Good enough to run the matching code, the bulk tools (`--in-memory`), the
+benchmarks and the load test without a MongoDB server. Equality and $in
+lookups on fields covered by a declared index are answered from hash indexes,
+so query cost scales roughly the way it does on a real server instead of
+always scanning.
+"""
+import copy
+import itertools
+import threading
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+_MISSING = object()
+
+
+def get_path(doc, path):
+	"""Value at a dotted path, or _MISSING."""
+	value = doc
+	for part in path.split('.'):
+		if not isinstance(value, dict) or part not in value:
+			return _MISSING
+		value = value[part]
+	return value
+
+
+def set_path(doc, path, value):
+	parts = path.split('.')
+	for part in parts[:-1]:
+		doc = doc.setdefault(part, {})
+	doc[parts[-1]] = value
+
+
+def unset_path(doc, path):
+	parts = path.split('.')
+	for part in parts[:-1]:
+		doc = doc.get(part)
+		if not isinstance(doc, dict):
+			return
+	doc.pop(parts[-1], None)
+
+
+def _compare(op, value, operand):
+	if value is _MISSING or value is None:
+		return False
+	try:
+		if op == '$gt':
+			return value > operand
+		if op == '$gte':
+			return value >= operand
+		if op == '$lt':
+			return value < operand
+		return value <= operand
+	except TypeError:
+		return False
+
+
+def _match_condition(value, condition):
+	if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+		for op, operand in condition.items():
+			if op == '$in':
+				if (None if value is _MISSING else value) not in operand:
+					return False
+			elif op == '$nin':
+				if (None if value is _MISSING else value) in operand:
+					return False
+			elif op == '$ne':
+				if (None if value is _MISSING else value) == operand:
+					return False
+			elif op == '$eq':
+				if value != operand:
+					return False
+			elif op == '$exists':
+				if (value is not _MISSING) != bool(operand):
+					return False
+			elif op in ('$gt', '$gte', '$lt', '$lte'):
+				if not _compare(op, value, operand):
+					return False
+			else:
+				raise NotImplementedError(f'Unsupported query operator {op}')
+		return True
+	if value is _MISSING:
+		return condition is None
+	return value == condition
+
+
+def matches_filter(doc, query):
+	for key, condition in query.items():
+		if key == '$or':
+			if not any(matches_filter(doc, sub) for sub in condition):
+				return False
+		elif key == '$and':
+			if not all(matches_filter(doc, sub) for sub in condition):
+				return False
+		elif not _match_condition(get_path(doc, key), condition):
+			return False
+	return True
+
+
+def apply_projection(doc, projection):
+	if not projection:
+		return copy.deepcopy(doc)
+	if isinstance(projection, (list, tuple)):
+		projection = {field: 1 for field in projection}
+	include_id = projection.get('_id', 1)
+	fields = {k: v for k, v in projection.items() if k != '_id'}
+	if fields and all(fields.values()):
+		out = {}
+		for path in fields:
+			value = get_path(doc, path)
+			if value is not _MISSING:
+				set_path(out, path, copy.deepcopy(value))
+		if include_id and '_id' in doc:
+			out['_id'] = doc['_id']
+		return out
+	out = copy.deepcopy(doc)
+	for path in fields:
+		unset_path(out, path)
+	if not include_id:
+		out.pop('_id', None)
+	return out
+
+
+def apply_update(doc, update):
+	for op, fields in update.items():
+		for path, value in fields.items():
+			if op == '$set':
+				set_path(doc, path, copy.deepcopy(value))
+			elif op == '$unset':
+				unset_path(doc, path)
+			elif op == '$inc':
+				current = get_path(doc, path)
+				set_path(doc, path, (0 if current is _MISSING else current) + value)
+			elif op == '$setOnInsert':
+				continue
+			else:
+				raise NotImplementedError(f'Unsupported update operator {op}')
+
+
+class MemoryCursor:
+	def __init__(self, docs, projection):
+		self._docs = docs
+		self._projection = projection
+		self._sort = None
+		self._skip = 0
+		self._limit = 0
+
+	def sort(self, key_or_list, direction=1):
+		self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+		return self
+
+	def skip(self, n):
+		self._skip = n
+		return self
+
+	def limit(self, n):
+		self._limit = n
+		return self
+
+	def batch_size(self, n):
+		return self
+
+	def __iter__(self):
+		docs = self._docs
+		if self._sort:
+			docs = list(docs)
+			for key, direction in reversed(self._sort):
+				docs.sort(
+					key=lambda d: (get_path(d, key) is _MISSING, get_path(d, key) if get_path(d, key) is not _MISSING else 0),
+					reverse=direction < 0
+				)
+		docs = itertools.islice(docs, self._skip, self._skip + self._limit if self._limit else None)
+		for doc in docs:
+			yield apply_projection(doc, self._projection)
+
+
+class MemoryCollection:
+	def __init__(self, database, name):
+		self.database = database
+		self.name = name
+		self._docs = {}
+		self._indexes = {}
+		self._lock = threading.RLock()
+
+	# -- indexes ---------------------------------------------------------
+
+	def create_index(self, keys, **options):
+		if isinstance(keys, str):
+			keys = [(keys, 1)]
+		fields = [field for field, _ in keys]
+		name = options.get('name') or '_'.join(f'{field}_{direction}' for field, direction in keys)
+		with self._lock:
+			if name not in self._indexes:
+				index = {
+					'key': list(keys),
+					'fields': fields,
+					'unique': options.get('unique', False),
+					'partial': options.get('partialFilterExpression'),
+					'entries': {}
+				}
+				for _id, doc in self._docs.items():
+					self._index_add(index, _id, doc)
+				self._indexes[name] = index
+		return name
+
+	def create_indexes(self, models):
+		names = []
+		for model in models:
+			document = dict(model.document)
+			keys = list(document.pop('key').items())
+			names.append(self.create_index(keys, **document))
+		return names
+
+	def index_information(self):
+		info = {'_id_': {'key': [('_id', 1)]}}
+		for name, index in self._indexes.items():
+			info[name] = {'key': list(index['key'])}
+			if index['unique']:
+				info[name]['unique'] = True
+		return info
+
+	def drop_index(self, name):
+		self._indexes.pop(name, None)
+
+	def _index_key(self, index, doc):
+		if index['partial'] and not matches_filter(doc, index['partial']):
+			return _MISSING
+		return tuple(
+			None if get_path(doc, field) is _MISSING else get_path(doc, field)
+			for field in index['fields']
+		)
+
+	def _index_add(self, index, _id, doc):
+		key = self._index_key(index, doc)
+		if key is _MISSING:
+			return
+		entries = index['entries'].setdefault(key, set())
+		if index['unique'] and entries and _id not in entries:
+			raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.name} dup key: {key}')
+		entries.add(_id)
+
+	def _index_remove(self, index, _id, doc):
+		key = self._index_key(index, doc)
+		if key is _MISSING:
+			return
+		entries = index['entries'].get(key)
+		if entries is not None:
+			entries.discard(_id)
+			if not entries:
+				del index['entries'][key]
+
+	def _candidate_ids(self, query):
+		"""Ids that may match, from an index; None means a full scan is needed."""
+		if '_id' in query:
+			condition = query['_id']
+			if not isinstance(condition, dict):
+				return {condition} if condition in self._docs else set()
+			if '$in' in condition:
+				return {_id for _id in condition['$in'] if _id in self._docs}
+		if '$or' in query and len(query) == 1:
+			ids = set()
+			for sub in query['$or']:
+				sub_ids = self._candidate_ids(sub)
+				if sub_ids is None:
+					return None
+				ids |= sub_ids
+			return ids
+
+		best = None
+		for index in self._indexes.values():
+			if index['partial']:
+				continue
+			values = []
+			for field in index['fields']:
+				condition = query.get(field, _MISSING)
+				if condition is _MISSING:
+					break
+				if isinstance(condition, dict) and '$in' in condition:
+					values.append(list(condition['$in']))
+				elif isinstance(condition, dict):
+					break
+				else:
+					values.append([condition])
+			else:
+				ids = set()
+				for key in itertools.product(*values):
+					ids |= index['entries'].get(key, set())
+				if best is None or len(ids) < len(best):
+					best = ids
+		if best is None and '$or' in query:
+			return self._candidate_ids({'$or': query['$or']})
+		return best
+
+	# -- reads -----------------------------------------------------------
+
+	def _matching(self, query):
+		query = query or {}
+		with self._lock:
+			ids = self._candidate_ids(query)
+			docs = self._docs.values() if ids is None else [self._docs[i] for i in ids if i in self._docs]
+			return [doc for doc in docs if matches_filter(doc, query)]
+
+	def find(self, filter=None, projection=None, **kwargs):
+		return MemoryCursor(self._matching(filter), projection)
+
+	def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+		cursor = self.find(filter, projection)
+		if sort:
+			cursor.sort(sort)
+		for doc in cursor.limit(1):
+			return doc
+		return None
+
+	def distinct(self, key, filter=None, **kwargs):
+		# a dict keeps first-seen order
+		values = {}
+		for doc in self._matching(filter):
+			value = get_path(doc, key)
+			if value is not _MISSING:
+				values.setdefault(value)
+		return list(values)
+
+	def count_documents(self, filter=None, **kwargs):
+		return len(self._matching(filter))
+
+	def estimated_document_count(self, **kwargs):
+		return len(self._docs)
+
+	# -- writes ----------------------------------------------------------
+
+	def _insert(self, doc):
+		doc.setdefault('_id', ObjectId())
+		stored = copy.deepcopy(doc)
+		with self._lock:
+			if stored['_id'] in self._docs:
+				raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.name} dup key: _id')
+			added = []
+			try:
+				for index in self._indexes.values():
+					self._index_add(index, stored['_id'], stored)
+					added.append(index)
+			except DuplicateKeyError:
+				for index in added:
+					self._index_remove(index, stored['_id'], stored)
+				raise
+			self._docs[stored['_id']] = stored
+		return stored['_id']
+
+	def insert_one(self, document, **kwargs):
+		return SimpleNamespace(inserted_id=self._insert(document), acknowledged=True)
+
+	def insert_many(self, documents, ordered=True, **kwargs):
+		inserted, errors = [], []
+		for position, document in enumerate(documents):
+			try:
+				inserted.append(self._insert(document))
+			except DuplicateKeyError as e:
+				errors.append({'index': position, 'code': 11000, 'errmsg': str(e), 'op': document})
+				if ordered:
+					break
+		if errors:
+			raise BulkWriteError({'writeErrors': errors, 'nInserted': len(inserted)})
+		return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+	def _replace(self, old, new):
+		for index in self._indexes.values():
+			self._index_remove(index, old['_id'], old)
+		try:
+			for index in self._indexes.values():
+				self._index_add(index, new['_id'], new)
+		except DuplicateKeyError:
+			for index in self._indexes.values():
+				self._index_remove(index, new['_id'], new)
+				self._index_add(index, old['_id'], old)
+			raise
+		self._docs[new['_id']] = new
+
+	def _upsert_doc(self, filter, update):
+		doc = {k: v for k, v in (filter or {}).items() if not k.startswith('$') and not isinstance(v, dict)}
+		for path, value in update.get('$setOnInsert', {}).items():
+			set_path(doc, path, copy.deepcopy(value))
+		apply_update(doc, {k: v for k, v in update.items() if k != '$setOnInsert'})
+		return doc
+
+	def update_one(self, filter, update, upsert=False, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			if not docs:
+				if upsert:
+					_id = self._insert(self._upsert_doc(filter, update))
+					return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=_id)
+				return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+			old = docs[0]
+			new = copy.deepcopy(old)
+			apply_update(new, update)
+			if new == old:
+				return SimpleNamespace(matched_count=1, modified_count=0, upserted_id=None)
+			self._replace(old, new)
+			return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+
+	def replace_one(self, filter, replacement, upsert=False, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			if not docs:
+				if upsert:
+					_id = self._insert(dict(replacement))
+					return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=_id)
+				return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+			old = docs[0]
+			new = {'_id': old['_id'], **copy.deepcopy(replacement)}
+			if new == old:
+				return SimpleNamespace(matched_count=1, modified_count=0, upserted_id=None)
+			self._replace(old, new)
+			return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+
+	def update_many(self, filter, update, **kwargs):
+		modified = 0
+		with self._lock:
+			for old in self._matching(filter):
+				new = copy.deepcopy(old)
+				apply_update(new, update)
+				if new != old:
+					self._replace(old, new)
+					modified += 1
+		return SimpleNamespace(matched_count=modified, modified_count=modified)
+
+	def bulk_write(self, requests, ordered=True, **kwargs):
+		counts = {'inserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0, 'upserted': 0}
+		errors = []
+		for position, op in enumerate(requests):
+			try:
+				if isinstance(op, InsertOne):
+					self._insert(op._doc)
+					counts['inserted'] += 1
+					continue
+				if isinstance(op, (DeleteOne, DeleteMany)):
+					delete = self.delete_one if isinstance(op, DeleteOne) else self.delete_many
+					counts['deleted'] += delete(op._filter).deleted_count
+					continue
+				if isinstance(op, ReplaceOne):
+					result = self.replace_one(op._filter, op._doc, upsert=op._upsert)
+				elif isinstance(op, UpdateOne):
+					result = self.update_one(op._filter, op._doc, upsert=op._upsert)
+				elif isinstance(op, UpdateMany):
+					result = self.update_many(op._filter, op._doc)
+				else:
+					raise TypeError(f'Unsupported bulk operation: {op!r}')
+				counts['matched'] += result.matched_count
+				counts['modified'] += result.modified_count
+				counts['upserted'] += getattr(result, 'upserted_id', None) is not None
+			except DuplicateKeyError as e:
+				errors.append({'index': position, 'code': 11000, 'errmsg': str(e), 'op': op})
+				if ordered:
+					break
+		if errors:
+			raise BulkWriteError({'writeErrors': errors, 'nInserted': counts['inserted']})
+		return SimpleNamespace(acknowledged=True, **{f'{name}_count': n for name, n in counts.items()})
+
+	def find_one_and_update(self, filter, update, projection=None, return_document=False, upsert=False, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			if not docs:
+				if not upsert:
+					return None
+				_id = self._insert(self._upsert_doc(filter, update))
+				return apply_projection(self._docs[_id], projection) if return_document else None
+			old = docs[0]
+			new = copy.deepcopy(old)
+			apply_update(new, update)
+			if new != old:
+				self._replace(old, new)
+			return apply_projection(new if return_document else old, projection)
+
+	def delete_one(self, filter, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			if docs:
+				self._delete(docs[0])
+			return SimpleNamespace(deleted_count=len(docs[:1]))
+
+	def delete_many(self, filter, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			for doc in docs:
+				self._delete(doc)
+			return SimpleNamespace(deleted_count=len(docs))
+
+	def find_one_and_delete(self, filter, projection=None, **kwargs):
+		with self._lock:
+			docs = self._matching(filter)
+			if not docs:
+				return None
+			self._delete(docs[0])
+			return apply_projection(docs[0], projection)
+
+	def _delete(self, doc):
+		for index in self._indexes.values():
+			self._index_remove(index, doc['_id'], doc)
+		del self._docs[doc['_id']]
+
+	def drop(self):
+		self.database._collections.pop(self.name, None)
+		with self._lock:
+			self._docs.clear()
+			self._indexes.clear()
+
+	def rename(self, new_name, dropTarget=False, **kwargs):
+		with self.database._lock:
+			self.database._collections.pop(self.name, None)
+			self.name = new_name
+			self.database._collections[new_name] = self
+
+
+class MemoryDatabase:
+	"""Dictionary of MemoryCollections, addressed like a pymongo Database."""
+
+	def __init__(self, name='RUSwapping'):
+		self.name = name
+		self._collections = {}
+		self._lock = threading.Lock()
+
+	def __getitem__(self, name):
+		with self._lock:
+			if name not in self._collections:
+				self._collections[name] = MemoryCollection(self, name)
+			return self._collections[name]
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return self[name]
+
+	def list_collection_names(self):
+		return list(self._collections)
+
+	def command(self, name, *args, **kwargs):
+		if name == 'ping':
+			return {'ok': 1.0}
+		raise NotImplementedError(f'Unsupported command {name}')
@@ -0,0 +1,307 @@
+"""In-process request and MongoDB metrics in the Prometheus text format.
+
+init_app() times every request; the pymongo listeners attribute each
+database command, and each wait for a pooled connection, to the endpoint
+that issued it.
+
+Each process counts on its own. When METRICS_DIR is set (gunicorn.conf.py
+sets it), every worker saves a snapshot of its counts there, and /metrics
+adds up the snapshots of all workers, plus the archive that the gunicorn
+master folds an exited worker's last snapshot into. The totals then cover
+the whole server whichever worker answers the scrape, and do not go back
+down when a worker is recycled.
+"""
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Label used for commands issued outside a request (workers, CLI commands).
+BACKGROUND = 'background'
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+# Seconds between a worker's snapshots; an exited worker's counts since its
+# last one are lost unless it exits cleanly.
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get('METRICS_SNAPSHOT_INTERVAL', 5))
+ARCHIVE = 'archive.json'
+
+
+class Histogram:
+	"""A labelled Prometheus histogram."""
+
+	def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+		self.name = name
+		self.help = help
+		self.labels = labels
+		self.buckets = buckets
+		self._lock = threading.Lock()
+		# label values -> [bucket counts..., sum, count]
+		self._series = defaultdict(lambda: [0] * len(self.buckets) + [0.0, 0])
+
+	def observe(self, value, *label_values):
+		with self._lock:
+			series = self._series[label_values]
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					series[i] += 1
+			series[-2] += value
+			series[-1] += 1
+
+	def clear(self):
+		with self._lock:
+			self._series.clear()
+
+	def snapshot(self):
+		"""[label values, bucket counts + sum + count] for every series, as JSON-ready lists."""
+		with self._lock:
+			return [[list(key), list(values)] for key, values in self._series.items()]
+
+	def render(self, series=None):
+		"""The text exposition of this process's series, or of the given merged ones."""
+		lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+		if series is None:
+			with self._lock:
+				series = {key: list(values) for key, values in self._series.items()}
+		for label_values, values in sorted(series.items()):
+			labels = ','.join(f'{k}="{escape(v)}"' for k, v in zip(self.labels, label_values))
+			prefix = labels + ',' if labels else ''
+			for bound, count in zip(self.buckets, values):
+				lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+			lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+			labels = f'{{{labels}}}' if labels else ''
+			lines.append(f'{self.name}_sum{labels} {values[-2]:.6f}')
+			lines.append(f'{self.name}_count{labels} {values[-1]}')
+		return '\n'.join(lines)
+
+
+def escape(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+	'http_request_duration_seconds', 'Time spent handling a request.',
+	('endpoint', 'method', 'status')
+)
+queries_per_request = Histogram(
+	'mongo_commands_per_request', 'MongoDB commands issued while handling one request.',
+	('endpoint',), buckets=COUNT_BUCKETS
+)
+command_duration = Histogram(
+	'mongo_command_duration_seconds', 'MongoDB command round-trip time.',
+	('endpoint', 'command', 'outcome')
+)
+pool_wait = Histogram(
+	'mongo_pool_wait_seconds', 'Time spent waiting to check a connection out of the pool.',
+	('endpoint', 'outcome')
+)
+
+REGISTRY = [request_duration, queries_per_request, command_duration, pool_wait]
+
+
+def current_endpoint():
+	if has_request_context():
+		return request.endpoint or 'unmatched'
+	return BACKGROUND
+
+
+def render():
+	"""Every metric in the Prometheus text exposition format, for all workers when METRICS_DIR is set."""
+	if not METRICS_DIR:
+		return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+	write_snapshot()
+	total = {}
+	with _locked(fcntl.LOCK_SH):
+		for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+			try:
+				with open(path) as f:
+					_merge(total, json.load(f))
+			except (OSError, ValueError):
+				# removed or being replaced right now
+				continue
+	return '\n'.join(metric.render(total.get(metric.name, {})) for metric in REGISTRY) + '\n'
+
+
+@contextmanager
+def _locked(operation):
+	# Held exclusively while a dead worker's snapshot moves into the archive,
+	# so a scrape never counts it twice or not at all.
+	fd = os.open(os.path.join(METRICS_DIR, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+	try:
+		fcntl.flock(fd, operation)
+		yield
+	finally:
+		os.close(fd)
+
+
+def _merge(total, snapshot):
+	for name, series in snapshot.items():
+		merged = total.setdefault(name, {})
+		for label_values, values in series:
+			key = tuple(label_values)
+			if key in merged:
+				merged[key] = [a + b for a, b in zip(merged[key], values)]
+			else:
+				merged[key] = list(values)
+
+
+def _write_json(path, data):
+	partial = f'{path}.{os.getpid()}.tmp'
+	with open(partial, 'w') as f:
+		json.dump(data, f)
+	os.replace(partial, path)
+
+
+def write_snapshot():
+	"""Save this process's counts to METRICS_DIR for the other workers to add up."""
+	if METRICS_DIR and METRICS_ENABLED:
+		snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+		_write_json(os.path.join(METRICS_DIR, f'{os.getpid()}.json'), snapshot)
+
+
+def start_snapshots():
+	"""Call write_snapshot() every METRICS_SNAPSHOT_INTERVAL seconds from a daemon thread."""
+	if not METRICS_DIR or not METRICS_ENABLED:
+		return
+
+	def run():
+		while True:
+			time.sleep(METRICS_SNAPSHOT_INTERVAL)
+			try:
+				write_snapshot()
+			except OSError as e:
+				print(f'Metrics snapshot failed: {e}')
+
+	threading.Thread(target=run, name='metrics-snapshots', daemon=True).start()
+
+
+def archive_snapshot(pid):
+	"""Fold the last snapshot of the exited process pid into the archive."""
+	path = os.path.join(METRICS_DIR, f'{pid}.json')
+	archive = os.path.join(METRICS_DIR, ARCHIVE)
+	with _locked(fcntl.LOCK_EX):
+		try:
+			with open(path) as f:
+				snapshot = json.load(f)
+		except (OSError, ValueError):
+			return
+		total = {}
+		try:
+			with open(archive) as f:
+				_merge(total, json.load(f))
+		except FileNotFoundError:
+			pass
+		_merge(total, snapshot)
+		_write_json(archive, {
+			name: [[list(key), values] for key, values in series.items()] for name, series in total.items()
+		})
+		os.remove(path)
+
+
+def clear_snapshots():
+	"""Drop the snapshots and archive left in METRICS_DIR by an earlier server."""
+	for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+		os.remove(path)
+
+
+class CommandMetrics(monitoring.CommandListener):
+	"""Counts and times MongoDB commands per endpoint."""
+
+	def started(self, event):
+		pass
+
+	def _record(self, event, outcome):
+		endpoint = current_endpoint()
+		command_duration.observe(event.duration_micros / 1e6, endpoint, event.command_name, outcome)
+		if endpoint != BACKGROUND and 'mongo_commands' in g:
+			g.mongo_commands += 1
+
+	def succeeded(self, event):
+		self._record(event, 'ok')
+
+	def failed(self, event):
+		self._record(event, 'error')
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+	"""Times connection checkouts, which is where a too-small pool shows up."""
+
+	def __init__(self):
+		self._local = threading.local()
+
+	def _finish(self, outcome):
+		started = getattr(self._local, 'started', None)
+		if started is not None:
+			self._local.started = None
+			pool_wait.observe(time.perf_counter() - started, current_endpoint(), outcome)
+
+	def connection_check_out_started(self, event):
+		# check-out runs on the thread that needs the connection
+		self._local.started = time.perf_counter()
+
+	def connection_checked_out(self, event):
+		self._finish('ok')
+
+	def connection_check_out_failed(self, event):
+		self._finish(event.reason)
+
+	def pool_created(self, event):
+		pass
+
+	def pool_ready(self, event):
+		pass
+
+	def pool_cleared(self, event):
+		pass
+
+	def pool_closed(self, event):
+		pass
+
+	def connection_created(self, event):
+		pass
+
+	def connection_ready(self, event):
+		pass
+
+	def connection_closed(self, event):
+		pass
+
+	def connection_checked_in(self, event):
+		pass
+
+
+def event_listeners():
+	"""Listeners to pass to MongoClient(event_listeners=...)."""
+	if not METRICS_ENABLED:
+		return []
+	return [CommandMetrics(), PoolMetrics()]
+
+
+def init_app(app):
+	"""Time every request handled by app."""
+	if not METRICS_ENABLED:
+		return
+
+	@app.before_request
+	def start_timer():
+		g.request_started = time.perf_counter()
+		g.mongo_commands = 0
+
+	@app.after_request
+	def record_request(response):
+		started = g.get('request_started')
+		if started is not None:
+			endpoint = request.endpoint or 'unmatched'
+			request_duration.observe(time.perf_counter() - started, endpoint, request.method, str(response.status_code))
+			queries_per_request.observe(g.get('mongo_commands', 0), endpoint)
+		return response
@@ -0,0 +1,116 @@
+"""Vectorized mutual-match computation over all swap requests at once.
+
+Needs numpy, which is optional: check NUMPY_AVAILABLE (or catch the
+RuntimeError from NumpyMatcher) and fall back to utils.matching otherwise.
+"""
+try:
+	import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+	np = None
+
+from utils.matching import build_match, get_choices
+
+NUMPY_AVAILABLE = np is not None
+
+# Apartment ID used for a missing current apartment or choice.
+MISSING = -1
+
+
+class NumpyMatcher:
+	"""All swap requests encoded as an (N x 4) matrix of apartment IDs.
+
+	Column 0 is the current apartment and columns 1-3 the first to third
+	choice. Every (current, choice) cell is an edge "lives in current, wants
+	choice"; two requests match when one's edge is the reverse of the other's.
+	Edges are sorted by a single int64 key, so the partners for every edge are
+	found with one vectorized searchsorted instead of a per-request scan.
+	"""
+
+	def __init__(self, requests):
+		if np is None:
+			raise RuntimeError('numpy is not installed')
+		self.requests = [r for r in requests if r.get('current_apartment_id') is not None and r.get('user_id')]
+		self.rows = {r['user_id']: i for i, r in enumerate(self.requests)}
+		self.matrix = self.encode(self.requests)
+		self._build_edges()
+
+	@staticmethod
+	def encode(requests):
+		matrix = np.full((len(requests), 4), MISSING, dtype=np.int64)
+		for i, request in enumerate(requests):
+			matrix[i, 0] = request['current_apartment_id']
+			for j, choice in enumerate(get_choices(request), start=1):
+				if choice is not None:
+					matrix[i, j] = choice
+		return matrix
+
+	def _build_edges(self):
+		matrix = self.matrix
+		n = len(matrix)
+		current = np.repeat(matrix[:, 0], 3)
+		choice = matrix[:, 1:].reshape(-1)
+		row = np.repeat(np.arange(n, dtype=np.int64), 3)
+		level = np.tile(np.arange(1, 4, dtype=np.int8), n)
+
+		# A repeated choice only counts at its best (first) level.
+		choices = matrix[:, 1:]
+		repeated = np.zeros_like(choices, dtype=bool)
+		repeated[:, 1] = choices[:, 1] == choices[:, 0]
+		repeated[:, 2] = (choices[:, 2] == choices[:, 0]) | (choices[:, 2] == choices[:, 1])
+		valid = (choice != MISSING) & (choice != current) & ~repeated.reshape(-1)
+
+		current, choice, row, level = current[valid], choice[valid], row[valid], level[valid]
+		self._base = int(max(matrix.max(initial=0), 0)) + 1
+		key = current * self._base + choice
+		order = np.argsort(key, kind='stable')
+		self._keys = key[order]
+		self._reverse = (choice * self._base + current)[order]
+		self._rows = row[order]
+		self._levels = level[order]
+		# edge positions grouped by row, for single-request lookups
+		self._by_row = np.argsort(self._rows, kind='stable')
+		self._row_starts = np.searchsorted(self._rows[self._by_row], np.arange(n + 1))
+
+	def _expand(self, edges):
+		"""Partners of the given (sorted) edge positions: (edge, partner_edge) arrays."""
+		reverse = self._reverse[edges]
+		left = np.searchsorted(self._keys, reverse, side='left')
+		right = np.searchsorted(self._keys, reverse, side='right')
+		counts = right - left
+		total = int(counts.sum())
+		if not total:
+			empty = np.empty(0, dtype=np.int64)
+			return empty, empty
+		edge = np.repeat(edges, counts)
+		starts = np.repeat(left - np.cumsum(counts) + counts, counts)
+		partner = starts + np.arange(total, dtype=np.int64)
+		return edge, partner
+
+	def pair_arrays(self):
+		"""Every mutual pair once, as arrays (a_rows, b_rows, a_levels, b_levels)."""
+		edge, partner = self._expand(np.arange(len(self._keys), dtype=np.int64))
+		a, b = self._rows[edge], self._rows[partner]
+		# each pair is reached from both sides; keep one
+		keep = a < b
+		return a[keep], b[keep], self._levels[edge][keep], self._levels[partner][keep]
+
+	def iter_pairs(self):
+		"""Yield (a, b, a_level, b_level) like utils.matching.iter_mutual_pairs."""
+		requests = self.requests
+		for a, b, a_level, b_level in zip(*(array.tolist() for array in self.pair_arrays())):
+			yield requests[a], requests[b], a_level, b_level
+
+	def partners(self, user_id):
+		"""Yield (other_request, my_level, other_level) for one user's swap request."""
+		row = self.rows.get(user_id)
+		if row is None:
+			return
+		edges = self._by_row[self._row_starts[row]:self._row_starts[row + 1]]
+		edge, partner = self._expand(edges)
+		for e, p in zip(edge.tolist(), partner.tolist()):
+			yield self.requests[self._rows[p]], int(self._levels[e]), int(self._levels[p])
+
+	def matches_for(self, user_id):
+		"""The mutual matches of one user's swap request, shaped like utils.matching.find_matches."""
+		me = self.requests[self.rows[user_id]] if user_id in self.rows else None
+		return [build_match(me, other, my_level, other_level) for other, my_level, other_level in self.partners(user_id)]
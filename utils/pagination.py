@@ -0,0 +1,58 @@
+import base64
+import heapq
+import json
+import os
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('MATCH_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.environ.get('MATCH_MAX_PAGE_SIZE', 100))
+
+
+class InvalidPageArgs(ValueError):
+	"""Raised for a malformed `limit` or `cursor` query parameter."""
+
+
+def encode_cursor(key):
+	"""Opaque, URL-safe token for a sort key tuple."""
+	raw = json.dumps(list(key), separators=(',', ':')).encode()
+	return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+	try:
+		raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+		key = json.loads(raw)
+	except (ValueError, TypeError):
+		raise InvalidPageArgs('Invalid cursor')
+	if not isinstance(key, list):
+		raise InvalidPageArgs('Invalid cursor')
+	return tuple(key)
+
+
+def page_args(args):
+	"""Read (limit, after) from request args; after is the decoded cursor or None."""
+	try:
+		limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+	except (TypeError, ValueError):
+		raise InvalidPageArgs('limit must be an integer')
+	limit = max(1, min(limit, MAX_PAGE_SIZE))
+	cursor = args.get('cursor')
+	return limit, decode_cursor(cursor) if cursor else None
+
+
+def top_k(items, key, limit, after=None):
+	"""Return the `limit` smallest items by key that sort after `after`, and the next cursor.
+
+	Uses a bounded heap, so memory stays proportional to `limit` however many
+	items the iterable yields.
+	"""
+	if after is not None:
+		items = (item for item in items if key(item) > after)
+	try:
+		page = heapq.nsmallest(limit + 1, items, key=key)
+	except TypeError:
+		if after is None:
+			raise
+		# a cursor issued by a different endpoint has an incomparable key
+		raise InvalidPageArgs('Invalid cursor')
+	next_cursor = encode_cursor(key(page[limit - 1])) if len(page) > limit else None
+	return page[:limit], next_cursor
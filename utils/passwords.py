@@ -0,0 +1,237 @@
+import fcntl
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Method (and cost) new hashes are generated with; older hashes are upgraded
+# to it on the next successful login.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+# Hashes running at once, and hash jobs allowed to wait for one before new
+# ones are rejected. Both are limits for the whole host: every web worker
+# process takes its slots from the same set of lock files in
+# PASSWORD_HASH_LOCK_DIR.
+PASSWORD_HASH_WORKERS = max(1, int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_QUEUE = max(0, int(os.environ.get('PASSWORD_HASH_QUEUE', 16)))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+PASSWORD_HASH_LOCK_DIR = os.environ.get(
+	'PASSWORD_HASH_LOCK_DIR', os.path.join(tempfile.gettempdir(), f'ruswapping-hashing-{os.getuid()}')
+)
+# spawn rather than fork by default: web workers are multi-threaded, and
+# forking a process that holds other threads' locks can deadlock the child.
+PASSWORD_HASH_START_METHOD = os.environ.get('PASSWORD_HASH_START_METHOD', 'spawn')
+
+
+class HashingBusy(Exception):
+	"""The hashing pool is saturated; the caller should answer 429."""
+
+
+class HostSlots:
+	"""`count` slots shared by every process on the host.
+
+	Each slot is an flock() on its own file in `directory`. The kernel drops
+	the locks of a process that dies, so a worker killed mid-hash never leaks
+	its slot.
+	"""
+
+	POLL_INTERVAL = 0.01
+
+	def __init__(self, directory, name, count):
+		self.paths = [os.path.join(directory, f'{name}-{i}.lock') for i in range(count)]
+		os.makedirs(directory, exist_ok=True)
+
+	def _try_acquire(self):
+		for path in self.paths:
+			fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+			try:
+				fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				return fd
+			except BlockingIOError:
+				os.close(fd)
+		return None
+
+	def acquire(self, timeout=0):
+		"""A held slot to pass to release(), or None if none frees up within timeout."""
+		deadline = time.monotonic() + timeout
+		while True:
+			fd = self._try_acquire()
+			if fd is not None or time.monotonic() >= deadline:
+				return fd
+			time.sleep(self.POLL_INTERVAL)
+
+	def release(self, fd):
+		os.close(fd)
+
+
+class RateLimited(Exception):
+	"""A token bucket is empty; retry_after is the wait in seconds."""
+
+	def __init__(self, retry_after):
+		super().__init__(f'Rate limited, retry in {retry_after:.0f}s')
+		self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+	"""Per-key token buckets: `rate` tokens per second, holding at most `burst`."""
+
+	def __init__(self, rate, burst, max_keys=100000):
+		self.rate = rate
+		self.burst = burst
+		self.max_keys = max_keys
+		self._buckets = OrderedDict()
+		self._lock = threading.Lock()
+
+	def take(self, key, spend=1):
+		"""Spend `spend` tokens for key (0 only checks), or raise RateLimited."""
+		now = time.monotonic()
+		with self._lock:
+			tokens, last = self._buckets.pop(key, (self.burst, now))
+			tokens = min(self.burst, tokens + (now - last) * self.rate)
+			if tokens < 1:
+				self._buckets[key] = (tokens, now)
+				raise RateLimited((1 - tokens) / self.rate)
+			self._buckets[key] = (tokens - spend, now)
+			while len(self._buckets) > self.max_keys:
+				self._buckets.popitem(last=False)
+
+
+ip_limiter = TokenBucketLimiter(
+	rate=float(os.environ.get('AUTH_IP_RATE_PER_MINUTE', 30)) / 60,
+	burst=float(os.environ.get('AUTH_IP_BURST', 10))
+)
+email_limiter = TokenBucketLimiter(
+	rate=float(os.environ.get('AUTH_EMAIL_RATE_PER_MINUTE', 10)) / 60,
+	burst=float(os.environ.get('AUTH_EMAIL_BURST', 5))
+)
+
+
+def check_rate_limits(ip, email):
+	ip_limiter.take(ip or 'unknown')
+	if email:
+		email_limiter.take(email.lower())
+
+
+def check_login_limits(ip, email):
+	"""Like check_rate_limits, but the address is only charged by login_failed().
+
+	Students behind one NAT or proxy address share its bucket, so successful
+	logins must not use it up; the per-email bucket counts every attempt.
+	"""
+	ip_limiter.take(ip or 'unknown', spend=0)
+	if email:
+		email_limiter.take(email.lower())
+
+
+def login_failed(ip):
+	try:
+		ip_limiter.take(ip or 'unknown')
+	except RateLimited:
+		pass
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_running = HostSlots(PASSWORD_HASH_LOCK_DIR, 'running', PASSWORD_HASH_WORKERS)
+_queued = HostSlots(PASSWORD_HASH_LOCK_DIR, 'queued', PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+def _get_executor():
+	global _executor, _executor_pid
+	if _executor is None or _executor_pid != os.getpid():
+		with _executor_lock:
+			if _executor is None or _executor_pid != os.getpid():
+				# Processes start on demand; the host-wide slots, not the pool
+				# size, bound how many hash at once.
+				_executor = ProcessPoolExecutor(
+					max_workers=PASSWORD_HASH_WORKERS,
+					mp_context=multiprocessing.get_context(PASSWORD_HASH_START_METHOD)
+				)
+				_executor_pid = os.getpid()
+	return _executor
+
+
+def _submit(fn, *args, wait=PASSWORD_HASH_TIMEOUT):
+	"""Run fn in the hashing pool once a host-wide slot is free.
+
+	Returns (future, release); the slots are released when the job finishes,
+	or earlier by calling release() once its result has been collected.
+	Raises HashingBusy when the host's queue is full, or when no slot frees
+	up within `wait` seconds.
+	"""
+	queued = _queued.acquire()
+	if queued is None:
+		raise HashingBusy()
+	running = None
+	try:
+		running = _running.acquire(wait)
+		if running is None:
+			raise HashingBusy()
+		future = _get_executor().submit(fn, *args)
+	except Exception:
+		if running is not None:
+			_running.release(running)
+		_queued.release(queued)
+		raise
+
+	held = [running, queued]
+	lock = threading.Lock()
+
+	def release(_=None):
+		# done callbacks run after result() has returned, so the caller may
+		# get here first
+		with lock:
+			if held:
+				_running.release(held[0])
+				_queued.release(held[1])
+				held.clear()
+
+	future.add_done_callback(release)
+	return future, release
+
+
+def _run(fn, *args):
+	future, release = _submit(fn, *args)
+	try:
+		result = future.result(PASSWORD_HASH_TIMEOUT)
+	except TimeoutError:
+		raise HashingBusy()
+	release()
+	return result
+
+
+def hash_password(password):
+	"""Hash a password off the request thread with the configured method."""
+	return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+	"""Check a password against its stored hash off the request thread."""
+	return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+	"""True if password_hash was made with a different method or cost than configured."""
+	return password_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+
+def rehash_in_background(password, on_done):
+	"""Compute a fresh hash and pass it to on_done(new_hash); silently skipped when busy."""
+	try:
+		future, _ = _submit(generate_password_hash, password, PASSWORD_HASH_METHOD, wait=0)
+	except HashingBusy:
+		return
+
+	def finish(f):
+		if f.exception() is None:
+			try:
+				on_done(f.result())
+			except Exception as e:
+				print(f"Password rehash failed: {e}")
+
+	future.add_done_callback(finish)
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# When set, match events are produced by a MongoDB change stream in every
+# worker (see routes/match_events.py) instead of by the write routes, so users
+# connected to any worker hear about writes handled by any other worker.
+MATCH_EVENTS_CHANGE_STREAM = os.environ.get('MATCH_EVENTS_CHANGE_STREAM', '').lower() in ('1', 'true', 'yes')
+# How long (seconds) an event is kept for the page it is addressed to to poll.
+MATCH_EVENTS_RETENTION = float(os.environ.get('MATCH_EVENTS_RETENTION', 120))
+
+
+class Broker:
+	"""In-process mailboxes of small events addressed to a user id.
+
+	Every event carries a position, and a page asks for the events after the
+	last position it saw. With the change stream on, positions are the
+	MongoDB cluster times of the writes behind the events, which every worker
+	shares, so a page can poll a different worker each time without missing
+	or repeating an event. Otherwise this process numbers events itself.
+
+	external_positions says that positions come from the change stream
+	through advance() and publish(position=...).
+
+	Each mailbox keeps at most `max_events` events for `retention` seconds,
+	and only the most recently used `max_users` mailboxes are kept.
+	"""
+
+	def __init__(self, external_positions=False, retention=MATCH_EVENTS_RETENTION, max_events=100, max_users=100000):
+		self.retention = retention
+		self.max_events = max_events
+		self.max_users = max_users
+		# user_id -> deque of (published at, position, event), oldest first
+		self._mailboxes = OrderedDict()
+		# every event up to this position has been published here; with
+		# external_positions it is only known once advance() has been called
+		self._position = None if external_positions else time.time_ns() // 1000
+		self._last_poll = 0.0
+		self._changed = threading.Condition()
+
+	def listening(self):
+		"""True if any page has polled this process within the retention period."""
+		return time.time() - self._last_poll < self.retention
+
+	def publish(self, user_id, event, position=None):
+		"""Leave event in user_id's mailbox and wake anyone waiting on it.
+
+		Without a position the event gets the next one from this process and
+		is visible at once; with one (from the change stream), it stays
+		invisible until advance() has moved past it.
+		"""
+		with self._changed:
+			if position is None:
+				# microseconds, so positions keep growing across restarts
+				position = max(self._position + 1, time.time_ns() // 1000)
+				self._position = position
+			mailbox = self._mailboxes.pop(user_id, None)
+			if mailbox is None:
+				mailbox = deque(maxlen=self.max_events)
+			mailbox.append((time.time(), position, event))
+			self._mailboxes[user_id] = mailbox
+			while len(self._mailboxes) > self.max_users:
+				self._mailboxes.popitem(last=False)
+			self._changed.notify_all()
+
+	def advance(self, position):
+		"""Record that every event up to position has been published."""
+		with self._changed:
+			if self._position is None or position > self._position:
+				self._position = position
+				self._changed.notify_all()
+
+	def poll(self, user_id, since=None, timeout=0):
+		"""(events, cursor): user_id's events after position `since`.
+
+		Waits up to timeout seconds for one when there are none yet. Pass the
+		returned cursor as `since` next time. Without `since` nothing is
+		returned and the cursor is the current position, which is None until
+		this process knows one.
+		"""
+		self._last_poll = time.time()
+		deadline = time.monotonic() + timeout
+		with self._changed:
+			while True:
+				if since is None:
+					return [], self._position
+				events = self._pending(user_id, since)
+				remaining = deadline - time.monotonic()
+				if events or remaining <= 0:
+					# a cursor from a worker that is further along is kept as it is
+					return events, max(since, self._position or since)
+				self._changed.wait(remaining)
+
+	def _pending(self, user_id, since):
+		mailbox = self._mailboxes.get(user_id)
+		if not mailbox or self._position is None:
+			return []
+		oldest = time.time() - self.retention
+		return [
+			event for published, position, event in mailbox
+			if since < position <= self._position and published > oldest
+		]
+
+
+broker = Broker(external_positions=MATCH_EVENTS_CHANGE_STREAM)
+
+
+def publish_match_event(kind, user_ids, position=None):
+	"""Tell each user in user_ids that their `kind` ('preference' or 'cycle') matches changed."""
+	for user_id in set(user_ids):
+		if user_id:
+			broker.publish(user_id, {'event': 'match', 'kind': kind}, position)
@@ -0,0 +1,150 @@
+import threading
+
+from utils.matching import PREFERENCE_ID_FIELDS, build_match, preference_level
+
+
+class ActiveRequest:
+	"""The parts of a swap request matching and match rendering need, in slots."""
+
+	__slots__ = (
+		'request_id', 'user_id', 'user_name', 'email', 'current_apartment', 'current_apartment_id',
+		'current_room', 'choices', 'created_at'
+	)
+
+	def __init__(self, request):
+		prefs = request.get('preferences') or {}
+		self.request_id = request.get('_id')
+		self.user_id = request['user_id']
+		self.user_name = request.get('user_name') or request.get('name', '')
+		self.email = request.get('email', '')
+		self.current_apartment = request.get('current_apartment')
+		self.current_apartment_id = request.get('current_apartment_id')
+		self.current_room = request.get('current_room', '')
+		self.choices = tuple(prefs.get(field) for field in PREFERENCE_ID_FIELDS)
+		self.created_at = request.get('created_at')
+
+	def get(self, field, default=None):
+		# lets build_match read a record like a document
+		return getattr(self, field, default)
+
+
+class RequestCache:
+	"""Every active swap request held in memory, indexed by current apartment ID.
+
+	Loaded once from MongoDB and then kept current one request at a time by
+	the write routes, so a user's matches are found with a dictionary lookup
+	per choice instead of a query. Like CycleGraph, each process has its own.
+	"""
+
+	def __init__(self):
+		self.loaded = False
+		self._lock = threading.RLock()
+		# user_id -> ActiveRequest
+		self._requests = {}
+		# current apartment ID -> {user_id: ActiveRequest}
+		self._by_apartment = {}
+		# request _id -> user_id, for deletes that only carry the _id
+		self._by_request_id = {}
+		# writes made while load() is reading, replayed onto the new contents
+		self._journal = None
+
+	def __len__(self):
+		return len(self._requests)
+
+	def load(self, requests):
+		"""Replace the cache contents with the given swap request documents.
+
+		The old contents keep serving reads while requests are read; writes
+		made meanwhile are applied to both.
+		"""
+		with self._lock:
+			self._journal = []
+		try:
+			by_user = {}
+			for request in requests:
+				if request.get('user_id'):
+					record = ActiveRequest(request)
+					by_user[record.user_id] = record
+		except BaseException:
+			with self._lock:
+				self._journal = None
+			raise
+		with self._lock:
+			journal, self._journal = self._journal, None
+			self._requests, self._by_apartment, self._by_request_id = by_user, {}, {}
+			for record in by_user.values():
+				self._index(record)
+			for replay, arg in journal:
+				replay(arg)
+			self.loaded = True
+
+	def add(self, request):
+		"""Add (or replace) the cached copy of a swap request document."""
+		if not request.get('user_id'):
+			return
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._add, request))
+			self._add(request)
+
+	def _add(self, request):
+		record = ActiveRequest(request)
+		self._remove(record.user_id)
+		self._requests[record.user_id] = record
+		self._index(record)
+
+	def _index(self, record):
+		self._by_apartment.setdefault(record.current_apartment_id, {})[record.user_id] = record
+		if record.request_id is not None:
+			self._by_request_id[record.request_id] = record.user_id
+
+	def remove(self, user_id):
+		"""Drop user_id's swap request, if cached."""
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._remove, user_id))
+			self._remove(user_id)
+
+	def remove_request(self, request_id):
+		"""Drop the swap request with this _id, if cached (a change-stream delete carries only the _id)."""
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((self._remove_request, request_id))
+			self._remove_request(request_id)
+
+	def _remove_request(self, request_id):
+		user_id = self._by_request_id.get(request_id)
+		if user_id is not None:
+			self._remove(user_id)
+
+	def _remove(self, user_id):
+		record = self._requests.pop(user_id, None)
+		if record is None:
+			return
+		self._by_request_id.pop(record.request_id, None)
+		residents = self._by_apartment.get(record.current_apartment_id)
+		if residents is not None:
+			residents.pop(user_id, None)
+			if not residents:
+				del self._by_apartment[record.current_apartment_id]
+
+	def get(self, user_id):
+		return self._requests.get(user_id)
+
+	def matches(self, user_id):
+		"""The mutual matches of user_id's swap request, shaped like utils.matching.find_matches."""
+		with self._lock:
+			me = self._requests.get(user_id)
+			if me is None or me.current_apartment_id is None:
+				return []
+			matches = []
+			for choice in set(me.choices):
+				# own apartment never matches (see utils.matching.match_levels)
+				if choice is None or choice == me.current_apartment_id:
+					continue
+				# residents of my choice who list my apartment too
+				for other in self._by_apartment.get(choice, {}).values():
+					other_level = preference_level(other.choices, me.current_apartment_id)
+					if other_level is not None and other.user_id != user_id:
+						matches.append(build_match(me, other, preference_level(me.choices, choice), other_level))
+			return matches
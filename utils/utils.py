@@ -13,4 +13,37 @@ def to_jsonable(obj):
 			else:
 				out[k] = to_jsonable(v)
 		return out
-	return obj 
\ No newline at end of file
+	return obj 
+
+def with_id(doc):
+	"""Rename doc's `_id` to `id` in place for a JSON response and return it.
+
+	The app's JSON provider encodes ObjectId and dates itself, so nothing
+	else needs converting.
+	"""
+	if '_id' in doc:
+		doc['id'] = doc.pop('_id')
+	return doc
+
+def dotted_set(fields):
+	"""Flatten nested dicts into dotted paths for a field-level $set."""
+	out = {}
+	for k, v in fields.items():
+		if isinstance(v, dict):
+			for sub_key, sub_value in dotted_set(v).items():
+				out[f'{k}.{sub_key}'] = sub_value
+		else:
+			out[k] = v
+	return out
+
+def apply_set(doc, set_fields):
+	"""Return a copy of doc with a dotted-path $set applied, without touching doc."""
+	out = dict(doc)
+	for path, value in set_fields.items():
+		target = out
+		*parents, leaf = path.split('.')
+		for part in parents:
+			target[part] = dict(target.get(part) or {})
+			target = target[part]
+		target[leaf] = value
+	return out